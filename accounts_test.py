@@ -0,0 +1,34 @@
+from money_flow.accounts import Account, AccountRegistry
+from money_flow.money import Money
+
+
+class TestAccountRegistry:
+    def setup_method(self):
+        self.registry = AccountRegistry(
+            [
+                Account(1, "salary", 100_000, "NL01", "bank"),
+                Account(2, "savings", 5_000, "NL02", "savings"),
+                Account(3, "savings", 0, "NL03", "bank"),
+            ]
+        )
+
+    def test_when_looking_up_expect_account_by_id_iban_and_description(self):
+        assert self.registry[2].iban == "NL02"
+        assert self.registry.get_by_iban("NL03").id_ == 3
+        assert self.registry.get_by_iban("NL99") is None
+        assert self.registry.get_by_description("salary").id_ == 1
+
+    def test_when_descriptions_repeat_expect_first_account_kept(self):
+        assert self.registry.get_by_description("savings").id_ == 2
+
+    def test_when_iterating_expect_mapping_of_ids(self):
+        assert len(self.registry) == 3
+        assert list(self.registry) == [1, 2, 3]
+        assert 3 in self.registry and 4 not in self.registry
+
+    def test_when_crediting_expect_balance_raised_in_cents(self):
+        self.registry.credit("NL02", Money.of("12.34"))
+        self.registry.credit("NL99", Money.of("1.00"))
+
+        assert self.registry[2].balance_cents == 6_234
+        assert self.registry[2].balance == Money.of("62.34")
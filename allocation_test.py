@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+from money_flow.accounts import Account, AccountRegistry
+from money_flow.allocation import ALLOCATION_COLLECTION, SETTINGS_COLLECTION, SETTINGS_DOCUMENT, FireStore
+from money_flow.fakes import FakeFirestoreClient
+from money_flow.money import Money
+
+
+def snapshot(id_, data, update_time):
+    return SimpleNamespace(id=id_, reference=id_, update_time=update_time, to_dict=lambda: dict(data))
+
+
+class TestFireStore:
+    def setup_method(self):
+        self.documents = {
+            "safety": (1, dict(id=2, strategy="top_up", account_type="savings", target_balance="4000.00", priority=1)),
+            "stocks": (
+                1,
+                dict(
+                    description="stocks",
+                    strategy="percentage",
+                    iban="NL04",
+                    account_type="bank",
+                    percentage=50.0,
+                    priority=2,
+                ),
+            ),
+        }
+        self.db = MagicMock()
+        self.db.collection("allocation").select.return_value.stream.side_effect = lambda: [
+            snapshot(id_, {}, update_time) for id_, (update_time, _) in self.documents.items()
+        ]
+        self.db.collection("settings").document("salary_account").get.return_value = snapshot(
+            "salary_account", dict(minimum="1500.00", id=1), 1
+        )
+        self.db.get_all.side_effect = lambda references: [
+            snapshot(id_, self.documents[id_][1], self.documents[id_][0]) for id_ in references
+        ]
+        with patch("money_flow.allocation._firestore_client", return_value=self.db):
+            self.store = FireStore(config="")
+        self.accounts = AccountRegistry([Account(2, "safety net", 380000, "NL01", "savings")])
+
+    def test_when_loading_expect_settings_and_allocations_with_account_details(self):
+        documents, settings = self.store.load_config()
+        allocations = self.store.get_allocations(self.accounts)
+
+        assert len(documents) == 2
+        assert settings.minimum == Money(150000)
+        assert [(a.description, a.iban, a.current_balance) for a in allocations] == [
+            ("safety net", "NL01", Money(380000)),
+            ("stocks", "NL04", None),
+        ]
+
+    def test_when_reloading_expect_only_changed_documents_fetched(self):
+        self.store.load_config()
+        self.documents["stocks"] = (2, {**self.documents["stocks"][1], "percentage": 25.0})
+
+        self.store.load_config()
+        self.store.load_config()
+
+        assert [call.args[0] for call in self.db.get_all.call_args_list] == [["safety", "stocks"], ["stocks"]]
+        assert self.store.get_allocations(self.accounts)[1].percentage == 25.0
+
+
+class TestFireStoreSettings:
+    def setup_method(self):
+        self.client = FakeFirestoreClient(
+            {
+                ALLOCATION_COLLECTION: dict(
+                    stocks=dict(id=2, strategy="fixed", account_type="bank", fixed_amount="50.00", priority=1)
+                ),
+                SETTINGS_COLLECTION: {SETTINGS_DOCUMENT: dict(minimum="100.00", id=1)},
+            }
+        )
+        self.store = FireStore(config=None, client=self.client)
+
+    def test_when_asking_for_settings_expect_only_the_settings_document_read(self):
+        assert self.store.get_main_account_settings().id == 1
+
+        assert dict(self.client.reads) == {"get": 1}
+
+    def test_when_settings_document_is_deleted_while_listening_expect_listener_to_survive(self):
+        self.store.listen()
+
+        self.client.delete(SETTINGS_COLLECTION, SETTINGS_DOCUMENT)
+        assert not self.store.is_listening()
+
+        self.client.set(SETTINGS_COLLECTION, SETTINGS_DOCUMENT, dict(minimum="100.00", id=5))
+        assert self.store.is_listening()
+        assert self.store.get_main_account_settings().id == 5
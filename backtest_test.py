@@ -0,0 +1,107 @@
+import pytest
+
+from money_flow.allocation import Allocation, Settings
+from money_flow.money import Money, to_cents
+from money_flow.planner import plan_allocations
+
+np = pytest.importorskip("numpy")
+from money_flow.backtest import backtest  # noqa: E402
+
+
+def replay_with_planner(allocations, salaries, spending, initial_balances):
+    balances = {allocation.iban: Money(initial_balances.get(allocation.iban, 0)) for allocation in allocations}
+    main_balance = Money(0)
+    amounts = []
+    for month, salary in enumerate(salaries):
+        main_balance += Money(int(salary))
+        plan = plan_allocations(main_balance, Settings(minimum=Money(0), id=0), allocations, balances)
+        month_amounts = {}
+        for transfer in plan.transfers:
+            month_amounts[transfer.to_account_alias] = transfer.amount.cents
+            balances[transfer.to_iban] += transfer.amount
+            main_balance -= transfer.amount
+        for iban, spent in spending.items():
+            balances[iban] -= Money(int(spent[month]))
+        amounts.append(month_amounts)
+    return amounts, balances, main_balance
+
+
+class TestBacktest:
+    def setup_method(self):
+        self.allocations = [
+            Allocation(
+                description="safety net",
+                strategy="top_up",
+                iban="NL01",
+                account_type="savings",
+                target_balance=Money.of("4000.00"),
+                max_amount=Money.of("750.00"),
+                priority=1,
+            ),
+            Allocation(
+                description="groceries",
+                strategy="top_up",
+                iban="NL02",
+                account_type="bank",
+                target_balance=Money.of("450.00"),
+                priority=1,
+            ),
+            Allocation(
+                description="rent",
+                strategy="fixed",
+                iban="NL03",
+                account_type="bank",
+                fixed_amount=Money.of("1250.00"),
+                priority=0,
+            ),
+            Allocation(
+                description="pleasure",
+                strategy="percentage",
+                iban="NL04",
+                account_type="bank",
+                percentage=33.33,
+                min_amount=Money.of("25.00"),
+                priority=2,
+            ),
+            Allocation(
+                description="stocks",
+                strategy="percentage",
+                iban="NL05",
+                account_type="bank",
+                percentage=50.0,
+                priority=2,
+            ),
+        ]
+        rng = np.random.default_rng(42)
+        self.months = 36
+        self.salaries = rng.integers(150000, 450000, size=self.months)
+        self.spending = {
+            "NL02": rng.integers(20000, 60000, size=self.months),
+            "NL03": np.full(self.months, 125000),
+            "NL04": rng.integers(0, 40000, size=self.months),
+        }
+        self.initial_balances = {"NL01": 120000, "NL02": 5000}
+
+    def test_when_replayed_expect_same_transfers_as_planner(self):
+        result = backtest(self.allocations, self.salaries, self.spending, self.initial_balances)
+
+        expected_amounts, expected_balances, expected_main = replay_with_planner(
+            self.allocations, self.salaries, self.spending, self.initial_balances
+        )
+        for month, month_amounts in enumerate(expected_amounts):
+            for index, allocation in enumerate(result.allocations):
+                expected = month_amounts.get(allocation.description, 0)
+                assert result.amounts[month, index, 0] == expected, (month, allocation.description)
+        for iban, balance in expected_balances.items():
+            assert result.balances[-1, result.ibans.index(iban), 0] == to_cents(balance)
+        assert result.main_balances[-1, 0] == to_cents(expected_main)
+
+    def test_when_many_scenarios_expect_each_column_to_match_single_scenario(self):
+        salaries = np.stack([self.salaries, self.salaries // 2, self.salaries * 2], axis=1)
+
+        result = backtest(self.allocations, salaries, self.spending, self.initial_balances)
+
+        for scenario in range(salaries.shape[1]):
+            single = backtest(self.allocations, salaries[:, scenario], self.spending, self.initial_balances)
+            assert (result.amounts[:, :, scenario] == single.amounts[:, :, 0]).all()
+            assert (result.balances[:, :, scenario] == single.balances[:, :, 0]).all()
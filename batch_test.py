@@ -0,0 +1,93 @@
+import json
+import os
+import tempfile
+
+import pytest
+
+from money_flow.allocation import FireStore
+from money_flow.batch import Tenant, load_tenants, run_tenant
+from money_flow.fakes import FakeBunqServer, FakeFirestoreClient
+from money_flow.main import API_CONTEXT_FILE_PATH
+from money_flow.money import Money
+
+
+def allocation(id_, fixed_amount):
+    return dict(id=id_, strategy="fixed", account_type="bank", fixed_amount=fixed_amount, priority=1)
+
+
+class TestLoadTenants:
+    def setup_method(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "tenants.json")
+
+    def write(self, tenants):
+        with open(self.path, "w") as f:
+            json.dump(tenants, f)
+
+    def test_when_loading_expect_defaults_for_missing_keys(self):
+        self.write([dict(name="household"), dict(name="holding", api_key_secret="holding_key")])
+
+        household, holding = load_tenants(self.path)
+
+        assert household.allocation_collection == "allocation"
+        assert (household.settings_collection, household.settings_document) == ("settings", "salary_account")
+        assert household.api_context_file_path == (API_CONTEXT_FILE_PATH or "bunq.conf")
+        assert holding.api_context_file_path.endswith("-holding_key.conf")
+
+    def test_when_tenant_has_unknown_key_expect_error(self):
+        self.write([dict(name="household", allocations="allocation")])
+
+        with pytest.raises(ValueError):
+            load_tenants(self.path)
+
+
+class TestRunTenant:
+    def setup_method(self):
+        self.server = FakeBunqServer(accounts=dict(bank=3)).start()
+        self.client = FakeFirestoreClient(
+            dict(
+                allocation=dict(savings=allocation(id_=2, fixed_amount="100.00")),
+                holding_allocation=dict(stocks=allocation(id_=3, fixed_amount="50.00")),
+                settings=dict(salary_account=dict(minimum="100.00", id=1), holding=dict(minimum="0.00", id=2)),
+            )
+        )
+        self.bunq = self.server.client(connect=False)
+
+    def teardown_method(self):
+        self.bunq.transport.close()
+        self.server.stop()
+
+    def store(self, tenant):
+        return FireStore(
+            config=None,
+            client=self.client,
+            allocation_collection=tenant.allocation_collection,
+            settings_collection=tenant.settings_collection,
+            settings_document=tenant.settings_document,
+        )
+
+    def test_when_tenants_share_a_client_expect_each_their_own_configuration(self):
+        household = Tenant(name="household")
+        holding = Tenant(name="holding", allocation_collection="holding_allocation", settings_document="holding")
+
+        reports = [
+            run_tenant(tenant, self.bunq, lambda tenant=tenant: self.store(tenant)) for tenant in (household, holding)
+        ]
+
+        assert [(r["tenant"], r["succeeded"], r["transfers"]) for r in reports] == [
+            ("household", True, 1),
+            ("holding", True, 1),
+        ]
+        assert self.server.balance(1) == Money.of("900.00")
+        assert self.server.balance(2) == Money.of("1050.00")
+        assert self.server.balance(3) == Money.of("1050.00")
+
+    def test_when_tenant_fails_expect_error_in_report(self):
+        tenant = Tenant(name="missing", settings_document="missing")
+
+        report = run_tenant(tenant, self.bunq, lambda: self.store(tenant))
+
+        assert not report["succeeded"]
+        assert report["error"] == (
+            "MissingSettingsError: Settings document 'missing' does not exist, it should hold the main account id and "
+            "minimum"
+        )
@@ -0,0 +1,59 @@
+"""Import-time budget for the money-flow entry points.
+
+Every module is imported in a fresh interpreter with ``-X importtime``; the fastest of a few runs is compared against
+its budget. Heavy dependencies must not be imported at all until they are used.
+
+    python benchmarks/import_time.py [--runs 5] [--scale 1.0]
+"""
+
+import argparse
+import subprocess
+import sys
+
+# Cumulative import time budgets in milliseconds.
+BUDGETS_MS = {
+    "money_flow.main": 200,
+    "money_flow.automate": 150,
+    "money_flow.planner": 150,
+}
+LAZY_MODULES = ("bunq", "firebase_admin", "google.cloud.secretmanager", "functions_framework", "numpy")
+
+
+def measure(module: str) -> tuple[float, list[str]]:
+    check = f"import sys, {module}; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check], capture_output=True, text=True, check=True
+    )
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        if name.strip() == module:
+            cumulative_us = int(cumulative)
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return cumulative_us / 1000, loaded
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="imports per module, the fastest one counts")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply all budgets, for slow machines")
+    args = parser.parse_args(argv)
+
+    failed = False
+    for module, budget in BUDGETS_MS.items():
+        measurements = [measure(module) for _ in range(args.runs)]
+        milliseconds = min(ms for ms, _ in measurements)
+        loaded = sorted({name for _, names in measurements for name in names})
+        over = milliseconds > budget * args.scale
+        failed |= over or bool(loaded)
+        status = "FAIL" if over or loaded else "ok"
+        print(f"{status:>4} {module:<24} {milliseconds:7.1f} ms (budget {budget * args.scale:.0f} ms)")
+        if loaded:
+            print(f"     imported eagerly: {', '.join(loaded)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
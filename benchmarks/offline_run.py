@@ -0,0 +1,108 @@
+"""Full money-flow runs against local stand-ins for bunq and Firestore.
+
+Starts a ``FakeBunqServer`` and an in-memory Firestore with the given number of accounts and allocations, points
+``money_flow.main`` at them and runs ``main`` a few times, reporting the duration, API calls, retries and rate limit
+waits of every run. Latency and 429s can be injected on both sides.
+
+    python benchmarks/offline_run.py [--accounts 50] [--allocations 10] [--latency 0.05] [--rate-limit-every 20]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+
+def allocation_documents(account_ids: list[int], savings_ids: list[int]) -> dict:
+    documents = {}
+    for i, id_ in enumerate(savings_ids):
+        documents[f"savings-{id_}"] = dict(
+            id=id_, strategy="top_up", account_type="savings", target_balance="1500.00", priority=1 + i % 3
+        )
+    for i, id_ in enumerate(account_ids):
+        documents[f"fixed-{id_}"] = dict(
+            id=id_, strategy="fixed", account_type="bank", fixed_amount="5.00", priority=1 + i % 3
+        )
+    return documents
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=50, help="bank accounts besides the main account")
+    parser.add_argument("--savings", type=int, default=5, help="savings accounts, each topped up by an allocation")
+    parser.add_argument("--allocations", type=int, default=10, help="fixed allocations to bank accounts")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every bunq call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many seconds more per bunq call")
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="answer every n-th bunq call with a 429")
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0, help="answer bunq calls with a 429")
+    parser.add_argument("--firestore-latency", type=float, default=0.0, help="seconds added to every Firestore read")
+    parser.add_argument("--payment-mode", default="single", help="PAYMENT_MODE to run with")
+    parser.add_argument("--account-fetch", default="full", help="ACCOUNT_FETCH to run with")
+    parser.add_argument("--simulate", action="store_true", help="only plan, do not send payments")
+    parser.add_argument("--runs", type=int, default=3, help="runs on the same warm clients")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="show the output of the runs themselves")
+    args = parser.parse_args(argv)
+
+    from money_flow import main as money_flow
+    from money_flow import metrics
+    from money_flow.allocation import ALLOCATION_COLLECTION, SETTINGS_COLLECTION, SETTINGS_DOCUMENT, FireStore
+    from money_flow.fakes import FakeBunqServer, FakeFault, FakeFirestoreClient
+
+    if money_flow.METRICS_LOG:
+        metrics.remove_hook(metrics.log_json)
+    fault = FakeFault(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit_every=args.rate_limit_every,
+        rate_limit_probability=args.rate_limit_probability,
+        seed=args.seed,
+    )
+    server = FakeBunqServer(accounts={}, fault=fault)
+    main_account_id = server.add_account("bank", balance=f"{args.runs * 100_000}.00", description="salary")
+    bank_ids = [server.add_account("bank") for _ in range(args.accounts)]
+    savings_ids = [server.add_account("savings") for _ in range(args.savings)]
+    client = FakeFirestoreClient(
+        {
+            ALLOCATION_COLLECTION: allocation_documents(bank_ids[: args.allocations], savings_ids),
+            SETTINGS_COLLECTION: {SETTINGS_DOCUMENT: dict(minimum="100.00", id=main_account_id)},
+        },
+        fault=FakeFault(latency=args.firestore_latency, seed=args.seed),
+    )
+
+    money_flow._secrets.update(bunq_api_key="fake-api-key", firebase_service_account={})
+    money_flow._clients["store"] = FireStore(config=None, client=client)
+    money_flow.API_CONTEXT_FILE_PATH = os.path.join(tempfile.mkdtemp(), "bunq.conf")
+    money_flow.ENVIRONMENT = "sandbox"
+    money_flow.DEVICE_DESCRIPTION = "offline-run"
+    money_flow.BUNQ_API_BASE_URL = server.url
+    money_flow.SIMULATE = args.simulate
+    money_flow.PAYMENT_MODE = args.payment_mode
+    money_flow.ACCOUNT_FETCH = args.account_fetch
+
+    request = SimpleNamespace(args=dict(metrics="true"))
+    with server:
+        for run in range(1, args.runs + 1):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else output):
+                record = money_flow.main(request)["metrics"]
+            counters = record["counters"]
+            sleeps = ", ".join(f"{name} {ms:.0f} ms" for name, ms in record["sleep_ms"].items()) or "none"
+            print(
+                f"run {run}: {record['duration_ms']:8.1f} ms, {counters.get('http.requests', 0)} bunq requests, "
+                f"{counters.get('api.retries', 0)} retries, waited {sleeps}"
+            )
+            for span in record["spans"]:
+                print(f"    {span['name']:<24} {span['duration_ms']:8.1f} ms")
+        print(
+            f"bunq: {sum(server.requests.values())} calls, {fault.rate_limited} rate limited, "
+            f"{len(server.payments)} payments; Firestore: {sum(client.reads.values())} reads"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
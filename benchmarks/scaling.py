@@ -0,0 +1,229 @@
+"""Scaling benchmark for the allocation pipeline.
+
+Times loading and parsing the allocation documents, the strategies and a complete simulated run on generated
+configurations of growing size, with as many accounts as allocations. For every case it reports throughput and peak
+memory per size, and fits how the time grows with the size: a slope of 1 on a log-log scale is linear, 2 quadratic.
+Cases that grow faster than ``--max-slope`` fail, and so do cases that got slower or bigger than the saved baseline.
+
+    python benchmarks/scaling.py [--max-size 100000] [--repeat 3] [--save-baseline] [--scale 1.0]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SIZES = (10, 100, 1_000, 10_000, 100_000)
+# Below this size fixed costs dominate, so those sizes are left out of the slope and the baseline comparison.
+MIN_SLOPE_SIZE = 1_000
+MEMORY_ALLOWANCE_KIB = 64
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "scaling_baseline.json")
+
+
+def generate(size: int) -> dict:
+    """Accounts and allocation documents in Firestore form, ``size`` of each, plus the main account settings."""
+    from money_flow.accounts import Account, AccountRegistry
+    from money_flow.allocation import Settings
+    from money_flow.money import Money
+
+    accounts = [Account(0, "salary", size * 100_000, "NL00MAIN0000000000", "bank")]
+    documents = {}
+    for i in range(1, size + 1):
+        kind = ("top_up", "fixed", "percentage")[i % 3]
+        account_type = "savings" if kind == "top_up" else "bank"
+        accounts.append(Account(i, f"account {i}", i % 500_000, f"NL00BENC{i:010d}", account_type))
+        document = dict(id=i, strategy=kind, account_type=account_type, priority=1 + i % 10)
+        if kind == "top_up":
+            document["target_balance"] = "5000.00"
+        elif kind == "fixed":
+            document.update(fixed_amount="25.00", min_amount="1.00")
+        else:
+            document["percentage"] = 0.01
+        documents[f"allocation-{i}"] = document
+    return dict(
+        accounts=AccountRegistry(accounts),
+        documents=documents,
+        settings=Settings(minimum=Money(10_000), id=0),
+    )
+
+
+def load_case(data: dict):
+    from money_flow.allocation import ALLOCATION_COLLECTION, SETTINGS_COLLECTION, SETTINGS_DOCUMENT, FireStore
+    from money_flow.fakes import FakeFirestoreClient
+
+    client = FakeFirestoreClient(
+        {
+            ALLOCATION_COLLECTION: data["documents"],
+            SETTINGS_COLLECTION: {SETTINGS_DOCUMENT: dict(minimum="100.00", id=0)},
+        }
+    )
+    store = FireStore(config=None, client=client)
+
+    def load():
+        store.load_config()
+        store.get_allocations(data["accounts"])
+
+    return load
+
+
+def strategies_case(data: dict):
+    from money_flow.money import Money
+    from money_flow.strategies import compile_strategy
+
+    allocations = _allocations(data)
+    bunq = _bunq(data["accounts"])
+    remainder = Money(data["accounts"][0].balance_cents)
+
+    def strategies():
+        for allocation in allocations:
+            compile_strategy(allocation)(remainder, bunq)
+
+    return strategies
+
+
+def run_case(data: dict):
+    from money_flow import program
+    from money_flow.automate import AutomateAllocations
+
+    allocations = _allocations(data)
+    automate = AutomateAllocations(_bunq(data["accounts"]), store=None, simulate=True)
+    # Measure a run after a configuration change, not one that finds its compiled program in the cache.
+    program._programs.clear()
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            automate.run(allocations=allocations, main_account_settings=data["settings"])
+
+    return run
+
+
+CASES = dict(load=load_case, strategies=strategies_case, run=run_case)
+
+
+def _allocations(data: dict):
+    from money_flow.allocation import allocation_from_document
+
+    return [allocation_from_document(document, data["accounts"]) for document in data["documents"].values()]
+
+
+def _bunq(accounts):
+    from money_flow.bunq import BunqLib
+
+    bunq = BunqLib("benchmark", "sandbox", "benchmark", os.path.join(tempfile.gettempdir(), "benchmark.conf"))
+    bunq.is_connected = True
+    bunq.accounts = accounts
+    return bunq
+
+
+def measure(setup, data: dict, repeat: int) -> tuple[float, int]:
+    """Return the fastest time in seconds over ``repeat`` runs and the peak memory in bytes of one more run."""
+    seconds = math.inf
+    for _ in range(repeat):
+        function = setup(data)
+        started = time.perf_counter()
+        function()
+        seconds = min(seconds, time.perf_counter() - started)
+    function = setup(data)
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def slope(points: list[tuple[int, float]]) -> float:
+    """Least squares slope of log(time) against log(size)."""
+    points = [(size, seconds) for size, seconds in points if size >= MIN_SLOPE_SIZE] or points
+    if len(points) < 2:
+        return math.nan
+    xs = [math.log(size) for size, _ in points]
+    ys = [math.log(max(seconds, 1e-9)) for _, seconds in points]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    covariance = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    return covariance / variance
+
+
+def regressions(results: dict, baseline: dict, time_tolerance: float, memory_tolerance: float) -> list[str]:
+    found = []
+    for case, sizes in results.items():
+        for size, result in sizes.items():
+            expected = baseline.get(case, {}).get(size)
+            # Timings of the smallest sizes are too noisy to compare.
+            if expected is None or int(size) < MIN_SLOPE_SIZE:
+                continue
+            if result["us_per_item"] > expected["us_per_item"] * time_tolerance:
+                found.append(
+                    f"{case} at {size}: {result['us_per_item']:.2f} us per item, "
+                    f"baseline {expected['us_per_item']:.2f} us"
+                )
+            # Small peaks vary with what the interpreter happens to allocate, hence the fixed allowance on top.
+            if result["peak_kib"] > expected["peak_kib"] * memory_tolerance + MEMORY_ALLOWANCE_KIB:
+                found.append(
+                    f"{case} at {size}: {result['peak_kib']:.0f} KiB at peak, baseline {expected['peak_kib']:.0f} KiB"
+                )
+    return found
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-size", type=int, default=SIZES[-1], help="largest number of allocations to try")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per size, the fastest one counts")
+    parser.add_argument("--cases", default=",".join(CASES), help="comma separated cases to run")
+    parser.add_argument("--max-slope", type=float, default=1.5, help="fail cases that scale worse than this")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply the baseline times, for slow machines")
+    parser.add_argument("--memory-tolerance", type=float, default=1.25, help="allowed growth of peak memory")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    sizes = [size for size in SIZES if size <= args.max_size]
+    cases = args.cases.split(",")
+    results = {case: {} for case in cases}
+    failed = False
+    for size in sizes:
+        data = generate(size)
+        for case in cases:
+            seconds, peak = measure(CASES[case], data, args.repeat)
+            results[case][str(size)] = dict(
+                seconds=round(seconds, 6),
+                us_per_item=round(seconds / size * 1e6, 3),
+                items_per_second=round(size / seconds),
+                peak_kib=round(peak / 1024, 1),
+            )
+            print(
+                f"{case:<10} {size:>7}: {seconds * 1000:9.1f} ms, {size / seconds:>11,.0f} items/s, "
+                f"{peak / 1024:9.0f} KiB peak"
+            )
+
+    for case in cases:
+        case_slope = slope([(int(size), result["seconds"]) for size, result in results[case].items()])
+        over = case_slope > args.max_slope
+        failed |= over
+        print(f"{'FAIL' if over else 'ok':>4} {case:<10} grows as n^{case_slope:.2f} (at most n^{args.max_slope})")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        found = regressions(results, baseline, args.scale * 2, args.memory_tolerance)
+        for regression in found:
+            print(f"FAIL {regression}")
+        failed |= bool(found)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+from money_flow.fakes import FakeBunqServer
+from money_flow.money import Money
+from money_flow.retry import RetryPolicy
+
+
+class TestTargetedAccountFetch:
+    def setup_method(self):
+        self.server = FakeBunqServer(accounts=dict(bank=300, savings=2)).start()
+        self.bunq = self.server.client()
+
+    def teardown_method(self):
+        self.bunq.transport.close()
+        self.server.stop()
+
+    def test_when_fetching_by_id_expect_only_those_accounts_without_listing(self):
+        # Connecting already lists the first page of bank accounts to find the primary one.
+        listed = self.server.requests["list_accounts"]
+
+        self.bunq.get_accounts(ids={1, 7, 302})
+
+        assert sorted(self.bunq.accounts) == [1, 7, 302]
+        assert self.bunq.accounts[302].type == "savings"
+        assert self.bunq.get_balance_by_id(id_=7) == Money.of("1000.00")
+        assert self.server.requests["get_account"] == 3
+        assert self.server.requests["list_accounts"] == listed
+
+
+class TestStreamedAccounts:
+    def setup_method(self):
+        self.server = FakeBunqServer(accounts=dict(bank=999, savings=2)).start()
+        # A producer that is still paging when the test ends should give up at once, not back off.
+        self.bunq = self.server.client(retry_policy=RetryPolicy(sleep=lambda _: None))
+        self.listed = self.server.requests["list_accounts"]
+
+    def teardown_method(self):
+        self.bunq.transport.close()
+        self.server.stop()
+
+    def pages_listed(self):
+        return self.server.requests["list_accounts"] - self.listed
+
+    def test_when_needed_accounts_are_on_the_first_pages_expect_paging_stopped(self):
+        # bunq lists the newest accounts first, so these are on the first page of each type.
+        self.bunq.get_accounts_streamed(ids={999, 1001})
+
+        assert {999, 1001} <= set(self.bunq.accounts)
+        # Listing everything takes five pages of bank accounts and one each of joint and savings accounts; a producer
+        # may fetch one page ahead.
+        assert self.pages_listed() <= 3
+
+    def test_when_needed_account_is_the_oldest_expect_all_pages(self):
+        self.bunq.get_accounts_streamed(ids={1})
+
+        assert 1 in self.bunq.accounts
+        assert self.pages_listed() == 7
+
+    def test_when_stream_is_closed_early_expect_paging_stopped(self):
+        stream = self.bunq.stream_accounts()
+        next(stream)
+        stream.close()
+
+        assert self.pages_listed() <= 3
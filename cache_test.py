@@ -0,0 +1,86 @@
+import tempfile
+
+from money_flow import cache
+from money_flow.accounts import Account, AccountRegistry
+from money_flow.cache import AccountSnapshotCache, snapshot_key
+from money_flow.fakes import FakeBunqServer
+from money_flow.money import Money
+
+KEY = snapshot_key("api-key", "SANDBOX")
+
+
+def expire(key):
+    cache._memory[key]["created"] -= 3600
+
+
+class TestAccountSnapshotCache:
+    def setup_method(self):
+        cache._memory.clear()
+        self.cache = AccountSnapshotCache(ttl=300, directory=tempfile.mkdtemp())
+        self.cache.store(KEY, AccountRegistry([Account(1, "salary", 100_000, "NL01", "bank")]))
+
+    def teardown_method(self):
+        cache._memory.clear()
+
+    def test_when_snapshot_is_fresh_expect_a_copy_of_the_accounts(self):
+        accounts = self.cache.load(KEY)
+        accounts.credit("NL01", Money(500))
+
+        assert self.cache.load(KEY)[1].balance_cents == 100_000
+
+    def test_when_snapshot_is_older_than_ttl_expect_it_only_when_stale_is_allowed(self):
+        expire(KEY)
+
+        assert self.cache.load(KEY) is None
+        assert self.cache.load(KEY, allow_stale=True)[1].iban == "NL01"
+
+    def test_when_instance_starts_cold_expect_snapshot_read_from_file(self):
+        cache._memory.clear()
+
+        assert self.cache.load(KEY)[1].description == "salary"
+
+    def test_when_invalidated_expect_snapshot_gone_from_memory_and_file(self):
+        self.cache.invalidate(KEY)
+
+        assert self.cache.load(KEY, allow_stale=True) is None
+        cache._memory.clear()
+        assert self.cache.load(KEY, allow_stale=True) is None
+
+
+class TestBunqSnapshots:
+    def setup_method(self):
+        cache._memory.clear()
+        self.server = FakeBunqServer(accounts=dict(bank=3)).start()
+        self.bunq = self.server.client(snapshot_cache=AccountSnapshotCache(ttl=300, directory=tempfile.mkdtemp()))
+        self.bunq.get_accounts()
+        self.listed = self.server.requests["list_accounts"]
+
+    def teardown_method(self):
+        cache._memory.clear()
+        self.bunq.transport.close()
+        self.server.stop()
+
+    def test_when_snapshot_is_fresh_expect_accounts_without_listing(self):
+        self.bunq.get_accounts()
+
+        assert len(self.bunq.accounts) == 3
+        assert self.server.requests["list_accounts"] == self.listed
+
+    def test_when_simulating_on_an_expired_snapshot_expect_it_used(self):
+        expire(self.bunq.snapshot_key)
+
+        self.bunq.get_accounts(allow_stale=True)
+        assert self.server.requests["list_accounts"] == self.listed
+
+        self.bunq.get_accounts()
+        assert self.server.requests["list_accounts"] > self.listed
+
+    def test_when_payment_is_submitted_expect_snapshot_invalidated_even_if_it_failed(self):
+        to_iban = self.server.accounts[2]["iban"]
+
+        assert self.bunq.make_payment(1, "savings", "bank", Money(100), "test", to_iban, simulate=False)
+        assert self.bunq.snapshot_cache.load(self.bunq.snapshot_key, allow_stale=True) is None
+
+        self.bunq.get_accounts()
+        assert not self.bunq.make_payment(1, "savings", "bank", Money(10**9), "test", to_iban, simulate=False)
+        assert self.bunq.snapshot_cache.load(self.bunq.snapshot_key, allow_stale=True) is None
@@ -0,0 +1,58 @@
+import json
+from unittest.mock import MagicMock, patch
+
+from money_flow import main
+
+
+class TestWarmInstanceClients:
+    def setup_method(self):
+        main._secrets.clear()
+        main._clients.clear()
+        self.secret_names = []
+        self.bunq = MagicMock()
+        self.bunq.is_healthy.return_value = False
+        self.patches = [
+            patch.object(main, "get_secret_value", side_effect=self.get_secret_value),
+            patch.object(main, "FireStore", side_effect=lambda **_: MagicMock()),
+            patch.object(main, "make_bunq", return_value=self.bunq),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def teardown_method(self):
+        for p in self.patches:
+            p.stop()
+        main._secrets.clear()
+        main._clients.clear()
+
+    def get_secret_value(self, secret_name, project_id):
+        self.secret_names.append(secret_name)
+        return json.dumps(dict(project_id="test")) if secret_name == "firebase_service_account" else "api-key"
+
+    def test_when_invoked_repeatedly_expect_secrets_fetched_once_and_clients_reused(self):
+        assert self.secret_names == []
+
+        store = main.get_store()
+        bunq = main.get_bunq()
+
+        assert main.get_store() is store
+        assert main.get_bunq() is bunq
+        assert sorted(self.secret_names) == ["bunq_api_key", "firebase_service_account"]
+        main.make_bunq.assert_called_once_with("api-key", main.API_CONTEXT_FILE_PATH)
+
+    def test_when_session_is_still_fresh_expect_no_reconnect(self):
+        main.get_bunq()
+        self.bunq.is_healthy.return_value = True
+
+        main.get_bunq()
+
+        self.bunq.connect.assert_called_once()
+
+    def test_when_clients_are_reset_expect_new_clients_but_same_secrets(self):
+        store = main.get_store()
+
+        main.reset_clients()
+
+        store.close.assert_called_once()
+        assert main.get_store() is not store
+        assert len(self.secret_names) == 2
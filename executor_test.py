@@ -0,0 +1,117 @@
+import threading
+import time
+from unittest.mock import MagicMock
+
+from money_flow.accounts import Account, AccountRegistry
+from money_flow.executor import PlanExecutor
+from money_flow.fakes import FakeBunqServer
+from money_flow.money import Money
+from money_flow.planner import Plan, Transfer
+
+
+def transfer(priority, iban):
+    return Transfer(
+        priority=priority,
+        to_account_alias=iban,
+        to_account_type="bank",
+        to_iban=iban,
+        amount=Money(100),
+        description=f"Deel salaris voor {iban}",
+        remainder=Money(0),
+    )
+
+
+class TestConcurrentPlanExecutor:
+    def setup_method(self):
+        self.plan = Plan(
+            main_account_id=0,
+            amount_to_sort=Money(1000),
+            transfers=(transfer(1, "NL01"), transfer(1, "NL02"), transfer(1, "NL03"), transfer(2, "NL04")),
+            remainder=Money(600),
+        )
+        self.events = []
+        self.lock = threading.Lock()
+        self.bunq = MagicMock(max_concurrent_requests=3)
+        self.bunq.send_payment.side_effect = self.send_payment
+        self.bunq.accounts = AccountRegistry(
+            [Account(id_, f"account {id_}", 0, f"NL0{id_}", "bank") for id_ in (1, 2, 3, 4)]
+        )
+
+    def send_payment(self, to_iban, **_):
+        with self.lock:
+            self.events.append(("start", to_iban))
+        time.sleep(0.05)
+        with self.lock:
+            self.events.append(("end", to_iban))
+        if to_iban == "NL02":
+            raise ConnectionError("connection reset")
+        return True
+
+    def test_when_sending_expect_group_in_parallel_and_groups_in_order(self):
+        executor = PlanExecutor(self.bunq, simulate=False, payment_mode="concurrent")
+
+        executor.execute(self.plan)
+
+        assert {iban for event, iban in self.events[:3]} == {"NL01", "NL02", "NL03"}
+        assert all(event == "start" for event, _ in self.events[:3])
+        assert self.events[-2:] == [("start", "NL04"), ("end", "NL04")]
+
+    def test_when_payment_fails_expect_failure_collected_per_transfer(self):
+        executor = PlanExecutor(self.bunq, simulate=False, payment_mode="concurrent")
+
+        results = executor.execute(self.plan)
+
+        assert [(result.transfer.to_iban, result.succeeded) for result in results] == [
+            ("NL01", True),
+            ("NL02", False),
+            ("NL03", True),
+            ("NL04", True),
+        ]
+
+    def test_when_payment_fails_expect_only_the_accounts_that_were_paid_credited(self):
+        PlanExecutor(self.bunq, simulate=False, payment_mode="concurrent").execute(self.plan)
+
+        assert [self.bunq.accounts[id_].balance_cents for id_ in (1, 2, 3, 4)] == [100, 0, 100, 100]
+
+    def test_when_simulating_expect_no_account_credited(self):
+        PlanExecutor(self.bunq, simulate=True, payment_mode="concurrent").execute(self.plan)
+
+        assert [self.bunq.accounts[id_].balance_cents for id_ in (1, 2, 3, 4)] == [0, 0, 0, 0]
+
+
+class TestBatchPlanExecutor:
+    def setup_method(self):
+        self.server = FakeBunqServer(accounts=dict(bank=5)).start()
+        self.bunq = self.server.client()
+        ibans = [self.server.accounts[id_]["iban"] for id_ in (2, 3, 4, 5)]
+        self.plan = Plan(
+            main_account_id=1,
+            amount_to_sort=Money(1000),
+            transfers=(transfer(1, ibans[0]), transfer(1, ibans[1]), transfer(1, ibans[2]), transfer(2, ibans[3])),
+            remainder=Money(600),
+        )
+
+    def teardown_method(self):
+        self.bunq.transport.close()
+        self.server.stop()
+
+    def test_when_paying_per_group_expect_one_batch_per_priority_group(self):
+        results = PlanExecutor(self.bunq, simulate=False, payment_mode="group").execute(self.plan)
+
+        assert all(result.succeeded for result in results)
+        assert self.server.requests["create_payment_batch"] == 2
+        assert self.server.requests["create_payment"] == 0
+        assert self.server.balance(1) == Money.of("996.00")
+        assert [self.server.balance(id_) for id_ in (2, 3, 4, 5)] == [Money.of("1001.00")] * 4
+
+    def test_when_paying_per_run_expect_a_single_batch(self):
+        PlanExecutor(self.bunq, simulate=False, payment_mode="run").execute(self.plan)
+
+        assert self.server.requests["create_payment_batch"] == 1
+        assert len(self.server.payments) == 4
+
+    def test_when_simulating_expect_no_batch_sent(self):
+        results = PlanExecutor(self.bunq, simulate=True, payment_mode="group").execute(self.plan)
+
+        assert all(result.succeeded for result in results)
+        assert self.server.requests["create_payment_batch"] == 0
@@ -0,0 +1,70 @@
+from money_flow.allocation import ALLOCATION_COLLECTION, SETTINGS_COLLECTION, SETTINGS_DOCUMENT, FireStore
+from money_flow.fakes import FakeBunqServer, FakeFirestoreClient
+from money_flow.money import Money
+from money_flow.retry import RetryPolicy
+
+
+class TestFakeBunqServer:
+    def setup_method(self):
+        self.server = FakeBunqServer(accounts=dict(bank=250, savings=2)).start()
+        self.sleeps = []
+        self.bunq = self.server.client(retry_policy=RetryPolicy(sleep=self.sleeps.append))
+        self.server.fault.rate_limit_every = 3
+
+    def teardown_method(self):
+        self.bunq.transport.close()
+        self.server.stop()
+
+    def test_when_listing_accounts_expect_all_pages_despite_rate_limits(self):
+        self.bunq.get_accounts()
+
+        assert len(self.bunq.accounts) == 252
+        assert self.server.requests["list_accounts"] >= 4
+        assert self.server.fault.rate_limited > 0
+        assert len(self.sleeps) == self.server.fault.rate_limited
+
+    def test_when_paying_expect_balances_moved_on_the_server(self):
+        to_iban = self.server.accounts[251]["iban"]
+
+        assert self.bunq.make_payment(1, "savings", "savings", Money(2500), "test", to_iban, simulate=False)
+
+        assert self.server.balance(1) == Money.of("975.00")
+        assert self.server.balance(251) == Money.of("1025.00")
+        [payment] = self.server.payments
+        assert payment.pop("created")
+        assert payment == dict(from_id=1, to_iban=to_iban, cents=2500, description="test")
+
+
+class TestFakeFirestoreClient:
+    def setup_method(self):
+        self.client = FakeFirestoreClient(
+            {
+                ALLOCATION_COLLECTION: dict(
+                    stocks=dict(id=2, strategy="fixed", account_type="bank", fixed_amount="50.00", priority=1)
+                ),
+                SETTINGS_COLLECTION: {SETTINGS_DOCUMENT: dict(minimum="100.00", id=1)},
+            }
+        )
+        self.store = FireStore(config=None, client=self.client)
+
+    def test_when_reloading_expect_only_changed_documents_fetched(self):
+        self.store.load_config()
+        self.store.load_config()
+        self.client.set(ALLOCATION_COLLECTION, "bonds", dict(id=3, strategy="fixed", account_type="bank", priority=2))
+
+        documents, settings = self.store.load_config()
+
+        assert settings.id == 1
+        assert sorted(document["id"] for document in documents) == [2, 3]
+        assert self.client.reads["get_all"] == 2
+
+    def test_when_listening_expect_changes_without_reads(self):
+        self.store.listen()
+        self.client.set(SETTINGS_COLLECTION, SETTINGS_DOCUMENT, dict(minimum="200.00", id=1))
+        reads = sum(self.client.reads.values())
+
+        documents, settings = self.store.load_config()
+
+        assert settings.minimum == Money.of("200.00")
+        assert len(documents) == 1
+        assert sum(self.client.reads.values()) == reads
@@ -0,0 +1,213 @@
+import tempfile
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from money_flow.allocation import Settings
+from money_flow.automate import AutomateAllocations
+from money_flow.fakes import FakeBunqServer, FakeFirestoreClient
+from money_flow.journal import (
+    DONE,
+    FAILED,
+    PENDING,
+    AccountLocked,
+    FirestoreJournalStore,
+    LocalJournalStore,
+    RunJournal,
+)
+from money_flow.money import Money
+from money_flow.planner import Plan, Transfer
+
+
+def transfer(priority, iban, amount):
+    return Transfer(
+        priority=priority,
+        to_account_alias=iban,
+        to_account_type="bank",
+        to_iban=iban,
+        amount=Money(amount),
+        description=f"Deel salaris voor {iban}",
+        remainder=Money(0),
+    )
+
+
+class TestResumeRun:
+    def setup_method(self):
+        self.plan = Plan(
+            main_account_id=1,
+            amount_to_sort=Money(1000),
+            transfers=(transfer(1, "NL01", 100), transfer(1, "NL02", 200), transfer(2, "NL03", 300)),
+            remainder=Money(400),
+        )
+        self.journal = RunJournal(LocalJournalStore(tempfile.mkdtemp()))
+        self.failing = {"NL02"}
+        self.sent = []
+        self.bunq = MagicMock(max_concurrent_requests=3, accounts=None)
+        self.bunq.make_payment.side_effect = self.make_payment
+        self.bunq.get_recent_payments.return_value = []
+        self.store = MagicMock()
+        self.store.get_main_account_settings.return_value = Settings(minimum=Money(0), id=1)
+
+    def make_payment(self, to_iban, request_id, **_):
+        self.sent.append((to_iban, request_id))
+        return to_iban not in self.failing
+
+    def automate(self):
+        return AutomateAllocations(bunq=self.bunq, store=self.store, simulate=False, journal=self.journal)
+
+    def test_when_run_fails_partway_expect_next_run_to_send_only_what_is_left(self):
+        automate = self.automate()
+        automate.plan = MagicMock(return_value=self.plan)
+        automate.run()
+        first_attempt = dict(self.sent)
+        self.failing.clear()
+        self.sent.clear()
+
+        assert self.automate().resume()
+
+        assert self.sent == [("NL02", first_attempt["NL02"])]
+        assert self.journal.open(1) == []
+        assert not self.automate().resume()
+
+    def test_when_run_fails_expect_transfer_states_in_journal(self):
+        automate = self.automate()
+        automate.plan = MagicMock(return_value=self.plan)
+
+        automate.run()
+
+        [journal_run] = self.journal.open(1)
+        assert [journal_run.status(t) for t in self.plan.transfers] == [DONE, FAILED, DONE]
+
+    def test_when_transfer_still_fails_on_resume_expect_it_given_up_and_journal_closed(self):
+        automate = self.automate()
+        automate.plan = MagicMock(return_value=self.plan)
+        automate.run()
+        self.sent.clear()
+
+        assert self.automate().resume()
+
+        assert [to_iban for to_iban, _ in self.sent] == ["NL02"]
+        assert self.journal.open(1) == []
+        assert not self.automate().resume()
+
+    def test_when_runs_overlap_expect_each_its_own_journal(self):
+        journal = RunJournal(FirestoreJournalStore(FakeFirestoreClient()))
+        first = journal.begin(self.plan)
+        second = journal.begin(self.plan)
+        journal.claim("payment-7")
+
+        assert [run.run_id for run in journal.open(1)] == [first.run_id, second.run_id]
+        first.mark(self.plan.transfers, DONE)
+        first.close()
+        assert [run.run_id for run in journal.open(1)] == [second.run_id]
+
+    def test_when_claims_are_older_than_ttl_expect_them_forgotten_on_open(self):
+        for store in (self.journal.store, FirestoreJournalStore(FakeFirestoreClient())):
+            journal = RunJournal(store)
+            journal.claim("payment-7")
+            journal.claim("payment-8")
+            store.put("payment-7", dict(store.get("payment-7"), created=time.time() - 2 * journal.ttl))
+
+            journal.open(1)
+
+            assert store.get("payment-7") is None
+            assert not journal.claim("payment-8")
+
+    def test_when_journal_is_too_old_expect_it_dropped(self):
+        journal_run = self.journal.begin(self.plan)
+        journal_run.entry["created"] = time.time() - 2 * self.journal.ttl
+        journal_run.save()
+
+        assert not self.automate().resume()
+        assert self.journal.open(1) == []
+
+
+class TestAccountLock:
+    def setup_method(self):
+        self.journal = RunJournal(LocalJournalStore(tempfile.mkdtemp()), lock_ttl=60)
+
+    def test_when_account_is_held_expect_other_runs_refused_until_it_is_released(self):
+        with self.journal.lock(1):
+            with pytest.raises(AccountLocked):
+                with self.journal.lock(1):
+                    pass
+            with self.journal.lock(2):
+                pass
+
+        with self.journal.lock(1):
+            pass
+
+    def test_when_lock_was_left_by_a_crashed_run_expect_it_taken_over(self):
+        self.journal.store.put("lock-1", dict(created=time.time() - 120, token="crashed"))
+
+        with self.journal.lock(1):
+            assert self.journal.store.get("lock-1")["token"] != "crashed"
+
+        assert self.journal.store.get("lock-1") is None
+
+    def test_when_two_runs_take_over_the_same_stale_lock_expect_only_one_to_get_it(self):
+        for store in (self.journal.store, FirestoreJournalStore(FakeFirestoreClient())):
+            stale = dict(created=time.time() - 120, token="crashed")
+            store.put("lock-1", stale)
+
+            assert store.replace("lock-1", stale, dict(created=time.time(), token="first"))
+            assert not store.replace("lock-1", stale, dict(created=time.time(), token="second"))
+
+            assert store.get("lock-1")["token"] == "first"
+
+    def test_when_run_outlived_its_lock_expect_it_not_to_release_the_new_holder(self):
+        with self.journal.lock(1):
+            self.journal.store.put("lock-1", dict(created=time.time(), token="next"))
+
+        assert self.journal.store.get("lock-1")["token"] == "next"
+
+
+class TestIdempotencyKeys:
+    def test_when_paying_with_journal_expect_request_id_sent_to_bunq(self):
+        with FakeBunqServer(accounts=dict(bank=2)) as server:
+            bunq = server.client()
+            journal = RunJournal(LocalJournalStore(tempfile.mkdtemp()))
+            journal_run = journal.begin(
+                Plan(1, Money(1000), (transfer(1, server.accounts[2]["iban"], 100),), Money(900))
+            )
+            automate = AutomateAllocations(bunq=bunq, store=MagicMock(), simulate=False, payment_mode="group")
+
+            automate.executor.execute(journal_run.plan, journal=journal_run)
+
+            [request_id] = server.payment_request_ids
+            assert request_id.startswith(journal_run.run_id)
+            bunq.transport.close()
+
+
+class TestReconcileOnResume:
+    def setup_method(self):
+        self.server = FakeBunqServer(accounts=dict(bank=3)).start()
+        self.bunq = self.server.client()
+        self.journal = RunJournal(LocalJournalStore(tempfile.mkdtemp()))
+        self.store = MagicMock()
+        self.store.get_main_account_settings.return_value = Settings(minimum=Money(0), id=1)
+        self.plan = Plan(
+            1,
+            Money(1000),
+            (transfer(1, self.server.accounts[2]["iban"], 100), transfer(1, self.server.accounts[3]["iban"], 200)),
+            Money(700),
+        )
+
+    def teardown_method(self):
+        self.bunq.transport.close()
+        self.server.stop()
+
+    def test_when_payment_went_through_but_was_never_marked_done_expect_it_not_sent_again(self):
+        journal_run = self.journal.begin(self.plan)
+        sent, unsent = self.plan.transfers
+        journal_run.mark([sent, unsent], PENDING)
+        # The run crashed right after bunq took the first payment.
+        self.bunq.send_payment(1, sent.to_account_alias, sent.amount, journal_run.description(sent), sent.to_iban)
+        automate = AutomateAllocations(bunq=self.bunq, store=self.store, simulate=False, journal=self.journal)
+
+        assert automate.resume()
+
+        assert [payment["to_iban"] for payment in self.server.payments] == [sent.to_iban, unsent.to_iban]
+        assert self.server.balance(1) == Money.of("997.00")
+        assert self.journal.open(1) == []
@@ -0,0 +1,62 @@
+import json
+
+from money_flow.listing import parse_account_page, parse_payment_page
+
+
+def account_json(id_, status="ACTIVE", balance="189.56"):
+    return dict(
+        id=id_,
+        description=f"account {id_}",
+        status=status,
+        balance=dict(value=balance, currency="EUR"),
+        alias=[dict(type="IBAN", value=f"NL76BUNQ206365500{id_}", name="T. Test")],
+    )
+
+
+class TestParseAccountPage:
+    def test_when_parsing_expect_active_accounts_and_pagination(self):
+        body = json.dumps(
+            dict(
+                Response=[
+                    dict(MonetaryAccountSavings=account_json(1)),
+                    dict(MonetaryAccountSavings=account_json(2, status="CANCELLED")),
+                ],
+                Pagination=dict(older_url="/v1/user/1/monetary-account-savings?count=200&older_id=1"),
+            )
+        ).encode()
+
+        accounts, pagination = parse_account_page(body, "savings", fallback=None)
+
+        assert [(a.id_, a.description, a.balance_cents, a.iban, a.type) for a in accounts] == [
+            (1, "account 1", 18956, "NL76BUNQ2063655001", "savings")
+        ]
+        assert pagination["older_url"].endswith("older_id=1")
+
+    def test_when_item_has_unexpected_shape_expect_fallback(self):
+        body = json.dumps(dict(Response=[dict(MonetaryAccountBank=account_json(1, balance=None))])).encode()
+        fallen_back = []
+
+        accounts, pagination = parse_account_page(body, "bank", fallback=fallen_back.append)
+
+        assert accounts == []
+        assert [item["id"] for item in fallen_back] == [1]
+        assert pagination is None
+
+
+class TestParsePaymentPage:
+    def test_when_parsing_expect_signed_cents_counterparty_and_unix_time(self):
+        payment = dict(
+            id=9,
+            created="2026-10-18 09:00:00.000000",
+            amount=dict(value="-12.50", currency="EUR"),
+            description="Deel salaris voor sparen (abc-0)",
+            counterparty_alias=dict(iban="NL01", display_name="T. Test"),
+        )
+        body = json.dumps(dict(Response=[dict(Payment=payment)], Pagination=dict(older_url=None))).encode()
+
+        [parsed], pagination = parse_payment_page(body)
+
+        assert parsed == dict(
+            id=9, cents=-1250, iban="NL01", description="Deel salaris voor sparen (abc-0)", created=1792314000.0
+        )
+        assert pagination == dict(older_url=None)
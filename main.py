@@ -1,6 +1,6 @@
 # main.py is now located at src/money_flow/main.py
 # This file is kept for backward compatibility and will import and run the new main.
-from src.money_flow.main import main
+from src.money_flow.main import batch, main, webhook  # noqa: F401
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from money_flow import metrics
+
+
+class TestMetrics:
+    def setup_method(self):
+        self.records = []
+        metrics.add_hook(self.records.append)
+
+    def teardown_method(self):
+        metrics.remove_hook(self.records.append)
+
+    def test_when_run_finishes_expect_nested_spans_and_counters_in_record(self):
+        with metrics.run("test"):
+            with metrics.span("load"):
+                with metrics.span("bunq.get_accounts"):
+                    metrics.count("api.GET monetary-account-bank", 2)
+                metrics.add_sleep("rate_limit", 0.25)
+            with metrics.span("plan"):
+                pass
+
+        [record] = self.records
+        assert [(span["name"], [child["name"] for child in span.get("children", [])]) for span in record["spans"]] == [
+            ("load", ["bunq.get_accounts"]),
+            ("plan", []),
+        ]
+        assert record["counters"] == {"api.GET monetary-account-bank": 2}
+        assert record["sleep_ms"] == {"rate_limit": 250.0}
+
+    def test_when_work_runs_in_threads_expect_it_reported_under_calling_span(self):
+        @metrics.timed("page")
+        def fetch_page(_):
+            metrics.count("pages")
+
+        with metrics.run("test"):
+            with metrics.span("load"):
+                with ThreadPoolExecutor(max_workers=3) as executor:
+                    list(executor.map(metrics.propagate(fetch_page), range(3)))
+
+        [record] = self.records
+        assert [child["name"] for child in record["spans"][0]["children"]] == ["page"] * 3
+        assert record["counters"] == {"pages": 3}
+
+    def test_when_no_run_active_expect_nothing_recorded(self):
+        with metrics.span("load"):
+            metrics.count("pages")
+
+        assert self.records == []
@@ -0,0 +1,30 @@
+from decimal import Decimal
+
+from money_flow.money import Money, to_cents
+
+
+class TestMoney:
+    def test_when_converting_expect_exact_cents(self):
+        assert to_cents(Decimal("189.56")) == 18956
+        assert to_cents("0.105") == 10
+        assert to_cents(0.29) == 29
+        assert to_cents(12) == 1200
+
+    def test_when_taking_percentage_expect_half_even_cents(self):
+        assert Money(3189_56).percentage(50.0) == Money(1594_78)
+        assert Money(1).percentage(50) == Money(0)
+        assert Money(3).percentage(50) == Money(2)
+        assert Money(10000).percentage("33.33") == Money(3333)
+
+    def test_when_mixing_with_decimals_expect_money(self):
+        total = Decimal("10.00") + Money(250)
+        assert isinstance(total, Money)
+        assert total == Decimal("12.50")
+        assert Money(250) < 3
+        assert f"{Money(123456):,.2f}" == "1,234.56"
+
+    def test_when_comparing_expect_equal_values_to_hash_alike_and_floats_never_equal(self):
+        assert Money(1250) == Decimal("12.5") and hash(Money(1250)) == hash(Decimal("12.5"))
+        assert Money(100) == 1 and hash(Money(100)) == hash(1)
+        assert Money.of(0.1) != 0.1
+        assert {Money(1250): "rent"}[Decimal("12.50")] == "rent"
@@ -0,0 +1,117 @@
+import json
+from unittest.mock import patch
+
+from money_flow import main
+from money_flow.allocation import FireStore
+from money_flow.automate import AutomateAllocations
+from money_flow.fakes import FakeBunqServer, FakeFirestoreClient
+from money_flow.journal import FirestoreJournalStore, RunJournal
+from money_flow.money import Money
+from money_flow.notifications import parse_payment_notification
+
+
+def notification(payment_id, account_id, value, category="PAYMENT"):
+    payment = dict(id=payment_id, monetary_account_id=account_id, amount=dict(value=value, currency="EUR"))
+    return json.dumps(dict(NotificationUrl=dict(category=category, object=dict(Payment=payment)))).encode()
+
+
+class TestParsePaymentNotification:
+    def test_when_money_comes_in_expect_payment(self):
+        payment = parse_payment_notification(notification(7, 1, "2500.00"))
+
+        assert (payment.id, payment.monetary_account_id, payment.amount) == (7, 1, Money.of("2500.00"))
+
+    def test_when_money_goes_out_or_category_is_unrelated_expect_none(self):
+        assert parse_payment_notification(notification(7, 1, "-25.00")) is None
+        assert parse_payment_notification(notification(7, 1, "25.00", category="CARD_TRANSACTION_SUCCESSFUL")) is None
+
+
+class TestWebhook:
+    def setup_method(self):
+        self.server = FakeBunqServer(accounts=dict(bank=3)).start()
+        self.client = FakeFirestoreClient(
+            dict(
+                allocation=dict(
+                    savings=dict(id=2, strategy="percentage", account_type="bank", percentage=50.0, priority=1)
+                ),
+                settings=dict(salary_account=dict(minimum="0.00", id=1)),
+            )
+        )
+        self.bunq = self.server.client()
+        self.store = FireStore(config=None, client=self.client)
+        self.journal = RunJournal(FirestoreJournalStore(self.client))
+        main._clients.clear()
+        self.patches = [
+            patch.object(main, "get_bunq", return_value=self.bunq),
+            patch.object(main, "get_store", return_value=self.store),
+            patch.object(main, "make_journal", return_value=self.journal),
+            patch.object(main, "SIMULATE", False),
+        ]
+        for p in self.patches:
+            p.start()
+
+    def teardown_method(self):
+        for p in self.patches:
+            p.stop()
+        main._clients.clear()
+        self.bunq.transport.close()
+        self.server.stop()
+
+    def deliver(self, body, headers=None):
+        return main._handle_notification(body, {"X-Bunq-Server-Signature": self.server.sign(body), **(headers or {})})
+
+    def test_when_salary_comes_in_expect_only_the_new_money_sorted_once(self):
+        self.bunq.get_accounts()
+        listed = self.server.requests["list_accounts"]
+        body = notification(7, 1, "400.00")
+
+        assert self.deliver(body) == "Success"
+        assert self.deliver(body) == "Duplicate"
+
+        assert self.server.balance(2) == Money.of("1200.00")
+        assert self.server.requests["list_accounts"] == listed
+
+    def test_when_a_transfer_fails_expect_cached_accounts_dropped(self):
+        self.bunq.get_accounts()
+
+        # Half of it is more than the main account holds.
+        self.deliver(notification(7, 1, "4000.00"))
+
+        assert self.server.payments == []
+        assert self.bunq.accounts is None
+
+    def test_when_signature_is_wrong_expect_rejected(self):
+        body = notification(7, 1, "400.00")
+
+        result = self.deliver(body, {"X-Bunq-Server-Signature": self.server.sign(b"something else")})
+
+        assert result == ("Invalid signature", 401)
+        assert self.server.payments == []
+
+    def test_when_payment_is_for_another_account_expect_ignored_without_reading_settings_again(self):
+        with patch.object(self.store, "get_main_account_settings", wraps=self.store.get_main_account_settings) as get:
+            assert self.deliver(notification(7, 3, "400.00")) == "Ignored"
+            assert self.deliver(notification(8, 3, "400.00")) == "Ignored"
+
+        assert get.call_count == 1
+        assert self.server.payments == []
+
+    def test_when_scheduled_run_sorted_the_salary_first_expect_notification_a_duplicate(self):
+        assert self.bunq.send_payment(3, "salary", Money.of("400.00"), "salary", self.server.accounts[1]["iban"])
+        salary_id = len(self.server.payments)
+        automate = AutomateAllocations(bunq=self.bunq, store=self.store, simulate=False, journal=self.journal)
+        automate.sort_balance(claim_incoming=True)
+        assert self.server.balance(2) == Money.of("1700.00")
+
+        assert self.deliver(notification(salary_id, 1, "400.00")) == "Duplicate"
+
+        assert self.server.balance(2) == Money.of("1700.00")
+
+    def test_when_another_run_holds_the_account_expect_notification_left_for_redelivery(self):
+        body = notification(7, 1, "400.00")
+
+        with self.journal.lock(1):
+            assert self.deliver(body) == ("Busy", 503)
+
+        assert self.server.payments == []
+        assert self.deliver(body) == "Success"
@@ -0,0 +1,75 @@
+from money_flow.allocation import Allocation, Settings
+from money_flow.money import Money
+from money_flow.planner import plan_allocations
+
+default_allocation_kwargs = {
+    "account_type": "bank",
+}
+
+
+class TestPlanAllocations:
+    def setup_method(self):
+        self.settings = Settings(minimum=Money.of("1500.00"), id=0)
+        self.balances = {
+            "NL76BUNQ2063655001": Money.of("3800.00"),
+            "NL76BUNQ2063655002": Money.of("189.56"),
+        }
+        self.allocations = [
+            Allocation(
+                description="safety net",
+                strategy="top_up",
+                iban="NL76BUNQ2063655001",
+                target_balance=Money.of("4000.00"),
+                priority=1,
+                **default_allocation_kwargs,
+            ),
+            Allocation(
+                description="groceries",
+                strategy="top_up",
+                iban="NL76BUNQ2063655002",
+                target_balance=Money.of("250.00"),
+                priority=1,
+                **default_allocation_kwargs,
+            ),
+            Allocation(
+                description="pleasure",
+                strategy="fixed",
+                iban="NL76BUNQ2063655003",
+                fixed_amount=Money.of("250.00"),
+                priority=1,
+                **default_allocation_kwargs,
+            ),
+            Allocation(
+                description="stocks",
+                strategy="percentage",
+                iban="NL76BUNQ2063655004",
+                percentage=50.0,
+                priority=2,
+                **default_allocation_kwargs,
+            ),
+        ]
+
+    def test_when_mixed_flow_expect_transfers_in_priority_order_with_running_remainders(self):
+        plan = plan_allocations(Money.of("3700.00"), self.settings, self.allocations, self.balances)
+
+        assert [(t.to_account_alias, t.amount, t.remainder) for t in plan.transfers] == [
+            ("safety net", Money.of("200.00"), Money.of("3500.00")),
+            ("groceries", Money.of("60.44"), Money.of("3439.56")),
+            ("pleasure", Money.of("250.00"), Money.of("3189.56")),
+            ("stocks", Money.of("1594.78"), Money.of("1594.78")),
+        ]
+        assert plan.remainder == Money.of("1594.78")
+        assert plan.main_account_id == 0
+
+    def test_when_planning_expect_balances_left_untouched(self):
+        plan_allocations(Money.of("3700.00"), self.settings, self.allocations, self.balances)
+
+        assert self.balances["NL76BUNQ2063655001"] == Money.of("3800.00")
+
+    def test_when_same_account_topped_up_twice_expect_second_top_up_to_see_first_transfer(self):
+        allocations = [self.allocations[0], self.allocations[0]]
+        allocations[1] = Allocation(**{**vars(self.allocations[0]), "priority": 2})
+
+        plan = plan_allocations(Money.of("3700.00"), self.settings, allocations, self.balances)
+
+        assert [t.amount for t in plan.transfers] == [Money.of("200.00")]
@@ -0,0 +1,56 @@
+import pytest
+
+from money_flow.allocation import Allocation, InvalidAllocationError
+from money_flow.money import Money
+from money_flow.program import compile_allocations, validate_documents
+
+
+class TestCompileAllocations:
+    def setup_method(self):
+        self.allocations = [
+            Allocation(
+                description="stocks",
+                strategy="percentage",
+                iban="NL04",
+                account_type="bank",
+                percentage=50.0,
+                priority=2,
+            ),
+            Allocation(
+                description="pleasure",
+                strategy="fixed",
+                iban="NL03",
+                account_type="bank",
+                fixed_amount=Money.of("250.00"),
+                priority=1,
+            ),
+        ]
+
+    def test_when_compiling_expect_steps_grouped_by_priority(self):
+        program = compile_allocations(self.allocations)
+
+        assert [(priority, [step.to_account_alias for step in steps]) for priority, steps in program.groups] == [
+            (1, ["pleasure"]),
+            (2, ["stocks"]),
+        ]
+
+    def test_when_config_unchanged_expect_cached_program(self):
+        program = compile_allocations(self.allocations)
+        allocations = [Allocation(**vars(allocation)) for allocation in self.allocations]
+        allocations[0].current_balance = Money(100)
+
+        assert compile_allocations(allocations) is program
+
+    def test_when_fixed_amount_missing_expect_error_before_planning(self):
+        self.allocations[1].fixed_amount = None
+
+        with pytest.raises(InvalidAllocationError, match="fixed_amount"):
+            compile_allocations(self.allocations)
+
+    def test_when_documents_invalid_expect_error(self):
+        with pytest.raises(InvalidAllocationError, match="unknown strategy"):
+            validate_documents([dict(id=3, strategy="all_in", account_type="bank", priority=1)])
+        with pytest.raises(InvalidAllocationError, match="iban"):
+            validate_documents(
+                [dict(description="x", strategy="fixed", fixed_amount=1, account_type="bank", priority=1)]
+            )
@@ -0,0 +1,73 @@
+from money_flow.ratelimit import RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket:
+    def setup_method(self):
+        self.clock = FakeClock()
+
+    def test_when_acquiring_in_a_burst_expect_no_more_than_the_limit_in_any_window(self):
+        bucket = TokenBucket(3, 3.0, clock=self.clock, sleep=self.clock.sleep)
+
+        times = []
+        for _ in range(7):
+            bucket.acquire()
+            times.append(self.clock.now)
+
+        assert times == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0, 6.0]
+        assert all(sum(start <= t < start + 3.0 for t in times) <= 3 for start in times)
+
+    def test_when_idle_long_enough_expect_no_wait(self):
+        bucket = TokenBucket(5, 3.0, clock=self.clock, sleep=self.clock.sleep)
+        bucket.acquire()
+        self.clock.now += 10
+
+        assert bucket.acquire() == 0.0
+        assert self.clock.sleeps == []
+
+
+class TestRateLimiter:
+    def setup_method(self):
+        self.clock = FakeClock()
+        self.limiter = RateLimiter(
+            max_concurrent_requests=1,
+            limits={"GET": (1, 3.0)},
+            clock=self.clock,
+            sleep=self.sleep,
+        )
+        self.slot_free_while_waiting = []
+
+    def sleep(self, seconds):
+        acquired = self.limiter.semaphore.acquire(blocking=False)
+        if acquired:
+            self.limiter.semaphore.release()
+        self.slot_free_while_waiting.append(acquired)
+        self.clock.sleep(seconds)
+
+    def test_when_waiting_for_a_token_expect_concurrency_slot_not_held(self):
+        for _ in range(3):
+            with self.limiter.request("GET", "monetary-account-bank"):
+                pass
+
+        assert self.clock.sleeps == [3.0, 3.0]
+        assert self.slot_free_while_waiting == [True, True]
+
+    def test_when_endpoints_differ_expect_separate_buckets(self):
+        with self.limiter.request("GET", "monetary-account-bank"):
+            pass
+        with self.limiter.request("GET", "monetary-account-savings"):
+            pass
+
+        assert self.clock.sleeps == []
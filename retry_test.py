@@ -0,0 +1,86 @@
+import pytest
+from bunq.sdk.exception.api_exception import ApiException
+from requests.exceptions import ConnectionError, ConnectTimeout, ReadTimeout
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+from money_flow.retry import RetriesExhausted, RetryPolicy
+
+
+def api_error(response_code):
+    return ApiException("failed", response_code, "response-id")
+
+
+def refused():
+    reason = NewConnectionError(None, "Connection refused")
+    return ConnectionError(MaxRetryError(None, "/v1/payment", reason))
+
+
+class Flaky:
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+class TestRetryPolicy:
+    def setup_method(self):
+        self.sleeps = []
+        self.headers = {}
+        self.policy = RetryPolicy(max_attempts=3, sleep=self.sleeps.append, response_headers=lambda: self.headers)
+
+    def test_when_reads_fail_transiently_expect_retried_until_success(self):
+        request = Flaky(api_error(503), ReadTimeout())
+
+        assert self.policy.call(request) == "ok"
+        assert request.calls == 3
+        assert len(self.sleeps) == 2
+
+    def test_when_attempts_run_out_expect_retries_exhausted(self):
+        with pytest.raises(RetriesExhausted):
+            self.policy.call(Flaky(api_error(503), api_error(503), api_error(503)))
+
+    def test_when_error_is_permanent_expect_raised_without_retry(self):
+        request = Flaky(api_error(400))
+
+        with pytest.raises(ApiException):
+            self.policy.call(request)
+        assert request.calls == 1
+
+    @pytest.mark.parametrize("error", [api_error(503), ReadTimeout(), ConnectionError("Connection aborted")])
+    def test_when_payment_may_have_reached_bunq_expect_no_retry(self, error):
+        request = Flaky(error)
+
+        with pytest.raises(type(error)):
+            self.policy.submit(request)
+        assert request.calls == 1
+
+    @pytest.mark.parametrize("error", [api_error(429), ConnectTimeout(), refused()])
+    def test_when_payment_never_reached_bunq_expect_retry(self, error):
+        request = Flaky(error)
+
+        assert self.policy.submit(request) == "ok"
+        assert request.calls == 2
+
+    def test_when_response_has_retry_after_expect_waited_at_least_that_long(self):
+        self.headers = {"Retry-After": "12"}
+
+        self.policy.call(Flaky(api_error(429)))
+
+        assert self.sleeps[0] >= 12
+
+    def test_when_error_came_without_a_response_expect_older_retry_after_ignored(self):
+        self.headers = {"Retry-After": "12"}
+
+        self.policy.call(Flaky(ReadTimeout()))
+
+        assert self.sleeps[0] < 12
+
+    def test_when_rate_limited_without_retry_after_expect_waited_a_full_window(self):
+        self.policy.call(Flaky(api_error(429)))
+
+        assert self.sleeps[0] >= 3.0
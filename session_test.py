@@ -0,0 +1,80 @@
+import os
+import tempfile
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+from bunq.sdk.context.api_context import ApiContext
+from bunq.sdk.context.api_environment_type import ApiEnvironmentType
+
+from money_flow.fakes import FakeBunqServer
+from money_flow.ratelimit import RateLimiter
+from money_flow.session import SessionManager
+from money_flow.transport import PooledTransport, use
+
+
+class TestSessionManager:
+    def setup_method(self):
+        self.server = FakeBunqServer().start()
+        self.transport = PooledTransport(base_url=self.server.url)
+        self.path = os.path.join(tempfile.mkdtemp(), "bunq.conf")
+
+    def teardown_method(self):
+        self.transport.close()
+        self.server.stop()
+
+    def manager(self):
+        return SessionManager("fake-api-key", ApiEnvironmentType.SANDBOX, "test", self.path)
+
+    def get_api_context(self, manager, rate_limiter=None):
+        with use(self.transport):
+            return manager.get_api_context(rate_limiter)
+
+    def test_when_context_is_fresh_expect_it_reused_without_requests_or_saving(self):
+        manager = self.manager()
+        api_context = self.get_api_context(manager)
+        requests = sum(self.server.requests.values())
+        api_context.save = MagicMock()
+
+        assert self.get_api_context(manager) is api_context
+
+        assert sum(self.server.requests.values()) == requests
+        api_context.save.assert_not_called()
+
+    def test_when_session_is_about_to_expire_expect_new_session_saved(self):
+        manager = self.manager()
+        api_context = self.get_api_context(manager)
+        old_token = api_context.token
+        api_context.session_context._expiry_time = datetime.now()
+
+        self.get_api_context(manager)
+
+        assert self.server.requests["session_server"] == 2
+        assert api_context.token != old_token
+        assert ApiContext.restore(self.path).token == api_context.token
+
+    def test_when_context_file_exists_expect_no_new_installation(self):
+        self.get_api_context(self.manager())
+
+        self.get_api_context(self.manager())
+
+        assert self.server.requests["installation"] == 1
+        assert self.server.requests["device_server"] == 1
+
+    def test_when_sessions_are_created_in_quick_succession_expect_them_rate_limited(self):
+        now = [0.0]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            now[0] += seconds
+
+        rate_limiter = RateLimiter(clock=lambda: now[0], sleep=sleep)
+        manager = self.manager()
+        api_context = self.get_api_context(manager, rate_limiter)
+        api_context.session_context._expiry_time = datetime.now()
+
+        self.get_api_context(manager, rate_limiter)
+
+        assert self.server.requests["session_server"] == 2
+        assert sum(sleeps) == pytest.approx(30.0)
@@ -0,0 +1,58 @@
+from collections.abc import Mapping
+
+from money_flow.money import Money, to_cents
+
+
+class Account:
+    __slots__ = ("id_", "description", "balance_cents", "iban", "type")
+
+    def __init__(self, id_: int, description: str, balance_cents: int, iban: str, type: str):
+        self.id_ = id_
+        self.description = description
+        self.balance_cents = balance_cents
+        self.iban = iban
+        self.type = type
+
+    @property
+    def balance(self) -> Money:
+        return Money(self.balance_cents)
+
+    def __repr__(self):
+        return (
+            f"Account(id_={self.id_!r}, description={self.description!r}, balance={self.balance}, "
+            f"iban={self.iban!r}, type={self.type!r})"
+        )
+
+
+class AccountRegistry(Mapping):
+    def __init__(self, accounts=()):
+        self._by_id = {}
+        self._by_iban = {}
+        self._by_description = {}
+        for account in accounts:
+            self.add(account)
+
+    def add(self, account: Account):
+        self._by_id[account.id_] = account
+        self._by_iban[account.iban] = account
+        self._by_description.setdefault(account.description, account)
+
+    def __getitem__(self, id_: int) -> Account:
+        return self._by_id[id_]
+
+    def __iter__(self):
+        return iter(self._by_id)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get_by_iban(self, iban: str):
+        return self._by_iban.get(iban)
+
+    def get_by_description(self, description: str):
+        return self._by_description.get(description)
+
+    def credit(self, iban: str, amount: Money):
+        account = self._by_iban.get(iban)
+        if account is not None:
+            account.balance_cents += to_cents(amount)
@@ -1,9 +1,18 @@
-from dataclasses import dataclass
-from decimal import Decimal
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from typing import Optional
 
-import firebase_admin
-from firebase_admin import credentials, firestore
+from money_flow import metrics
+from money_flow.money import Money
+
+
+class InvalidAllocationError(ValueError):
+    pass
+
+
+class MissingSettingsError(LookupError):
+    pass
 
 
 @dataclass
@@ -13,59 +22,241 @@ class Allocation:
     iban: str
     account_type: str
     percentage: Optional[float] = None
-    target_balance: Optional[Decimal] = None
-    fixed_amount: Optional[Decimal] = None
-    max_amount: Optional[Decimal] = None
-    min_amount: Optional[Decimal] = None
+    target_balance: Optional[Money] = None
+    fixed_amount: Optional[Money] = None
+    max_amount: Optional[Money] = None
+    min_amount: Optional[Money] = None
     priority: Optional[int] = None
-    current_balance: Optional[Decimal] = None
+    current_balance: Optional[Money] = None
 
 
 @dataclass
 class Settings:
-    minimum: Decimal
+    minimum: Money
     id: int
 
 
+ALLOCATION_COLLECTION = "allocation"
+SETTINGS_COLLECTION = "settings"
+SETTINGS_DOCUMENT = "salary_account"
+
+
 class FireStore:
-    def __init__(self, config: str):
-        try:
-            firebase_admin.get_app()
-        except ValueError:
-            cred = credentials.Certificate(config)
-            firebase_admin.initialize_app(cred)
-        self.db = firestore.client()
+    def __init__(
+        self,
+        config: str,
+        listen: bool = False,
+        client=None,
+        allocation_collection: str = ALLOCATION_COLLECTION,
+        settings_collection: str = SETTINGS_COLLECTION,
+        settings_document: str = SETTINGS_DOCUMENT,
+    ):
+        self.db = client if client is not None else _firestore_client(config)
+        self.allocation_collection = allocation_collection
+        self.settings_collection = settings_collection
+        self.settings_document = settings_document
+        # Documents and their parsed allocations are kept per document id together with the update time they were
+        # read at, so that warm instances only fetch and parse what changed since the previous run.
+        self._lock = threading.Lock()
+        self._documents = {}
+        self._settings = None
+        self._watches = []
+        self._allocations_synced = threading.Event()
+        self._settings_synced = threading.Event()
+        if listen:
+            self.listen()
+
+    def _settings_reference(self):
+        return self.db.collection(self.settings_collection).document(self.settings_document)
 
     def get_main_account_settings(self):
-        data = self.db.collection("settings").document("salary_account").get().to_dict()
-        return Settings(minimum=Decimal(data.get("minimum")), id=data.get("id"))
-
-    def get_allocations(self, accounts):
-        data = self.db.collection("allocation").stream()
-
-        def pop_value_to_decimal(kwargs, key):
-            value = kwargs.pop(key, None)
-            return Decimal(value) if value else None
-
-        def transform_data(doc):
-            kwargs: dict = doc.to_dict()
-            max_amount = pop_value_to_decimal(kwargs, "max_amount")
-            min_amount = pop_value_to_decimal(kwargs, "min_amount")
-            fixed_amount = pop_value_to_decimal(kwargs, "fixed_amount")
-            target_balance = pop_value_to_decimal(kwargs, "target_balance")
-            bunq_id = kwargs.pop("id", None)
-            current_balance = None
-            if bunq_id:
-                kwargs["description"] = accounts[bunq_id]["description"]
-                kwargs["iban"] = accounts[bunq_id]["iban"]
-                current_balance = Decimal(accounts[bunq_id]["balance"])
-            return Allocation(
-                **kwargs,
-                max_amount=max_amount,
-                min_amount=min_amount,
-                target_balance=target_balance,
-                current_balance=current_balance,
-                fixed_amount=fixed_amount,
-            )
-
-        return list(map(transform_data, data))
+        if self.is_listening():
+            with self._lock:
+                return self._settings
+        # A single document read, without listing the allocation collection like load_config does.
+        settings = settings_from_snapshot(self._settings_reference().get())
+        metrics.count("firestore.documents_read")
+        with self._lock:
+            self._settings = settings
+        return settings
+
+    def get_allocation_documents(self):
+        return self.load_config()[0]
+
+    @metrics.timed("firestore.load_config")
+    def load_config(self):
+        """Return the allocation documents and the main account settings.
+
+        Unchanged documents come from the cache. While listening, the cache is kept current by Firestore itself and
+        nothing is read at all; otherwise the settings and the update times of all allocation documents are read
+        concurrently, followed by a single batch read of the documents that changed.
+        """
+        if self.is_listening():
+            metrics.count("firestore.listener_hits")
+            with self._lock:
+                return self._cached_documents(), self._settings
+        from google.cloud.firestore_v1.field_path import FieldPath
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            settings = executor.submit(lambda: self._settings_reference().get())
+            # Projecting on the document name only returns update times, not the document contents.
+            listing = list(self.db.collection(self.allocation_collection).select([FieldPath.document_id()]).stream())
+            settings = settings.result()
+        with self._lock:
+            changed = [
+                snapshot.reference
+                for snapshot in listing
+                if snapshot.id not in self._documents or self._documents[snapshot.id][0] != snapshot.update_time
+            ]
+        fetched = {snapshot.id: snapshot for snapshot in self.db.get_all(changed)} if changed else {}
+        metrics.count("firestore.documents_read", len(fetched) + 1)
+        metrics.count("firestore.documents_cached", len(listing) - len(fetched))
+        with self._lock:
+            self._documents = {
+                snapshot.id: self._documents[snapshot.id]
+                if snapshot.id not in fetched
+                else _cache_entry(fetched[snapshot.id])
+                for snapshot in listing
+            }
+            self._settings = settings_from_snapshot(settings)
+            return self._cached_documents(), self._settings
+
+    def _cached_documents(self):
+        return [entry[1] for entry in self._documents.values()]
+
+    def listen(self):
+        if self._watches:
+            return
+        self._watches = [
+            self.db.collection(self.allocation_collection).on_snapshot(self._on_allocations),
+            self._settings_reference().on_snapshot(self._on_settings),
+        ]
+
+    def is_listening(self) -> bool:
+        return self._allocations_synced.is_set() and self._settings_synced.is_set()
+
+    def close(self):
+        for watch in self._watches:
+            watch.unsubscribe()
+        self._watches = []
+        self._allocations_synced.clear()
+        self._settings_synced.clear()
+
+    def _on_allocations(self, snapshots, changes, read_time):
+        with self._lock:
+            self._documents = {
+                snapshot.id: (
+                    self._documents[snapshot.id]
+                    if snapshot.id in self._documents and self._documents[snapshot.id][0] == snapshot.update_time
+                    else _cache_entry(snapshot)
+                )
+                for snapshot in snapshots
+            }
+        self._allocations_synced.set()
+
+    def _on_settings(self, snapshots, changes, read_time):
+        # Firestore calls this from its own thread, where an exception would silently end the listener.
+        if not snapshots or not snapshots[0].exists:
+            print(f"Settings document {self.settings_collection}/{self.settings_document} is missing")
+            self._settings_synced.clear()
+            return
+        with self._lock:
+            self._settings = settings_from_snapshot(snapshots[0])
+        self._settings_synced.set()
+
+    @staticmethod
+    def get_referenced_account_ids(documents, main_account_id):
+        # Top-ups need the current balance of their target account, which can only be found by IBAN
+        # in a full listing when the document does not name the bunq account id.
+        if any(not doc.get("id") and doc.get("strategy") == "top_up" for doc in documents):
+            return None
+        return {doc["id"] for doc in documents if doc.get("id")} | {main_account_id}
+
+    def get_allocations(self, accounts, documents=None):
+        if documents is not None:
+            return [allocation_from_document(doc, accounts) for doc in documents]
+        # Without explicit documents, the allocations parsed for the last loaded configuration are reused.
+        with self._lock:
+            entries = list(self._documents.values())
+        if not entries and not self.is_listening():
+            self.load_config()
+            with self._lock:
+                entries = list(self._documents.values())
+        return [_with_account(allocation, bunq_id, accounts) for _, _, allocation, bunq_id in entries]
+
+
+def _firestore_client(config: str):
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    try:
+        firebase_admin.get_app()
+    except ValueError:
+        cred = credentials.Certificate(config)
+        firebase_admin.initialize_app(cred)
+    return firestore.client()
+
+
+def settings_from_snapshot(snapshot) -> Settings:
+    data = snapshot.to_dict()
+    if data is None:
+        raise MissingSettingsError(
+            f"Settings document {snapshot.id!r} does not exist, it should hold the main account id and minimum"
+        )
+    return Settings(minimum=Money.of(data.get("minimum")), id=data.get("id"))
+
+
+def _cache_entry(snapshot):
+    document = snapshot.to_dict()
+    return snapshot.update_time, document, *parse_document(document)
+
+
+def _pop_value_to_money(kwargs, key):
+    value = kwargs.pop(key, None)
+    return Money.of(value) if value else None
+
+
+def _parse_allocation(kwargs: dict, bunq_id=None) -> Allocation:
+    kwargs = dict(kwargs)
+    max_amount = _pop_value_to_money(kwargs, "max_amount")
+    min_amount = _pop_value_to_money(kwargs, "min_amount")
+    fixed_amount = _pop_value_to_money(kwargs, "fixed_amount")
+    target_balance = _pop_value_to_money(kwargs, "target_balance")
+    if bunq_id:
+        # Filled in from the bunq account for every run, since its description and IBAN may change.
+        kwargs.setdefault("description", None)
+        kwargs.setdefault("iban", None)
+    return Allocation(
+        **kwargs,
+        max_amount=max_amount,
+        min_amount=min_amount,
+        target_balance=target_balance,
+        fixed_amount=fixed_amount,
+    )
+
+
+def _with_account(allocation: Allocation, bunq_id, accounts) -> Allocation:
+    if not bunq_id:
+        return replace(allocation)
+    if accounts is None:
+        raise InvalidAllocationError(
+            f"Allocation {allocation.description or bunq_id!r} refers to bunq account {bunq_id}, but no accounts "
+            "were given to look it up in"
+        )
+    account = accounts[bunq_id]
+    return replace(allocation, description=account.description, iban=account.iban, current_balance=account.balance)
+
+
+def parse_document(doc: dict):
+    """Return the allocation described by ``doc`` and the bunq account id it refers to, if any."""
+    kwargs: dict = dict(doc)
+    bunq_id = kwargs.pop("id", None)
+    try:
+        return _parse_allocation(kwargs, bunq_id), bunq_id
+    except (TypeError, ArithmeticError) as e:
+        raise InvalidAllocationError(f"Invalid allocation document {doc.get('description', bunq_id)!r}: {e}") from e
+
+
+def allocation_from_document(doc: dict, accounts=None) -> Allocation:
+    allocation, bunq_id = parse_document(doc)
+    return _with_account(allocation, bunq_id, accounts)
@@ -1,63 +1,156 @@
-from itertools import groupby
+import time
+from contextlib import nullcontext
 
+from money_flow import metrics
 from money_flow.allocation import FireStore
 from money_flow.bunq import BunqLib
-from money_flow.strategies import all_strategies
+from money_flow.executor import PlanExecutor
+from money_flow.journal import CLOCK_SKEW, RunJournal
+from money_flow.planner import Plan, plan_allocations
+from money_flow.program import validate_documents
+
+
+class _BunqBalances:
+    def __init__(self, bunq: BunqLib):
+        self.bunq = bunq
+
+    def get(self, iban: str):
+        return self.bunq.get_balance_by_iban(iban=iban)
 
 
 class AutomateAllocations:
-    def __init__(self, bunq: BunqLib, store: FireStore, simulate: bool = True):
+    def __init__(
+        self,
+        bunq: BunqLib,
+        store: FireStore,
+        simulate: bool = True,
+        payment_mode: str = "single",
+        payment_workers: int = None,
+        journal: RunJournal = None,
+    ):
         self.bunq = bunq
         self.store = store
+        # Simulated runs move no money, so there is nothing to resume.
+        self.journal = journal if not simulate else None
         self.main_account_balance = None
         self.simulate = simulate
+        self.executor = PlanExecutor(bunq, simulate=simulate, payment_mode=payment_mode, workers=payment_workers)
+
+    @metrics.timed("load")
+    def load(self, fetch: str = "full"):
+        documents, main_account_settings = self.store.load_config()
+        # A broken config should fail before anything is asked from bunq.
+        validate_documents(documents)
+        ids = None
+        if fetch in ("targeted", "stream"):
+            ids = self.store.get_referenced_account_ids(documents, main_account_settings.id)
+        if fetch == "stream":
+            self.bunq.get_accounts_streamed(ids=ids, allow_stale=self.simulate)
+        else:
+            self.bunq.get_accounts(ids=ids, allow_stale=self.simulate)
+        return self.store.get_allocations(self.bunq.accounts), main_account_settings
 
-    def run(self):
-        allocations = self.store.get_allocations(self.bunq.accounts)
-        sorted_allocations = sorted(allocations, key=lambda x: x.priority)
-        grouped_allocations = groupby(sorted_allocations, key=lambda x: x.priority)
-        main_account_settings = self.store.get_main_account_settings()
-        self.main_account_balance = self.bunq.get_balance_by_id(id_=main_account_settings.id)
-        remainder = self.main_account_balance
-        print(f"{remainder:,.2f} EUR to sort...")
-
-        for _, group in grouped_allocations:
-            allocations = list(group)
-            # for allocation in filter(lambda a: a.strategy != "percentage", allocations):
-            #     remainder = self._process_allocation(
-            #         allocation, main_account_settings, remainder
-            #     )
-            original_remainder = remainder
-            for allocation in allocations:  # filter(lambda a: a.strategy == "percentage", allocations):
-                remainder = self._process_allocation(
-                    allocation,
-                    main_account_settings,
-                    remainder,
-                    original_remainder=original_remainder,
+    @metrics.timed("plan")
+    def plan(self, allocations=None, main_account_settings=None, amount_to_sort=None) -> Plan:
+        if allocations is None or main_account_settings is None:
+            _, settings = self.store.load_config()
+            if allocations is None:
+                allocations = self.store.get_allocations(self.bunq.accounts)
+            if main_account_settings is None:
+                main_account_settings = settings
+        if amount_to_sort is None:
+            amount_to_sort = self.main_account_balance = self.bunq.get_balance_by_id(id_=main_account_settings.id)
+        return plan_allocations(amount_to_sort, main_account_settings, allocations, _BunqBalances(self.bunq))
+
+    def resume(self) -> bool:
+        """Give the runs previous invocations left open one more try, and return whether there were any.
+
+        What still does not go through is given up, so its money is sorted again by the plan that follows.
+        """
+        if self.journal is None:
+            return False
+        journal_runs = self.journal.open(self.store.get_main_account_settings().id)
+        for journal_run in journal_runs:
+            metrics.count("journal.resumed")
+            print(f"Resuming run {journal_run.run_id} from {time.ctime(journal_run.entry['created'])}...")
+            if journal_run.attempted():
+                # A transfer that was sent without being recorded as done may well have gone through.
+                payments = self.bunq.get_recent_payments(
+                    journal_run.plan.main_account_id, since=journal_run.entry["created"] - CLOCK_SKEW
                 )
-        return "Success"
+                metrics.count("journal.reconciled", journal_run.reconcile(payments))
+            self._execute(journal_run.plan, journal_run, abandon=True)
+        return bool(journal_runs)
+
+    def exclusive(self):
+        """Hold the main account for the block; see ``RunJournal.lock``. Without a journal this does nothing."""
+        if self.journal is None:
+            return nullcontext()
+        return self.journal.lock(self.store.get_main_account_settings().id)
 
-    def _process_allocation(self, allocation, main_account_settings, remainder, *, original_remainder=None):
-        strategy = all_strategies.get(allocation.strategy)
-        amount = strategy(
-            allocation,
-            original_remainder if original_remainder else remainder,
-            bunq=self.bunq,
+    def sort_balance(self, fetch: str = "full", claim_incoming: bool = False):
+        """Resume open runs, then sort the whole balance of the main account, holding the account throughout.
+
+        With ``claim_incoming``, the payments that came in since the journal TTL are claimed the way the webhook
+        claims them, so that it does not sort the money of one of them a second time once it is notified of it.
+        """
+        with self.exclusive():
+            self.resume()
+            allocations, main_account_settings = self.load(fetch=fetch)
+            if claim_incoming and self.journal is not None:
+                # Claimed only after the balance was read, so that every payment the balance has is claimed. One
+                # that comes in meanwhile is claimed without being sorted and waits for the next run.
+                self.claim_incoming(main_account_settings.id)
+            return self.run(allocations=allocations, main_account_settings=main_account_settings)
+
+    def claim_incoming(self, main_account_id) -> int:
+        """Claim the payments that came in on the main account within the journal TTL, and return how many were new."""
+        payments = self.bunq.get_recent_payments(main_account_id, since=time.time() - self.journal.ttl)
+        claimed = sum(self.journal.claim(f"payment-{payment['id']}") for payment in payments if payment["cents"] > 0)
+        metrics.count("journal.claimed", claimed)
+        return claimed
+
+    @metrics.timed("load")
+    def load_cached(self):
+        """Like ``load``, but from the accounts this client already has, fetching only when it has none."""
+        documents, main_account_settings = self.store.load_config()
+        validate_documents(documents)
+        if self.bunq.accounts is None:
+            ids = self.store.get_referenced_account_ids(documents, main_account_settings.id)
+            self.bunq.get_accounts(ids=ids, allow_stale=True)
+        return self.store.get_allocations(self.bunq.accounts), main_account_settings
+
+    def allocate_incoming(self, amount):
+        """Sort only ``amount``, money that just came in on the main account, instead of its whole balance.
+
+        Top-ups are planned against the balances this client last saw, so money taken out of a target account since
+        then is only made up for by the next full run.
+        """
+        allocations, main_account_settings = self.load_cached()
+        return self.run(allocations=allocations, main_account_settings=main_account_settings, amount_to_sort=amount)
+
+    def run(self, allocations=None, main_account_settings=None, amount_to_sort=None):
+        plan = self.plan(
+            allocations=allocations, main_account_settings=main_account_settings, amount_to_sort=amount_to_sort
         )
-        if amount > 0:
-            self.bunq.make_payment(
-                from_account_id=main_account_settings.id,
-                to_account_alias=allocation.description,
-                to_account_type=allocation.account_type,
-                amount=amount,
-                description=f"Deel salaris voor {allocation.description}",
-                to_iban=allocation.iban,
-                simulate=self.simulate,
-                original_amount_to_sort=self.main_account_balance,
+        print(f"{plan.amount_to_sort:,.2f} EUR to sort...")
+        journal_run = self.journal.begin(plan) if self.journal is not None and plan.transfers else None
+        self._execute(plan, journal_run)
+        return "Success"
+
+    def _execute(self, plan: Plan, journal_run=None, abandon: bool = False):
+        results = self.executor.execute(plan, journal=journal_run)
+        failed = [result.transfer for result in results if not result.succeeded]
+        metrics.count("transfers", len(results))
+        metrics.count("transfers.failed", len(failed))
+        if failed:
+            print(
+                f"{len(failed)} of {len(results)} transfers failed: "
+                + ", ".join(f"{transfer.amount:.2f} EUR to {transfer.to_account_alias}" for transfer in failed)
             )
-            remainder -= amount
-            # Update account balance
-            for key, account_info in self.bunq.accounts.items():
-                if account_info["iban"] == allocation.iban:
-                    self.bunq.accounts[key]["balance"] += float(amount)
-        return remainder
+        if failed or self.simulate:
+            # Warm instances sort incoming money against the accounts they already have. After a run that did not
+            # move all of its money, those are read again rather than trusted.
+            self.bunq.accounts = None
+        if journal_run is not None:
+            journal_run.close(abandon=abandon)
@@ -0,0 +1,121 @@
+from dataclasses import dataclass
+from itertools import groupby
+
+import numpy as np
+
+from money_flow.allocation import Allocation
+from money_flow.money import basis_points, to_cents
+
+
+@dataclass(frozen=True)
+class BacktestResult:
+    allocations: tuple
+    ibans: tuple
+    # All amounts are in cents. Balances are taken at the end of each month, after spending.
+    amounts: np.ndarray  # (months, allocations, scenarios)
+    balances: np.ndarray  # (months, accounts, scenarios)
+    main_balances: np.ndarray  # (months, scenarios)
+
+
+def _per_month(values, months: int, scenarios: int) -> np.ndarray:
+    values = np.asarray(values, dtype=np.int64)
+    if values.ndim == 1:
+        values = values[:, None]
+    return np.broadcast_to(values, (months, scenarios))
+
+
+def _percentage_in_cents(base: np.ndarray, percentage) -> np.ndarray:
+    # Same rounding as Money.percentage: basis points, then half-even integer division.
+    quotient, rest = np.divmod(base * basis_points(percentage), 10000)
+    round_up = (2 * rest > 10000) | ((2 * rest == 10000) & (quotient % 2 == 1))
+    return quotient + round_up
+
+
+def _cents_or_none(value):
+    return to_cents(value) if value else None
+
+
+def backtest(
+    allocations: list[Allocation],
+    salaries,
+    spending: dict = None,
+    initial_balances: dict = None,
+    main_balance: int = 0,
+) -> BacktestResult:
+    """Replay monthly allocation runs for many scenarios at once.
+
+    ``salaries`` holds the cents coming into the main account per month, with shape (months,) or (months, scenarios).
+    ``spending`` maps IBANs to the cents spent from that account per month and ``initial_balances`` maps IBANs to
+    starting balances in cents. Every month follows ``AutomateAllocations.run``: allocations are evaluated per
+    priority group against the remainder from before the group, and whatever is not allocated stays on the main account.
+    """
+    salaries = np.asarray(salaries, dtype=np.int64)
+    months = salaries.shape[0]
+    scenarios = salaries.shape[1] if salaries.ndim > 1 else 1
+    salaries = _per_month(salaries, months, scenarios)
+
+    ordered = tuple(sorted(allocations, key=lambda x: x.priority))
+    ibans = tuple(dict.fromkeys(allocation.iban for allocation in ordered))
+    column = {iban: i for i, iban in enumerate(ibans)}
+
+    balances = np.zeros((len(ibans), scenarios), dtype=np.int64)
+    for iban, balance in (initial_balances or {}).items():
+        balances[column[iban]] = balance
+    spent = np.zeros((months, len(ibans), scenarios), dtype=np.int64)
+    for iban, values in (spending or {}).items():
+        spent[:, column[iban]] = _per_month(values, months, scenarios)
+
+    groups = [
+        [
+            (
+                allocation.strategy,
+                column[allocation.iban],
+                _cents_or_none(allocation.target_balance),
+                _cents_or_none(allocation.fixed_amount),
+                _cents_or_none(allocation.max_amount),
+                _cents_or_none(allocation.min_amount) or 0,
+                allocation.percentage,
+            )
+            for allocation in group
+        ]
+        for _, group in groupby(ordered, key=lambda x: x.priority)
+    ]
+
+    amounts = np.zeros((months, len(ordered), scenarios), dtype=np.int64)
+    balance_history = np.zeros((months, len(ibans), scenarios), dtype=np.int64)
+    main_history = np.zeros((months, scenarios), dtype=np.int64)
+    main = np.full(scenarios, main_balance, dtype=np.int64)
+    for month in range(months):
+        remainder = main + salaries[month]
+        index = 0
+        for group in groups:
+            original_remainder = remainder.copy()
+            for strategy, col, target_balance, fixed_amount, max_amount, min_amount, percentage in group:
+                base = np.where(original_remainder != 0, original_remainder, remainder)
+                if strategy == "top_up":
+                    amount = np.minimum(target_balance - balances[col], base)
+                    if max_amount:
+                        amount = np.minimum(amount, max_amount)
+                elif strategy == "fixed":
+                    amount = np.minimum(fixed_amount, base)
+                elif strategy == "percentage":
+                    amount = _percentage_in_cents(base, percentage)
+                else:
+                    raise ValueError(f"Unknown strategy {strategy!r}")
+                amount = np.where(amount > min_amount, amount, 0)
+                remainder -= amount
+                balances[col] += amount
+                amounts[month, index] = amount
+                index += 1
+        main = remainder
+        balances -= spent[month]
+        balance_history[month] = balances
+        main_history[month] = main
+
+    return BacktestResult(
+        allocations=ordered,
+        ibans=ibans,
+        amounts=amounts,
+        balances=balance_history,
+        main_balances=main_history,
+    )
@@ -0,0 +1,182 @@
+"""Runs money-flow for several tenants in one invocation.
+
+Every tenant has its own bunq API key, settings document and allocation collection. The bunq SDK keeps its API
+context in process-wide state, so tenants run in separate worker processes. Tenants that share an API key run one
+after the other in the same process and client, so together they stay within the rate budget of that key.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, fields
+
+from money_flow import metrics
+from money_flow.allocation import ALLOCATION_COLLECTION, SETTINGS_COLLECTION, SETTINGS_DOCUMENT, FireStore
+from money_flow.automate import AutomateAllocations
+from money_flow.main import (
+    ACCOUNT_FETCH,
+    API_CONTEXT_FILE_PATH,
+    PAYMENT_MODE,
+    PAYMENT_WORKERS,
+    PROJECT_ID,
+    SIMULATE,
+    WEBHOOK_ENABLED,
+    get_secret_value,
+    make_bunq,
+    make_journal,
+)
+
+FIRESTORE_SECRET = "firebase_service_account"
+DEFAULT_API_KEY_SECRET = "bunq_api_key"
+
+
+@dataclass(frozen=True)
+class Tenant:
+    name: str
+    api_key_secret: str = DEFAULT_API_KEY_SECRET
+    api_context_file: str = None
+    allocation_collection: str = ALLOCATION_COLLECTION
+    settings_collection: str = SETTINGS_COLLECTION
+    settings_document: str = SETTINGS_DOCUMENT
+
+    @property
+    def api_context_file_path(self) -> str:
+        if self.api_context_file:
+            return self.api_context_file
+        # The key a single-tenant setup uses keeps its context file, so that it needs no new device installation.
+        if self.api_key_secret == DEFAULT_API_KEY_SECRET:
+            return API_CONTEXT_FILE_PATH or "bunq.conf"
+        root, extension = os.path.splitext(API_CONTEXT_FILE_PATH or "bunq.conf")
+        return f"{root}-{self.api_key_secret}{extension}"
+
+
+def load_tenants(path: str) -> list[Tenant]:
+    """Read the tenants from a JSON file with a list of objects, one per tenant, keyed like ``Tenant``."""
+    if not path:
+        raise ValueError("No tenants file configured, set TENANTS_FILE")
+    with open(path) as f:
+        entries = json.load(f)
+    known = {field.name for field in fields(Tenant)}
+    tenants = []
+    for entry in entries:
+        unknown = set(entry) - known
+        if unknown or "name" not in entry:
+            raise ValueError(f"Invalid tenant {entry.get('name')!r}: unknown keys {sorted(unknown)} or no name")
+        tenants.append(Tenant(**entry))
+    names = [tenant.name for tenant in tenants]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Tenant names are not unique: {names}")
+    return tenants
+
+
+def get_tenant_secrets(tenants: list[Tenant]) -> dict:
+    names = sorted({tenant.api_key_secret for tenant in tenants} | {FIRESTORE_SECRET})
+    with ThreadPoolExecutor(max_workers=len(names)) as executor:
+        values = dict(zip(names, executor.map(lambda name: get_secret_value(name, PROJECT_ID), names)))
+    values[FIRESTORE_SECRET] = json.loads(values[FIRESTORE_SECRET])
+    return values
+
+
+def run_batch(tenants: list[Tenant], workers: int = 4) -> dict:
+    """Run all tenants and return a report with the outcome and metrics of each, in the order they were given."""
+    started = time.perf_counter()
+    secrets = get_tenant_secrets(tenants)
+    groups = {}
+    for tenant in tenants:
+        groups.setdefault(tenant.api_key_secret, []).append(tenant)
+    reports = {}
+    # Spawned workers start without the parent's threads and gRPC channels, and every group gets a fresh process so
+    # that no SDK state carries over from one API key to the next.
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(workers, len(groups))),
+        mp_context=multiprocessing.get_context("spawn"),
+        max_tasks_per_child=1,
+    ) as executor:
+        futures = {
+            executor.submit(run_group, group, secrets[key], secrets[FIRESTORE_SECRET]): group
+            for key, group in groups.items()
+        }
+        for future in as_completed(futures):
+            try:
+                group_reports = future.result()
+            except Exception as error:
+                group_reports = [_report(tenant, error, None) for tenant in futures[future]]
+            reports.update((report["tenant"], report) for report in group_reports)
+    ordered = [reports[tenant.name] for tenant in tenants]
+    return dict(
+        duration_ms=round((time.perf_counter() - started) * 1000, 3),
+        succeeded=sum(report["succeeded"] for report in ordered),
+        failed=sum(not report["succeeded"] for report in ordered),
+        tenants=ordered,
+    )
+
+
+def run_group(tenants: list[Tenant], api_key: str, firestore_config) -> list[dict]:
+    bunq_ = make_bunq(api_key, tenants[0].api_context_file_path)
+    return [run_tenant(tenant, bunq_, lambda tenant=tenant: _store(tenant, firestore_config)) for tenant in tenants]
+
+
+def run_tenant(tenant: Tenant, bunq_, get_store) -> dict:
+    error = None
+    with metrics.run(f"money-flow/{tenant.name}") as run:
+        try:
+            if not bunq_.is_healthy():
+                bunq_.connect()
+            store = get_store()
+            automate = AutomateAllocations(
+                bunq=bunq_,
+                store=store,
+                simulate=SIMULATE,
+                payment_mode=PAYMENT_MODE,
+                payment_workers=PAYMENT_WORKERS,
+                journal=make_journal(store),
+            )
+            automate.sort_balance(fetch=ACCOUNT_FETCH, claim_incoming=WEBHOOK_ENABLED)
+        except Exception as e:
+            print(f"Tenant {tenant.name} failed: {type(e).__name__}: {e}")
+            error = e
+    return _report(tenant, error, run.record())
+
+
+def _store(tenant: Tenant, firestore_config) -> FireStore:
+    return FireStore(
+        config=firestore_config,
+        allocation_collection=tenant.allocation_collection,
+        settings_collection=tenant.settings_collection,
+        settings_document=tenant.settings_document,
+    )
+
+
+def _report(tenant: Tenant, error, record) -> dict:
+    counters = record["counters"] if record else {}
+    return dict(
+        tenant=tenant.name,
+        succeeded=error is None and not counters.get("transfers.failed"),
+        error=f"{type(error).__name__}: {error}" if error is not None else None,
+        transfers=counters.get("transfers", 0),
+        failed_transfers=counters.get("transfers.failed", 0),
+        metrics=record,
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run money-flow for every tenant in a tenants file.")
+    parser.add_argument("tenants", help="JSON file with a list of tenants")
+    parser.add_argument("--workers", type=int, default=4, help="tenants run at the same time")
+    args = parser.parse_args(argv)
+
+    report = run_batch(load_tenants(args.tenants), workers=args.workers)
+    for tenant in report["tenants"]:
+        status = "ok" if tenant["succeeded"] else "FAIL"
+        print(f"{status:>4} {tenant['tenant']}: {tenant['transfers']} transfers, {tenant['failed_transfers']} failed")
+        if tenant["error"]:
+            print(f"     {tenant['error']}")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
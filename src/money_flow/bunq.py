@@ -1,18 +1,30 @@
-import time
-from decimal import Decimal
-from os.path import isfile
-
-from bunq.sdk.context.api_context import ApiContext
-from bunq.sdk.context.api_environment_type import ApiEnvironmentType
-from bunq.sdk.context.bunq_context import BunqContext
-from bunq.sdk.http.pagination import Pagination
-from bunq.sdk.model.generated.endpoint import (
-    MonetaryAccountBankApiObject,
-    MonetaryAccountJointApiObject,
-    MonetaryAccountSavingsApiObject,
-    PaymentApiObject,
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import cache
+
+from money_flow import metrics
+from money_flow.accounts import Account, AccountRegistry
+from money_flow.cache import AccountSnapshotCache, snapshot_key
+from money_flow.listing import parse_account_page, parse_payment_page
+from money_flow.money import Money, to_cents
+from money_flow.ratelimit import RateLimiter
+from money_flow.retry import RetriesExhausted, RetryPolicy
+from money_flow.session import get_session_manager
+
+ACCOUNT_TYPES = ("bank", "joint", "savings")
+ACCOUNT_ENDPOINTS = dict(
+    bank="monetary-account-bank",
+    joint="monetary-account-joint",
+    savings="monetary-account-savings",
+)
+ACCOUNT_CLASSES = dict(
+    bank="MonetaryAccountBankApiObject",
+    joint="MonetaryAccountJointApiObject",
+    savings="MonetaryAccountSavingsApiObject",
 )
-from bunq.sdk.model.generated.object_ import AmountObject, PointerObject
+REFERENCED_ACCOUNT_OBJECT_TYPES = ("MonetaryAccountBank", "MonetaryAccountJoint", "MonetaryAccountSavings")
 
 
 def fixed_from_json_list(cls, response_raw, wrapper=None):
@@ -42,7 +54,22 @@ def fixed_from_json_list(cls, response_raw, wrapper=None):
     return BunqResponse(array_deserialized, response_raw.headers, pagination)
 
 
-MonetaryAccountSavingsApiObject._from_json_list = classmethod(fixed_from_json_list)
+@cache
+def _endpoints():
+    # The bunq SDK takes a few hundred milliseconds to import, so it is only loaded once it is really needed.
+    from bunq.sdk.model.generated import endpoint
+
+    endpoint.MonetaryAccountSavingsApiObject._from_json_list = classmethod(fixed_from_json_list)
+    return endpoint
+
+
+def _account_class(account_type: str):
+    return getattr(_endpoints(), ACCOUNT_CLASSES[account_type])
+
+
+def _request_headers(request_id: str = None) -> dict:
+    # Every attempt at the same payment, including retries and resumed runs, carries the same request id.
+    return {"X-Bunq-Client-Request-Id": request_id} if request_id else {}
 
 
 class BunqLib:
@@ -52,7 +79,14 @@ class BunqLib:
         environment_type,
         device_description,
         api_context_file_path,
+        max_concurrent_requests: int = 3,
+        retry_policy: RetryPolicy = None,
+        snapshot_cache: AccountSnapshotCache = None,
+        fast_account_listing: bool = True,
+        transport=None,
     ):
+        from bunq.sdk.context.api_environment_type import ApiEnvironmentType
+
         self.api_key = api_key
         self.environment_type = (
             ApiEnvironmentType.PRODUCTION if environment_type == "production" else ApiEnvironmentType.SANDBOX
@@ -60,73 +94,230 @@ class BunqLib:
         self.device_description = device_description
         self.api_context_file_path = api_context_file_path
         self.is_connected = False
+        self.session = None
         self.accounts = None
+        self.max_concurrent_requests = max_concurrent_requests
+        self.rate_limiter = RateLimiter(max_concurrent_requests=max_concurrent_requests)
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.snapshot_cache = snapshot_cache
+        self.fast_account_listing = fast_account_listing
+        self.transport = transport
+        self.snapshot_key = snapshot_key(api_key, self.environment_type.name)
 
+    @metrics.timed("bunq.connect")
     def connect(self):
-        if isfile(self.api_context_file_path):
-            pass  # Config is already present
-        else:
-            ApiContext.create(self.environment_type, self.api_key, self.device_description).save(
-                self.api_context_file_path
-            )
+        from money_flow.transport import PooledTransport
 
-        api_context = ApiContext.restore(self.api_context_file_path)
-        api_context.ensure_session_active()
-        api_context.save(self.api_context_file_path)
-
-        BunqContext.load_api_context(api_context)
+        if self.transport is None:
+            self.transport = PooledTransport(pool_size=self.max_concurrent_requests)
+        if self.retry_policy.response_headers is None:
+            self.retry_policy.response_headers = getattr(self.transport, "last_response_headers", None)
+        self.session = get_session_manager(
+            self.api_key, self.environment_type, self.device_description, self.api_context_file_path
+        )
+        with self._transport():
+            self.session.get_api_context(self.rate_limiter)
         self.is_connected = True
 
-    @staticmethod
+    @contextmanager
+    def _transport(self):
+        from money_flow.transport import use
+
+        with use(self.transport):
+            yield
+
+    @contextmanager
+    def _api_call(self, method: str, endpoint: str):
+        # Each client sends its calls over its own transport, so its connection stats and timeouts stay its own.
+        with self.rate_limiter.request(method, endpoint), self._transport():
+            yield
+
+    def is_healthy(self) -> bool:
+        return self.is_connected and self.session.is_fresh()
+
+    def connection_stats(self) -> dict:
+        return self.transport.stats() if self.transport is not None else {}
+
+    def is_signed_by_bunq(self, body: bytes, headers) -> bool:
+        """Check a callback against the server key bunq handed out when this installation was created."""
+        from bunq.sdk.security import security
+        from requests.structures import CaseInsensitiveDict
+
+        headers = CaseInsensitiveDict(headers)
+        if not headers.get("X-Bunq-Server-Signature"):
+            return False
+        with self._transport():
+            public_key = self.session.get_api_context(self.rate_limiter).installation_context.public_key_server
+        return security.is_valid_response_body(public_key, body, headers)
+
     def make_payment(
+        self,
         from_account_id: str,
         to_account_alias: str,
         to_account_type: str,
-        amount: Decimal,
+        amount: Money,
         description: str,
         to_iban: str,
         simulate: bool = True,
-        original_amount_to_sort: Decimal = None,
+        original_amount_to_sort: Money = None,
+        request_id: str = None,
+    ) -> bool:
+        self.announce_payment(
+            to_account_alias=to_account_alias,
+            to_account_type=to_account_type,
+            amount=amount,
+            to_iban=to_iban,
+            simulate=simulate,
+            original_amount_to_sort=original_amount_to_sort,
+        )
+        if simulate:
+            return True
+        return self.send_payment(from_account_id, to_account_alias, amount, description, to_iban, request_id)
+
+    def send_payment(
+        self,
+        from_account_id: str,
+        to_account_alias: str,
+        amount: Money,
+        description: str,
+        to_iban: str,
+        request_id: str = None,
+    ):
+        from bunq.sdk.model.generated.object_ import AmountObject, PointerObject
+
+        def create_payment():
+            with self._api_call("POST", "payment"):
+                return _endpoints().PaymentApiObject.create(
+                    amount=AmountObject("{:.2f}".format(amount), "EUR"),
+                    counterparty_alias=PointerObject("IBAN", to_iban, name=to_account_alias),
+                    description=description,
+                    monetary_account_id=from_account_id,
+                    custom_headers=_request_headers(request_id),
+                )
+
+        return self._submit(create_payment, f"Payment to {to_iban}")
+
+    @staticmethod
+    def announce_payment(
+        to_account_alias: str,
+        to_account_type: str,
+        amount: Money,
+        to_iban: str,
+        simulate: bool = True,
+        original_amount_to_sort: Money = None,
     ):
         if simulate:
             s = "Simulating transfer of"
         else:
             s = "Transferring"
         perc = f"({amount / original_amount_to_sort * 100:.1f}%) " if original_amount_to_sort else ""
-        print(f"{s} {amount:.2f} EUR {perc}to {to_account_alias} " f"({to_account_type} account {to_iban})")
-        if not simulate:
-            max_retries = 5
-            retry_delay = 10  # seconds
-            retry_count = 0
-            success = False
-            while retry_count < max_retries and not success:
-                try:
-                    # Code that you want to retry until it succeeds without exception
-                    # Replace the following line with your actual code
-                    PaymentApiObject.create(
-                        amount=AmountObject("{:.2f}".format(amount), "EUR"),
-                        counterparty_alias=PointerObject("IBAN", to_iban, name=to_account_alias),
-                        description=description,
-                        monetary_account_id=from_account_id,
-                    )
-                    # If the code reaches this point without raising an exception, it's considered a success
-                    time.sleep(2)
-                    success = True
-                except Exception as e:
-                    print(f"Exception occurred: {e}")
-                    retry_count += 1
-                    print(f"Retrying... ({retry_count}/{max_retries})")
-                    time.sleep(retry_delay)
-
-            if not success:
-                print("Exceeded maximum number of retries. Code execution failed.")
+        print(f"{s} {amount:.2f} EUR {perc}to {to_account_alias} ({to_account_type} account {to_iban})")
+
+    def make_payment_batch(
+        self, from_account_id: str, payments: list, simulate: bool = True, request_id: str = None
+    ) -> bool:
+        if simulate or not payments:
+            return True
+
+        from bunq.sdk.model.generated.object_ import AmountObject, PointerObject
+
+        endpoint = _endpoints()
+
+        def create_payment_batch():
+            with self._api_call("POST", "payment-batch"):
+                return endpoint.PaymentBatchApiObject.create(
+                    payments=[
+                        endpoint.PaymentApiObject(
+                            amount=AmountObject("{:.2f}".format(payment["amount"]), "EUR"),
+                            counterparty_alias=PointerObject(
+                                "IBAN", payment["to_iban"], name=payment["to_account_alias"]
+                            ),
+                            description=payment["description"],
+                        )
+                        for payment in payments
+                    ],
+                    monetary_account_id=from_account_id,
+                    custom_headers=_request_headers(request_id),
+                )
+
+        print(f"Submitting batch of {len(payments)} payments...")
+        return self._submit(create_payment_batch, f"Batch of {len(payments)} payments")
+
+    def register_payment_callback(self, account_id: int, url: str):
+        """Have bunq post every payment on the account to ``url``. This replaces the filters the account had."""
+        from bunq.sdk.model.generated.object_ import NotificationFilterUrlObject
+
+        def create_filter():
+            with self._api_call("POST", "notification-filter-url"):
+                return _endpoints().NotificationFilterUrlMonetaryAccountApiObject.create(
+                    monetary_account_id=account_id,
+                    notification_filters=[NotificationFilterUrlObject("PAYMENT", url)],
+                )
+
+        return self.retry_policy.call(create_filter)
+
+    def get_recent_payments(self, account_id: int, since: float) -> list:
+        """Payments in and out of the account from ``since`` (a Unix time) on, newest first.
+
+        See ``parse_payment_page`` for the fields of each payment.
+        """
+        from bunq.sdk.context.bunq_context import BunqContext
+        from bunq.sdk.http.api_client import ApiClient
+
+        endpoint_url = f"user/{BunqContext.user_context().user_id}/monetary-account/{account_id}/payment"
+
+        def list_payments(params):
+            with self._api_call("GET", "payment"):
+                return ApiClient(BunqContext.api_context()).get(endpoint_url, params, {})
+
+        payments = []
+        params = {"count": "200"}
+        while True:
+            page, pagination = parse_payment_page(self.retry_policy.call(list_payments, params).body_bytes)
+            payments.extend(payment for payment in page if payment["created"] >= since)
+            # bunq lists the newest payments first, so paging can stop at the first one that is too old.
+            if not page or page[-1]["created"] < since or not (pagination or {}).get("older_url"):
+                return payments
+            params = {"count": "200", "older_id": str(page[-1]["id"])}
+
+    @metrics.timed("bunq.submit")
+    def _submit(self, request, label: str) -> bool:
+        try:
+            self.retry_policy.submit(request)
+        except RetriesExhausted:
+            print("Exceeded maximum number of retries. Code execution failed.")
+            return False
+        except Exception as e:
+            print(f"{label} failed permanently: {e}")
+            return False
+        finally:
+            # Even a failed attempt may have moved money, so balances from before it can no longer be trusted.
+            self.invalidate_snapshot()
+        return True
+
+    def _load_snapshot(self, ids, allow_stale: bool) -> bool:
+        if self.snapshot_cache is None:
+            return False
+        accounts = self.snapshot_cache.load(self.snapshot_key, allow_stale=allow_stale)
+        if accounts is None or (ids is not None and not all(id_ in accounts for id_ in ids)):
+            return False
+        metrics.count("bunq.snapshot_hits")
+        self.accounts = accounts
+        return True
+
+    def _store_snapshot(self):
+        if self.snapshot_cache is not None:
+            self.snapshot_cache.store(self.snapshot_key, self.accounts)
+
+    def invalidate_snapshot(self):
+        if self.snapshot_cache is not None:
+            self.snapshot_cache.invalidate(self.snapshot_key)
 
     def get_balance_by_id(self, *, id_: int):
         if not self.is_connected:
             raise Exception("Not connected. Please call connect first")
 
-        balance = round(self.accounts[id_]["balance"], 2)
-        return Decimal(balance)
+        return self.accounts[id_].balance
 
     def get_balance_by_iban(self, *, iban: str):
         if not self.is_connected:
@@ -135,50 +326,171 @@ class BunqLib:
         if not self.accounts:
             self.get_accounts()
 
-        accounts = self.accounts
-        for _, account_info in accounts.items():
-            if account_info["iban"] == iban:
-                return Decimal(account_info["balance"])
+        account = self.accounts.get_by_iban(iban)
+        if account is not None:
+            return account.balance
 
-    @staticmethod
-    def get_some_accounts(pagination, first_time=False, account_type: str = "bank"):
+    def get_some_accounts(self, pagination, first_time=False, account_type: str = "bank"):
         if first_time:
             params = pagination.url_params_count_only
         else:
             params = pagination.url_params_previous_page
-        if account_type == "savings":
-            response = MonetaryAccountSavingsApiObject.list(params=params)
-        elif account_type == "joint":
-            response = MonetaryAccountJointApiObject.list(params=params)
-        else:
-            response = MonetaryAccountBankApiObject.list(params=params)
-        return response.value, response.pagination
+        # Reading a page has no side effects, so rate limited and failed reads are simply tried again.
+        if self.fast_account_listing:
+            return self.retry_policy.call(self._list_accounts_fast, params, account_type)
+        response = self.retry_policy.call(self._list_accounts_sdk, params, account_type)
+        accounts = [self._to_account(raw_account) for raw_account in response.value]
+        return [account for account in accounts if account is not None], response.pagination
+
+    def _list_accounts_sdk(self, params, account_type: str):
+        with self._api_call("GET", ACCOUNT_ENDPOINTS[account_type]):
+            return _account_class(account_type).list(params=params)
+
+    def _list_accounts_fast(self, params, account_type: str):
+        # Reads the listing straight from the response body instead of building full SDK objects for every account.
+        from bunq.sdk.context.bunq_context import BunqContext
+        from bunq.sdk.http.api_client import ApiClient
+        from bunq.sdk.http.pagination import Pagination
+        from bunq.sdk.json.pagination_adapter import PaginationAdapter
+
+        endpoint_url = f"user/{BunqContext.user_context().user_id}/{ACCOUNT_ENDPOINTS[account_type]}"
+        with self._api_call("GET", ACCOUNT_ENDPOINTS[account_type]):
+            response_raw = ApiClient(BunqContext.api_context()).get(endpoint_url, params, {})
+        accounts, pagination = parse_account_page(
+            response_raw.body_bytes,
+            account_type,
+            fallback=lambda item: self._deserialize_account(_account_class(account_type), item),
+        )
+        return accounts, PaginationAdapter.deserialize(Pagination, pagination) if pagination is not None else None
+
+    def _deserialize_account(self, cls, item):
+        from bunq.sdk.json import converter
+
+        try:
+            return self._to_account(converter.deserialize(cls, item))
+        except TypeError:
+            print(
+                f"failed to deserialize item of type {cls.__name__}: description {item['description']}, "
+                f"IBAN: {item['alias'][0]['value']}, {float(item['balance']['value']):,.2f} EUR"
+            )
+            return None
+
+    def iter_account_pages(self, account_type: str = "bank"):
+        from bunq.sdk.http.pagination import Pagination
 
-    def add_raw_accounts_of_one_type(self, all_accounts, account_type: str = "bank"):
         pagination = Pagination()
         pagination.count = 200
         accounts, pagination = self.get_some_accounts(pagination, first_time=True, account_type=account_type)
-        time.sleep(1.1)
-        all_accounts.extend(accounts)
+        yield accounts
         while pagination.has_previous_page():
             accounts, pagination = self.get_some_accounts(pagination, account_type=account_type)
-            time.sleep(1.1)
+            yield accounts
+
+    def add_raw_accounts_of_one_type(self, all_accounts, account_type: str = "bank"):
+        for accounts in self.iter_account_pages(account_type):
             all_accounts.extend(accounts)
         return all_accounts
 
-    def get_accounts(self):
-        all_accounts = []
-        all_accounts = self.add_raw_accounts_of_one_type(all_accounts, account_type="bank")
-        all_accounts = self.add_raw_accounts_of_one_type(all_accounts, account_type="joint")
-        all_accounts = self.add_raw_accounts_of_one_type(all_accounts, account_type="savings")
-
-        self.accounts = {}
-        for account in all_accounts:
-            object_type = type(account).__name__
-            if account.status == "ACTIVE" and object_type != "_MonetaryAccountExternal":
-                self.accounts[account.id_] = {
-                    "description": account.description,
-                    "balance": float(account.balance.value),
-                    "iban": account.alias[0].value,
-                    "type": object_type[15:-9].lower(),
-                }
+    def stream_accounts(self, until=None):
+        """Yield active accounts as their pages arrive, adding them to ``self.accounts``.
+
+        Account types are paged concurrently. When ``until`` is given, paging stops as soon as all of those ids have
+        been seen; closing the generator early stops paging as well.
+        """
+        pending = set(until) if until is not None else None
+        self.accounts = AccountRegistry()
+        pages = queue.Queue()
+        stop = threading.Event()
+
+        def produce(account_type):
+            try:
+                account_pages = self.iter_account_pages(account_type)
+                while not stop.is_set():
+                    page = next(account_pages, None)
+                    if page is None:
+                        break
+                    pages.put(page)
+            except Exception as e:
+                pages.put(e)
+            finally:
+                pages.put(None)
+
+        executor = ThreadPoolExecutor(max_workers=len(ACCOUNT_TYPES))
+        for account_type in ACCOUNT_TYPES:
+            executor.submit(metrics.propagate(produce), account_type)
+        try:
+            producing = len(ACCOUNT_TYPES)
+            while producing:
+                page = pages.get()
+                if page is None:
+                    producing -= 1
+                    continue
+                if isinstance(page, Exception):
+                    raise page
+                for account in page:
+                    self.accounts.add(account)
+                    yield account
+                    if pending is not None:
+                        pending.discard(account.id_)
+                if pending is not None and not pending:
+                    return
+        finally:
+            stop.set()
+            executor.shutdown(wait=False)
+
+    @metrics.timed("bunq.get_accounts_streamed")
+    def get_accounts_streamed(self, ids=None, allow_stale: bool = False):
+        if self._load_snapshot(ids, allow_stale):
+            return
+        for _ in self.stream_accounts(until=ids):
+            pass
+        if ids is None:
+            self._store_snapshot()
+
+    def get_account_by_id(self, id_: int):
+        def get_account():
+            with self._api_call("GET", "monetary-account"):
+                return _endpoints().MonetaryAccountApiObject.get(id_).value
+
+        wrapper = self.retry_policy.call(get_account)
+        for object_type in REFERENCED_ACCOUNT_OBJECT_TYPES:
+            account = getattr(wrapper, object_type, None)
+            if account is not None:
+                return account
+        return None
+
+    @metrics.timed("bunq.get_accounts")
+    def get_accounts(self, ids=None, allow_stale: bool = False):
+        if self._load_snapshot(ids, allow_stale):
+            return
+        if ids is None:
+            with ThreadPoolExecutor(max_workers=len(ACCOUNT_TYPES)) as executor:
+                accounts_per_type = executor.map(
+                    metrics.propagate(
+                        lambda account_type: self.add_raw_accounts_of_one_type([], account_type=account_type)
+                    ),
+                    ACCOUNT_TYPES,
+                )
+                all_accounts = [account for accounts in accounts_per_type for account in accounts]
+        else:
+            get_account_by_id = metrics.propagate(self.get_account_by_id)
+            with ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+                raw_accounts = [account for account in executor.map(get_account_by_id, sorted(ids)) if account]
+            all_accounts = [self._to_account(raw_account) for raw_account in raw_accounts]
+
+        self.accounts = AccountRegistry(account for account in all_accounts if account is not None)
+        if ids is None:
+            self._store_snapshot()
+
+    @staticmethod
+    def _to_account(account):
+        object_type = type(account).__name__
+        if account.status == "ACTIVE" and object_type != "_MonetaryAccountExternal":
+            return Account(
+                id_=account.id_,
+                description=account.description,
+                balance_cents=to_cents(account.balance.value),
+                iban=account.alias[0].value,
+                type=object_type[15:-9].lower(),
+            )
+        return None
@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+from money_flow.accounts import Account, AccountRegistry
+
+_memory = {}
+_memory_lock = threading.Lock()
+
+
+def snapshot_key(api_key: str, environment: str) -> str:
+    return hashlib.sha256(f"{environment}:{api_key}".encode()).hexdigest()
+
+
+class AccountSnapshotCache:
+    def __init__(self, ttl: float = 300.0, directory: str = None):
+        self.ttl = ttl
+        self.directory = directory if directory is not None else tempfile.gettempdir()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"money-flow-accounts-{key[:16]}.json")
+
+    def load(self, key: str, allow_stale: bool = False):
+        with _memory_lock:
+            snapshot = _memory.get(key)
+        if snapshot is None:
+            try:
+                with open(self._path(key)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                return None
+            with _memory_lock:
+                _memory[key] = snapshot
+        if not allow_stale and time.time() - snapshot["created"] > self.ttl:
+            return None
+        # Runs update balances in place, so every caller gets its own copy of the records.
+        return AccountRegistry(Account(*record) for record in snapshot["accounts"])
+
+    def store(self, key: str, accounts: AccountRegistry):
+        snapshot = dict(
+            created=time.time(),
+            accounts=[
+                [account.id_, account.description, account.balance_cents, account.iban, account.type]
+                for account in accounts.values()
+            ],
+        )
+        with _memory_lock:
+            _memory[key] = snapshot
+        try:
+            with open(self._path(key), "w") as f:
+                json.dump(snapshot, f)
+        except OSError as e:
+            print(f"Could not write account snapshot: {e}")
+
+    def invalidate(self, key: str):
+        with _memory_lock:
+            _memory.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,157 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from money_flow import metrics
+from money_flow.bunq import BunqLib
+from money_flow.journal import DONE, FAILED, PENDING, JournalRun
+from money_flow.planner import Plan, Transfer
+
+PAYMENT_MODES = ("single", "concurrent", "group", "run")
+
+
+@dataclass(frozen=True)
+class PaymentResult:
+    transfer: Transfer
+    succeeded: bool
+
+
+class PlanExecutor:
+    def __init__(self, bunq: BunqLib, simulate: bool = True, payment_mode: str = "single", workers: int = None):
+        if payment_mode not in PAYMENT_MODES:
+            raise ValueError(f"Unknown payment mode {payment_mode!r}, expected one of {PAYMENT_MODES}")
+        self.bunq = bunq
+        self.simulate = simulate
+        self.payment_mode = payment_mode
+        self.workers = workers or bunq.max_concurrent_requests
+
+    @metrics.timed("execute")
+    def execute(self, plan: Plan, journal: JournalRun = None) -> list[PaymentResult]:
+        """Send the transfers of ``plan``, group by group.
+
+        With a ``journal``, transfers it has as done are skipped, and every payment is recorded in it before it is
+        sent and once it succeeded or failed, under its idempotency key.
+        """
+        results = []
+        pending_transfers = []
+        for _, transfers in plan.groups():
+            if journal is not None:
+                transfers = journal.remaining(transfers)
+            if self.payment_mode == "concurrent":
+                results.extend(self._send_concurrently(plan, transfers, journal))
+                continue
+            for transfer in transfers:
+                if self.payment_mode == "single":
+                    _mark(journal, [transfer], PENDING)
+                    succeeded = self.bunq.make_payment(
+                        from_account_id=plan.main_account_id,
+                        to_account_alias=transfer.to_account_alias,
+                        to_account_type=transfer.to_account_type,
+                        amount=transfer.amount,
+                        description=_description(journal, transfer),
+                        to_iban=transfer.to_iban,
+                        simulate=self.simulate,
+                        original_amount_to_sort=plan.amount_to_sort,
+                        request_id=journal.idempotency_key(transfer) if journal is not None else None,
+                    )
+                    _mark(journal, [transfer], DONE if succeeded else FAILED)
+                    results.extend(self._credit([PaymentResult(transfer, succeeded)]))
+                else:
+                    self._announce(plan, transfer)
+                    pending_transfers.append(transfer)
+            if self.payment_mode == "group":
+                results.extend(self._submit(plan, pending_transfers, journal))
+                pending_transfers = []
+        if self.payment_mode == "run":
+            results.extend(self._submit(plan, pending_transfers, journal))
+        return results
+
+    def _credit(self, results: list[PaymentResult]) -> list[PaymentResult]:
+        # Only money that really moved is added to the accounts this client keeps; a simulated or failed transfer
+        # would otherwise show up in the balances the next run plans against. A resumed run sends its stored plan
+        # without loading the accounts first.
+        if not self.simulate and self.bunq.accounts is not None:
+            for result in results:
+                if result.succeeded:
+                    self.bunq.accounts.credit(result.transfer.to_iban, result.transfer.amount)
+        return results
+
+    def _announce(self, plan: Plan, transfer: Transfer):
+        self.bunq.announce_payment(
+            to_account_alias=transfer.to_account_alias,
+            to_account_type=transfer.to_account_type,
+            amount=transfer.amount,
+            to_iban=transfer.to_iban,
+            simulate=self.simulate,
+            original_amount_to_sort=plan.amount_to_sort,
+        )
+
+    def _send_concurrently(self, plan: Plan, transfers: tuple, journal: JournalRun = None) -> list[PaymentResult]:
+        # The transfers of one priority group were all computed from the same remainder, so they do not depend on
+        # each other. The next group only starts once every payment of this one has been settled.
+        for transfer in transfers:
+            self._announce(plan, transfer)
+        if self.simulate or not transfers:
+            return [PaymentResult(transfer, True) for transfer in transfers]
+
+        _mark(journal, transfers, PENDING)
+
+        def send(transfer):
+            try:
+                succeeded = self.bunq.send_payment(
+                    from_account_id=plan.main_account_id,
+                    to_account_alias=transfer.to_account_alias,
+                    amount=transfer.amount,
+                    description=_description(journal, transfer),
+                    to_iban=transfer.to_iban,
+                    request_id=journal.idempotency_key(transfer) if journal is not None else None,
+                )
+            except Exception as e:
+                print(f"Payment to {transfer.to_iban} failed: {e}")
+                succeeded = False
+            _mark(journal, [transfer], DONE if succeeded else FAILED)
+            return succeeded
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(transfers))) as executor:
+            return self._credit(
+                [
+                    PaymentResult(transfer, succeeded)
+                    for transfer, succeeded in zip(transfers, executor.map(metrics.propagate(send), transfers))
+                ]
+            )
+
+    def _submit(self, plan: Plan, transfers: list, journal: JournalRun = None) -> list[PaymentResult]:
+        payments = [
+            dict(
+                to_account_alias=transfer.to_account_alias,
+                amount=transfer.amount,
+                description=_description(journal, transfer),
+                to_iban=transfer.to_iban,
+            )
+            for transfer in transfers
+        ]
+        _mark(journal, transfers, PENDING)
+        succeeded = self.bunq.make_payment_batch(
+            from_account_id=plan.main_account_id,
+            payments=payments,
+            simulate=self.simulate,
+            request_id=_batch_key(journal, transfers),
+        )
+        _mark(journal, transfers, DONE if succeeded else FAILED)
+        return self._credit([PaymentResult(transfer, succeeded) for transfer in transfers])
+
+
+def _mark(journal: JournalRun, transfers, status: str):
+    if journal is not None and transfers:
+        journal.mark(transfers, status)
+
+
+def _description(journal: JournalRun, transfer: Transfer) -> str:
+    return journal.description(transfer) if journal is not None else transfer.description
+
+
+def _batch_key(journal: JournalRun, transfers):
+    if journal is None or not transfers:
+        return None
+    keys = ",".join(journal.idempotency_key(transfer) for transfer in transfers)
+    return f"{journal.run_id}-batch-{hashlib.sha256(keys.encode()).hexdigest()[:16]}"
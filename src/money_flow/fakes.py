@@ -0,0 +1,540 @@
+"""Local stand-ins for bunq and Firestore, for running and load testing the whole flow offline.
+
+``FakeBunqServer`` serves the parts of the bunq API that ``BunqLib`` uses over HTTP, so that the real SDK, transport,
+rate limiter and retries all run against it. ``FakeFirestoreClient`` replaces the Firestore client behind
+``FireStore``. Both can add latency to every call and answer with rate limit errors.
+"""
+
+import base64
+import itertools
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlsplit
+
+from money_flow.listing import ACCOUNT_OBJECT_TYPES
+from money_flow.money import Money, to_cents
+
+USER_ID = 1
+SESSION_TIMEOUT = 7 * 24 * 3600
+DEFAULT_PAGE_SIZE = 10
+ROUTES = (
+    ("POST", re.compile(r"installation"), "installation"),
+    ("POST", re.compile(r"device-server"), "device_server"),
+    ("POST", re.compile(r"session-server"), "session_server"),
+    ("DELETE", re.compile(r"session/\d+"), "delete_session"),
+    ("GET", re.compile(r"user/\d+/monetary-account-(bank|joint|savings)"), "list_accounts"),
+    ("GET", re.compile(r"user/\d+/monetary-account(?:-(?:bank|joint|savings))?/(\d+)"), "get_account"),
+    ("GET", re.compile(r"user/\d+/monetary-account/(\d+)/payment"), "list_payments"),
+    ("POST", re.compile(r"user/\d+/monetary-account/(\d+)/payment"), "create_payment"),
+    ("POST", re.compile(r"user/\d+/monetary-account/(\d+)/payment-batch"), "create_payment_batch"),
+)
+
+
+class FakeFault:
+    """Latency and rate limit errors added to the calls of a fake.
+
+    Every call waits ``latency`` seconds plus up to ``jitter`` seconds more. A call is rate limited when it is the
+    ``rate_limit_every``-th since the previous one, or otherwise with probability ``rate_limit_probability``.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        rate_limit_every: int = 0,
+        rate_limit_probability: float = 0.0,
+        seed: int = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_every = rate_limit_every
+        self.rate_limit_probability = rate_limit_probability
+        self.random = random.Random(seed)
+        self.calls = 0
+        self.rate_limited = 0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            time.sleep(delay)
+
+    def is_rate_limited(self) -> bool:
+        with self.lock:
+            self.calls += 1
+            limited = (self.rate_limit_every and self.calls % self.rate_limit_every == 0) or (
+                self.rate_limit_probability and self.random.random() < self.rate_limit_probability
+            )
+            if limited:
+                self.rate_limited += 1
+            return bool(limited)
+
+
+class FakeBunqServer:
+    """A bunq API on localhost with a configurable set of monetary accounts.
+
+    Payments move money between the accounts it knows by IBAN. Responses are signed with a key of its own, which the
+    SDK learns when it creates its installation, so response signatures are checked like they are against bunq. Use
+    ``url`` as the ``base_url`` of a ``PooledTransport`` to send the SDK's calls here.
+    """
+
+    def __init__(self, accounts: dict = None, balance="1000.00", fault: FakeFault = None, port: int = 0):
+        from Cryptodome.PublicKey import RSA
+
+        self.fault = fault or FakeFault()
+        self.key = RSA.generate(2048)
+        self.accounts = {}
+        self.payments = []
+        # The X-Bunq-Client-Request-Id of every payment request, in the order they came in.
+        self.payment_request_ids = []
+        self.requests = Counter()
+        self.lock = threading.Lock()
+        self._next_id = 1
+        for account_type, count in (dict(bank=1) if accounts is None else accounts).items():
+            for _ in range(count):
+                self.add_account(account_type, balance)
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _handler(self))
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/v1/"
+
+    def add_account(self, account_type: str, balance="0.00", description: str = None, status: str = "ACTIVE") -> int:
+        with self.lock:
+            id_ = self._next_id
+            self._next_id += 1
+            self.accounts[id_] = dict(
+                type=account_type,
+                description=description or f"{account_type} account {id_}",
+                iban=f"NL00FAKE{id_:010d}",
+                balance_cents=to_cents(balance),
+                status=status,
+            )
+        return id_
+
+    def balance(self, id_: int) -> Money:
+        with self.lock:
+            return Money(self.accounts[id_]["balance_cents"])
+
+    def client(self, connect: bool = True, **kwargs):
+        """Return a ``BunqLib`` that talks to this server, with a fresh API context file.
+
+        Keyword arguments are passed on to ``BunqLib``. Close its ``transport`` when done with it.
+        """
+        from money_flow.bunq import BunqLib
+        from money_flow.transport import PooledTransport
+
+        bunq = BunqLib(
+            api_key="fake-api-key",
+            environment_type="sandbox",
+            device_description="test",
+            api_context_file_path=os.path.join(tempfile.mkdtemp(), "bunq.conf"),
+            transport=PooledTransport(base_url=self.url),
+            **kwargs,
+        )
+        if connect:
+            bunq.connect()
+        return bunq
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, method: str, path: str, query: dict, body: bytes, request_id: str = None):
+        """Return the status and JSON body of the response to one request."""
+        relative = path.split("/v1/", 1)[-1].strip("/")
+        for route_method, pattern, name in ROUTES:
+            match = pattern.fullmatch(relative)
+            if route_method == method and match:
+                with self.lock:
+                    self.requests[name] += 1
+                    if name.startswith("create_payment"):
+                        self.payment_request_ids.append(request_id)
+                self.fault.wait()
+                if self.fault.is_rate_limited():
+                    return 429, _error("Too many requests. You can do a maximum of 3 calls per 3 second.")
+                return getattr(self, f"_{name}")(*match.groups(), query=query, body=body)
+        return 404, _error(f"Route {method} {relative} not found.")
+
+    def sign(self, body: bytes) -> str:
+        from Cryptodome.Hash import SHA256
+        from Cryptodome.Signature import pkcs1_15
+
+        return base64.b64encode(pkcs1_15.new(self.key).sign(SHA256.new(body))).decode()
+
+    def _installation(self, query, body):
+        server_public_key = self.key.publickey().export_key().decode()
+        return 200, _response(
+            dict(Id=dict(id=1)),
+            dict(Token=_token("installation")),
+            dict(ServerPublicKey=dict(server_public_key=server_public_key)),
+        )
+
+    def _device_server(self, query, body):
+        return 200, _response(dict(Id=dict(id=1)))
+
+    def _session_server(self, query, body):
+        user = dict(id=USER_ID, display_name="Fake User", session_timeout=SESSION_TIMEOUT)
+        return 200, _response(dict(Id=dict(id=1)), dict(Token=_token("session")), dict(UserPerson=user))
+
+    def _delete_session(self, query, body):
+        return 200, _response()
+
+    def _list_accounts(self, account_type, query, body):
+        count = int(query.get("count", DEFAULT_PAGE_SIZE))
+        older_id = int(query["older_id"]) if "older_id" in query else None
+        with self.lock:
+            # bunq lists the newest accounts first and pages towards older ones.
+            ids = sorted(
+                (id_ for id_, account in self.accounts.items() if account["type"] == account_type),
+                reverse=True,
+            )
+            if older_id is not None:
+                ids = [id_ for id_ in ids if id_ < older_id]
+            page = ids[:count]
+            items = [{ACCOUNT_OBJECT_TYPES[account_type]: self._account_json(id_)} for id_ in page]
+        endpoint = f"/v1/user/{USER_ID}/monetary-account-{account_type}"
+        pagination = dict(
+            older_url=f"{endpoint}?count={count}&older_id={page[-1]}" if len(ids) > count else None,
+            newer_url=f"{endpoint}?count={count}&newer_id={page[0]}" if older_id is not None and page else None,
+            future_url=f"{endpoint}?count={count}&newer_id={page[0]}" if older_id is None and page else None,
+        )
+        return 200, dict(Response=items, Pagination=pagination)
+
+    def _get_account(self, id_, query, body):
+        with self.lock:
+            if int(id_) not in self.accounts:
+                return 404, _error("Monetary account not found.")
+            account_type = self.accounts[int(id_)]["type"]
+            return 200, _response({ACCOUNT_OBJECT_TYPES[account_type]: self._account_json(int(id_))})
+
+    def _list_payments(self, id_, query, body):
+        count = int(query.get("count", DEFAULT_PAGE_SIZE))
+        older_id = int(query["older_id"]) if "older_id" in query else None
+        with self.lock:
+            iban = self.accounts[int(id_)]["iban"] if int(id_) in self.accounts else None
+            # Payment ids are their position in ``payments``, counting from one; the newest are listed first.
+            items = []
+            for payment_id in range(len(self.payments), 0, -1):
+                payment = self.payments[payment_id - 1]
+                if older_id is not None and payment_id >= older_id:
+                    continue
+                if payment["from_id"] == int(id_):
+                    cents, counterparty = -payment["cents"], payment["to_iban"]
+                elif payment["to_iban"] == iban:
+                    cents, counterparty = payment["cents"], self.accounts[payment["from_id"]]["iban"]
+                else:
+                    continue
+                items.append((payment_id, payment, cents, counterparty))
+        page = items[:count]
+        endpoint = f"/v1/user/{USER_ID}/monetary-account/{id_}/payment"
+        pagination = dict(
+            older_url=f"{endpoint}?count={count}&older_id={page[-1][0]}" if len(items) > count else None,
+            newer_url=None,
+            future_url=None,
+        )
+        return 200, dict(
+            Response=[
+                dict(
+                    Payment=dict(
+                        id=payment_id,
+                        created=payment["created"],
+                        monetary_account_id=int(id_),
+                        amount=dict(value=str(Money(cents)), currency="EUR"),
+                        description=payment["description"],
+                        counterparty_alias=dict(iban=counterparty, display_name="Fake User"),
+                    )
+                )
+                for payment_id, payment, cents, counterparty in page
+            ],
+            Pagination=pagination,
+        )
+
+    def _create_payment(self, id_, query, body):
+        with self.lock:
+            error = self._transfer(int(id_), json.loads(body))
+            if error:
+                return 400, _error(error)
+            return 200, _response(dict(Id=dict(id=len(self.payments))))
+
+    def _create_payment_batch(self, id_, query, body):
+        payments = json.loads(body)["payments"]
+        with self.lock:
+            total = sum(to_cents(payment["amount"]["value"]) for payment in payments)
+            if int(id_) in self.accounts and total > self.accounts[int(id_)]["balance_cents"]:
+                return 400, _error("Insufficient balance for this batch.")
+            for payment in payments:
+                error = self._transfer(int(id_), payment)
+                if error:
+                    return 400, _error(error)
+            return 200, _response(dict(Id=dict(id=len(self.payments))))
+
+    def _transfer(self, from_id: int, payment: dict):
+        source = self.accounts.get(from_id)
+        if source is None:
+            return "Monetary account not found."
+        cents = to_cents(payment["amount"]["value"])
+        if cents <= 0:
+            return "Payment amount should be positive."
+        if cents > source["balance_cents"]:
+            return "Insufficient balance for this payment."
+        source["balance_cents"] -= cents
+        iban = payment["counterparty_alias"]["value"]
+        for account in self.accounts.values():
+            if account["iban"] == iban:
+                account["balance_cents"] += cents
+                break
+        self.payments.append(
+            dict(
+                from_id=from_id,
+                to_iban=iban,
+                cents=cents,
+                description=payment.get("description"),
+                created=datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f"),
+            )
+        )
+        return None
+
+    def _account_json(self, id_: int) -> dict:
+        account = self.accounts[id_]
+        return dict(
+            id=id_,
+            description=account["description"],
+            status=account["status"],
+            currency="EUR",
+            balance=dict(value=str(Money(account["balance_cents"])), currency="EUR"),
+            alias=[dict(type="IBAN", value=account["iban"], name="Fake User")],
+        )
+
+
+def _response(*items) -> dict:
+    return dict(Response=list(items))
+
+
+def _error(description: str) -> dict:
+    return dict(Error=[dict(error_description=description, error_description_translated=description)])
+
+
+def _token(kind: str) -> dict:
+    now = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")
+    return dict(id=1, created=now, updated=now, token=f"fake-{kind}-token-{random.getrandbits(64):016x}")
+
+
+def _handler(fake: FakeBunqServer):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _serve(self):
+            url = urlsplit(self.path)
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            length = int(self.headers.get("Content-Length") or 0)
+            request_body = self.rfile.read(length) if length else b""
+            status, data = fake.handle(
+                self.command, url.path, query, request_body, request_id=self.headers.get("X-Bunq-Client-Request-Id")
+            )
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("X-Bunq-Client-Response-Id", f"fake-{fake.requests.total()}")
+            self.send_header("X-Bunq-Server-Signature", fake.sign(body))
+            self.end_headers()
+            self.wfile.write(body)
+
+        do_GET = do_POST = do_PUT = do_DELETE = _serve
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class FakeFirestoreClient:
+    """An in-memory stand-in for the Firestore client that ``FireStore`` reads its configuration with.
+
+    Holds plain dicts per collection and document id. Every read waits for and may be rate limited by ``fault``,
+    which raises ``TooManyRequests`` like the Firestore client does.
+    """
+
+    def __init__(self, collections: dict = None, fault: FakeFault = None):
+        self.fault = fault or FakeFault()
+        self.lock = threading.Lock()
+        self.reads = Counter()
+        self._documents = {}
+        self._listeners = {}
+        self._update_times = itertools.count(1)
+        for collection, documents in (collections or {}).items():
+            for id_, data in documents.items():
+                self.set(collection, id_, data)
+
+    def collection(self, name: str):
+        return _FakeCollection(self, name)
+
+    def get_all(self, references):
+        self._call("get_all")
+        return [self._snapshot(reference.collection, reference.id) for reference in references]
+
+    def set(self, collection: str, id_: str, data: dict):
+        with self.lock:
+            self._documents.setdefault(collection, {})[id_] = (next(self._update_times), dict(data))
+            listeners = list(self._listeners.get(collection, ()))
+        for listener in listeners:
+            listener()
+
+    def create(self, collection: str, id_: str, data: dict):
+        with self.lock:
+            if id_ in self._documents.get(collection, {}):
+                from google.api_core.exceptions import AlreadyExists
+
+                raise AlreadyExists(f"Document {collection}/{id_} already exists.")
+        self.set(collection, id_, data)
+
+    def update(self, collection: str, id_: str, data: dict, option=None):
+        from google.api_core.exceptions import FailedPrecondition, NotFound
+
+        with self.lock:
+            update_time, current = self._documents.get(collection, {}).get(id_, (None, None))
+            if current is None:
+                raise NotFound(f"Document {collection}/{id_} does not exist.")
+            if option is not None and option.last_update_time != update_time:
+                raise FailedPrecondition(f"Document {collection}/{id_} was changed.")
+            self._documents[collection][id_] = (next(self._update_times), {**current, **data})
+            listeners = list(self._listeners.get(collection, ()))
+        for listener in listeners:
+            listener()
+
+    def write_option(self, last_update_time=None):
+        return SimpleNamespace(last_update_time=last_update_time)
+
+    def delete(self, collection: str, id_: str, option=None):
+        from google.api_core.exceptions import FailedPrecondition
+
+        with self.lock:
+            update_time, _ = self._documents.get(collection, {}).get(id_, (None, None))
+            if option is not None and option.last_update_time != update_time:
+                raise FailedPrecondition(f"Document {collection}/{id_} was changed.")
+            self._documents.get(collection, {}).pop(id_, None)
+            listeners = list(self._listeners.get(collection, ()))
+        for listener in listeners:
+            listener()
+
+    def _call(self, name: str):
+        with self.lock:
+            self.reads[name] += 1
+        self.fault.wait()
+        if self.fault.is_rate_limited():
+            from google.api_core.exceptions import TooManyRequests
+
+            raise TooManyRequests("Quota exceeded.")
+
+    def _snapshot(self, collection: str, id_: str, fields: bool = True):
+        with self.lock:
+            update_time, data = self._documents.get(collection, {}).get(id_, (None, None))
+        return SimpleNamespace(
+            id=id_,
+            reference=_FakeDocument(self, collection, id_),
+            update_time=update_time,
+            exists=data is not None,
+            # Like Firestore, a projection without fields returns documents without their contents.
+            to_dict=lambda: None if data is None else dict(data) if fields else {},
+        )
+
+    def _ids(self, collection: str):
+        with self.lock:
+            return list(self._documents.get(collection, {}))
+
+    def _watch(self, collection: str, listener):
+        with self.lock:
+            self._listeners.setdefault(collection, []).append(listener)
+        listener()
+        return SimpleNamespace(unsubscribe=lambda: self._unwatch(collection, listener))
+
+    def _unwatch(self, collection: str, listener):
+        with self.lock:
+            self._listeners[collection].remove(listener)
+
+
+class _FakeCollection:
+    def __init__(self, client: FakeFirestoreClient, name: str, fields: bool = True, filters: tuple = ()):
+        self.client = client
+        self.name = name
+        self.fields = fields
+        self.filters = filters
+
+    def document(self, id_: str):
+        return _FakeDocument(self.client, self.name, id_)
+
+    def select(self, field_paths):
+        return _FakeCollection(self.client, self.name, fields=False, filters=self.filters)
+
+    def where(self, *, filter):
+        # Only equality filters are used, so only those are supported.
+        if filter.op_string != "==":
+            raise NotImplementedError(f"Unsupported operator {filter.op_string!r}")
+        return _FakeCollection(self.client, self.name, fields=self.fields, filters=(*self.filters, filter))
+
+    def stream(self):
+        self.client._call("stream")
+        snapshots = [self.client._snapshot(self.name, id_) for id_ in self.client._ids(self.name)]
+        return [
+            self.client._snapshot(self.name, snapshot.id, self.fields)
+            for snapshot in snapshots
+            if all(snapshot.to_dict().get(f.field_path) == f.value for f in self.filters)
+        ]
+
+    def on_snapshot(self, callback):
+        def listener():
+            callback([self.client._snapshot(self.name, id_) for id_ in self.client._ids(self.name)], [], None)
+
+        return self.client._watch(self.name, listener)
+
+
+class _FakeDocument:
+    def __init__(self, client: FakeFirestoreClient, collection: str, id_: str):
+        self.client = client
+        self.collection = collection
+        self.id = id_
+
+    def get(self):
+        self.client._call("get")
+        return self.client._snapshot(self.collection, self.id)
+
+    def set(self, data: dict):
+        self.client.set(self.collection, self.id, data)
+
+    def create(self, data: dict):
+        self.client.create(self.collection, self.id, data)
+
+    def update(self, data: dict, option=None):
+        self.client.update(self.collection, self.id, data, option)
+
+    def delete(self, option=None):
+        self.client.delete(self.collection, self.id, option)
+
+    def on_snapshot(self, callback):
+        return self.client._watch(
+            self.collection, lambda: callback([self.client._snapshot(self.collection, self.id)], [], None)
+        )
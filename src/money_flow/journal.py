@@ -0,0 +1,334 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from money_flow import metrics
+from money_flow.money import Money
+from money_flow.planner import Plan, Transfer
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+# How far the clock of bunq may be behind ours when looking for the payments of a run.
+CLOCK_SKEW = 300
+JOURNAL_COLLECTION = "runs"
+
+
+class AccountLocked(RuntimeError):
+    pass
+
+
+def plan_to_dict(plan: Plan) -> dict:
+    return dict(
+        main_account_id=plan.main_account_id,
+        amount_to_sort=plan.amount_to_sort.cents,
+        remainder=plan.remainder.cents,
+        transfers=[
+            dict(
+                priority=transfer.priority,
+                to_account_alias=transfer.to_account_alias,
+                to_account_type=transfer.to_account_type,
+                to_iban=transfer.to_iban,
+                amount=transfer.amount.cents,
+                description=transfer.description,
+                remainder=transfer.remainder.cents,
+            )
+            for transfer in plan.transfers
+        ],
+    )
+
+
+def plan_from_dict(data: dict) -> Plan:
+    return Plan(
+        main_account_id=data["main_account_id"],
+        amount_to_sort=Money(data["amount_to_sort"]),
+        remainder=Money(data["remainder"]),
+        transfers=tuple(
+            Transfer(**{**transfer, "amount": Money(transfer["amount"]), "remainder": Money(transfer["remainder"])})
+            for transfer in data["transfers"]
+        ),
+    )
+
+
+class LocalJournalStore:
+    def __init__(self, directory: str = None):
+        self.directory = directory if directory is not None else tempfile.gettempdir()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"money-flow-run-{key}.json")
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key: str, entry: dict):
+        # Written to a temporary file first, so that a crash never leaves half a journal behind.
+        path = self._path(key)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(entry, f)
+        os.replace(f"{path}.tmp", path)
+
+    def create(self, key: str, entry: dict) -> bool:
+        try:
+            with open(self._path(key), "x") as f:
+                json.dump(entry, f)
+        except FileExistsError:
+            return False
+        return True
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def replace(self, key: str, expected: dict, entry: dict) -> bool:
+        """Replace the entry of ``key`` with ``entry``, or remove it if that is None, only if it is still ``expected``.
+
+        Returns whether it was.
+        """
+        path = self._path(key)
+        moved = f"{path}.{uuid.uuid4().hex}"
+        # Renaming is atomic, so of several runs replacing the same entry only one moves it out of the way.
+        try:
+            os.rename(path, moved)
+        except FileNotFoundError:
+            return False
+        try:
+            with open(moved) as f:
+                current = json.load(f)
+        except ValueError:
+            current = None
+        if current != expected:
+            # Another run replaced it first. Its entry goes back, unless a newer one was created meanwhile.
+            try:
+                os.link(moved, path)
+            except FileExistsError:
+                pass
+            os.remove(moved)
+            return False
+        os.remove(moved)
+        return entry is None or self.create(key, entry)
+
+    def find(self, field: str, value) -> list:
+        """The keys and entries whose ``field`` equals ``value``."""
+        found = []
+        for name in os.listdir(self.directory):
+            if name.startswith("money-flow-run-") and name.endswith(".json"):
+                key = name[len("money-flow-run-") : -len(".json")]
+                entry = self.get(key)
+                if entry is not None and entry.get(field) == value:
+                    found.append((key, entry))
+        return found
+
+
+class FirestoreJournalStore:
+    def __init__(self, db, collection: str = JOURNAL_COLLECTION):
+        self.db = db
+        self.collection = collection
+
+    def get(self, key: str):
+        snapshot = self.db.collection(self.collection).document(key).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def put(self, key: str, entry: dict):
+        self.db.collection(self.collection).document(key).set(entry)
+
+    def create(self, key: str, entry: dict) -> bool:
+        from google.api_core.exceptions import AlreadyExists
+
+        try:
+            self.db.collection(self.collection).document(key).create(entry)
+        except AlreadyExists:
+            return False
+        return True
+
+    def delete(self, key: str):
+        self.db.collection(self.collection).document(key).delete()
+
+    def replace(self, key: str, expected: dict, entry: dict) -> bool:
+        from google.api_core.exceptions import FailedPrecondition, NotFound
+
+        reference = self.db.collection(self.collection).document(key)
+        snapshot = reference.get()
+        if not snapshot.exists or snapshot.to_dict() != expected:
+            return False
+        # Fails when the document changed after it was read, so that only one run replaces what it saw.
+        option = self.db.write_option(last_update_time=snapshot.update_time)
+        try:
+            if entry is None:
+                reference.delete(option=option)
+            else:
+                reference.update(entry, option=option)
+        except (FailedPrecondition, NotFound):
+            return False
+        return True
+
+    def find(self, field: str, value) -> list:
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        query = self.db.collection(self.collection).where(filter=FieldFilter(field, "==", value))
+        return [(snapshot.id, snapshot.to_dict()) for snapshot in query.stream()]
+
+
+class RunJournal:
+    """Keeps the plan of a run and the state of each of its transfers until all of them went through.
+
+    A run that fails partway leaves its journal open. The next run for the same main account first gives what is
+    not done yet one more try, from the stored plan, and then plans the rest of the balance as usual. Each run has a
+    journal of its own, so runs that overlap do not overwrite each other's. Journals older than ``ttl`` seconds are
+    dropped rather than resumed, and claims older than that are forgotten.
+    """
+
+    def __init__(self, store, ttl: float = 24 * 3600, lock_ttl: float = 3600):
+        self.store = store
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+
+    def open(self, main_account_id) -> list:
+        """The runs for ``main_account_id`` that are still open, oldest first."""
+        self.prune_claims()
+        runs = []
+        for key, entry in sorted(
+            self.store.find("main_account_id", main_account_id), key=lambda found: found[1]["created"]
+        ):
+            if time.time() - entry["created"] > self.ttl:
+                print(f"Dropping run {entry['run_id']} from {time.ctime(entry['created'])}, it is too old to resume")
+                self.store.delete(key)
+            else:
+                runs.append(JournalRun(self, key, entry))
+        return runs
+
+    def claim(self, name: str) -> bool:
+        """Record that ``name`` is being handled and return whether it was not already."""
+        return self.store.create(name, dict(kind="claim", created=time.time()))
+
+    def prune_claims(self):
+        # bunq stops redelivering a notification long before the TTL, so older claims are not needed anymore.
+        for key, entry in self.store.find("kind", "claim"):
+            if time.time() - entry["created"] > self.ttl:
+                self.store.delete(key)
+
+    @contextmanager
+    def lock(self, main_account_id):
+        """Hold the main account for the block, so that no other run sorts its money meanwhile.
+
+        Raises ``AccountLocked`` when another run holds it. A lock older than ``lock_ttl`` seconds is taken to be
+        left by a run that crashed, and is taken over.
+        """
+        key = f"lock-{main_account_id}"
+        token = uuid.uuid4().hex
+        entry = dict(created=time.time(), token=token)
+        if not self.store.create(key, entry):
+            held = self.store.get(key)
+            # The stale lock is only replaced if no other run took it over since it was read.
+            if (
+                held is None
+                or time.time() - held["created"] <= self.lock_ttl
+                or not self.store.replace(key, held, entry)
+            ):
+                raise AccountLocked(f"Main account {main_account_id} is being sorted by another run")
+            print(f"Took over the lock on main account {main_account_id}, it was too old to still be held")
+        try:
+            yield
+        finally:
+            # A run that outlived its lock must not release the one that took it over.
+            self.store.replace(key, entry, None)
+
+    def begin(self, plan: Plan):
+        data = plan_to_dict(plan)
+        created = time.time()
+        # The same plan can come up again later, for instance for two equal salary payments, and must then get
+        # different idempotency keys.
+        run_id = hashlib.sha256(json.dumps([data, created], sort_keys=True).encode()).hexdigest()[:16]
+        entry = dict(run_id=run_id, main_account_id=plan.main_account_id, created=created, plan=data, transfers={})
+        run = JournalRun(self, f"{plan.main_account_id}-{run_id}", entry)
+        run.save()
+        return run
+
+
+class JournalRun:
+    def __init__(self, journal: RunJournal, key: str, entry: dict):
+        self.journal = journal
+        self.key = key
+        self.entry = entry
+        self.plan = plan_from_dict(entry["plan"])
+        self._index = {transfer: i for i, transfer in enumerate(self.plan.transfers)}
+        self._lock = threading.Lock()
+
+    @property
+    def run_id(self) -> str:
+        return self.entry["run_id"]
+
+    def idempotency_key(self, transfer: Transfer) -> str:
+        return f"{self.run_id}-{self._index[transfer]}"
+
+    def description(self, transfer: Transfer) -> str:
+        # bunq does not deduplicate payments by request id, so the key also goes into the description, where a
+        # resumed run can find it back.
+        return f"{transfer.description} ({self.idempotency_key(transfer)})"
+
+    def status(self, transfer: Transfer):
+        return self.entry["transfers"].get(str(self._index[transfer]))
+
+    def remaining(self, transfers) -> tuple:
+        remaining = tuple(transfer for transfer in transfers if self.status(transfer) != DONE)
+        metrics.count("journal.skipped", len(transfers) - len(remaining))
+        return remaining
+
+    def attempted(self) -> tuple:
+        """The transfers that were sent, or about to be, without being recorded as done."""
+        return tuple(transfer for transfer in self.plan.transfers if self.status(transfer) in (PENDING, FAILED))
+
+    def reconcile(self, payments) -> int:
+        """Mark the attempted transfers that ``payments`` show went through anyway as done, and return how many.
+
+        ``payments`` are those of the main account since the run began, as ``BunqLib.get_recent_payments`` gives
+        them. A transfer matches an outgoing payment of its amount, to its IBAN and with its description.
+        """
+        sent = {(payment["iban"], -payment["cents"], payment["description"]) for payment in payments}
+        found = [
+            transfer
+            for transfer in self.attempted()
+            if (transfer.to_iban, transfer.amount.cents, self.description(transfer)) in sent
+        ]
+        if found:
+            self.mark(found, DONE)
+        return len(found)
+
+    def mark(self, transfers, status: str):
+        with self._lock:
+            for transfer in transfers:
+                self.entry["transfers"][str(self._index[transfer])] = status
+            self.save()
+
+    def save(self):
+        self.journal.store.put(self.key, self.entry)
+
+    def is_complete(self) -> bool:
+        return all(self.status(transfer) == DONE for transfer in self.plan.transfers)
+
+    def close(self, abandon: bool = False):
+        """Remove the journal once every transfer is done; otherwise it stays for the next run to resume.
+
+        With ``abandon``, the journal is removed anyway. The money of the transfers that did not go through then
+        stays on the main account, for the next plan to sort.
+        """
+        if not self.is_complete():
+            if not abandon:
+                return
+            abandoned = [transfer for transfer in self.plan.transfers if self.status(transfer) != DONE]
+            metrics.count("journal.abandoned", len(abandoned))
+            print(
+                f"Giving up on {len(abandoned)} transfers of run {self.run_id}: "
+                + ", ".join(f"{transfer.amount:.2f} EUR to {transfer.to_account_alias}" for transfer in abandoned)
+            )
+        self.journal.store.delete(self.key)
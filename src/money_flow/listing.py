@@ -0,0 +1,66 @@
+import json
+from datetime import datetime, timezone
+
+from money_flow.accounts import Account
+from money_flow.money import to_cents
+
+ACCOUNT_OBJECT_TYPES = dict(
+    bank="MonetaryAccountBank",
+    joint="MonetaryAccountJoint",
+    savings="MonetaryAccountSavings",
+)
+
+
+def account_from_json(fields: dict, account_type: str):
+    if fields["status"] != "ACTIVE":
+        return None
+    return Account(
+        id_=fields["id"],
+        description=fields["description"],
+        balance_cents=to_cents(fields["balance"]["value"]),
+        iban=fields["alias"][0]["value"],
+        type=account_type,
+    )
+
+
+def parse_account_page(body: bytes, account_type: str, fallback):
+    """Read the active accounts and the raw pagination from a monetary account listing.
+
+    Only the fields ``Account`` keeps are read. Items that do not have the expected shape are handed to
+    ``fallback``, which gets the unwrapped item and returns an ``Account`` or None.
+    """
+    data = json.loads(body)
+    object_type = ACCOUNT_OBJECT_TYPES[account_type]
+    accounts = []
+    for item in data["Response"]:
+        fields = item.get(object_type, item)
+        try:
+            account = account_from_json(fields, account_type)
+        except (KeyError, IndexError, TypeError, ArithmeticError):
+            account = fallback(fields)
+        if account is not None:
+            accounts.append(account)
+    return accounts, data.get("Pagination")
+
+
+def parse_payment_page(body: bytes):
+    """Read the payments and the raw pagination from a payment listing of one monetary account.
+
+    Each payment is a dict of its ``id``, ``cents`` (negative when money went out), the ``iban`` of the
+    counterparty, its ``description`` and ``created`` as a Unix time.
+    """
+    data = json.loads(body)
+    payments = []
+    for item in data["Response"]:
+        fields = item.get("Payment", item)
+        created = datetime.strptime(fields["created"], "%Y-%m-%d %H:%M:%S.%f").replace(tzinfo=timezone.utc)
+        payments.append(
+            dict(
+                id=fields["id"],
+                cents=to_cents(fields["amount"]["value"]),
+                iban=fields["counterparty_alias"].get("iban"),
+                description=fields["description"],
+                created=created.timestamp(),
+            )
+        )
+    return payments, data.get("Pagination")
@@ -1,18 +1,25 @@
 # src/money_flow/main.py
 import json
 import os
+import sys
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 
-import functions_framework
 from dotenv import load_dotenv
-from google.cloud import secretmanager
 
+from money_flow import metrics
 from money_flow.allocation import FireStore
 from money_flow.automate import AutomateAllocations
 from money_flow.bunq import BunqLib
+from money_flow.cache import AccountSnapshotCache
+from money_flow.journal import AccountLocked
+from money_flow.money import Money
 
 
 def get_secret_value(secret_name, project_id):
+    from google.cloud import secretmanager
+
     client = secretmanager.SecretManagerServiceClient()
     secret_version_name = client.secret_version_path(project_id, secret_name, "latest")
     response = client.access_secret_version(name=secret_version_name)
@@ -23,32 +30,251 @@ warnings.filterwarnings("ignore")
 load_dotenv(override=True)
 
 PROJECT_ID = os.getenv("PROJECT_ID")
-API_KEY = get_secret_value("bunq_api_key", PROJECT_ID)
-GOOGLE_FIRESTORE_CONFIG = json.loads(get_secret_value("firebase_service_account", PROJECT_ID))
 API_CONTEXT_FILE_PATH = os.getenv("BUNQ_FILE_NAME")
 ENVIRONMENT = os.getenv("ENVIRONMENT")
 DEVICE_DESCRIPTION = os.getenv("DESCRIPTION")
 SIMULATE = os.getenv("SIMULATE", "False").lower() in ("true", "1", "t")
+MAX_CONCURRENT_REQUESTS = int(os.getenv("BUNQ_MAX_CONCURRENT_REQUESTS", "3"))
+HTTP_POOL_SIZE = int(os.getenv("BUNQ_HTTP_POOL_SIZE", str(MAX_CONCURRENT_REQUESTS)))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("BUNQ_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("BUNQ_HTTP_READ_TIMEOUT", "30"))
+# Sends the bunq API calls elsewhere, such as to a local FakeBunqServer.
+BUNQ_API_BASE_URL = os.getenv("BUNQ_API_BASE_URL") or None
+PAYMENT_MODE = os.getenv("PAYMENT_MODE", "single")
+PAYMENT_WORKERS = int(os.getenv("PAYMENT_WORKERS", str(MAX_CONCURRENT_REQUESTS)))
+ACCOUNT_FETCH = os.getenv("ACCOUNT_FETCH", "full")
+ACCOUNT_CACHE_TTL = float(os.getenv("ACCOUNT_CACHE_TTL", "0"))
+ACCOUNT_CACHE_DIR = os.getenv("ACCOUNT_CACHE_DIR")
+FAST_ACCOUNT_LISTING = os.getenv("BUNQ_FAST_ACCOUNT_LIST", "True").lower() in ("true", "1", "t")
+FIRESTORE_LISTEN = os.getenv("FIRESTORE_LISTEN", "False").lower() in ("true", "1", "t")
+METRICS_LOG = os.getenv("METRICS_LOG", "True").lower() in ("true", "1", "t")
+METRICS_IN_RESPONSE = os.getenv("METRICS_IN_RESPONSE", "False").lower() in ("true", "1", "t")
+RUN_JOURNAL = os.getenv("RUN_JOURNAL", "off")
+RUN_JOURNAL_DIR = os.getenv("RUN_JOURNAL_DIR")
+RUN_JOURNAL_TTL = float(os.getenv("RUN_JOURNAL_TTL", str(24 * 3600)))
+WEBHOOK_ENABLED = os.getenv("WEBHOOK_ENABLED", "False").lower() in ("true", "1", "t")
+WEBHOOK_MIN_AMOUNT = Money.of(os.getenv("WEBHOOK_MIN_AMOUNT", "0"))
+WEBHOOK_VERIFY_SIGNATURE = os.getenv("WEBHOOK_VERIFY_SIGNATURE", "True").lower() in ("true", "1", "t")
+TENANTS_FILE = os.getenv("TENANTS_FILE")
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+
+if METRICS_LOG:
+    metrics.add_hook(metrics.log_json)
+
+# The webhook and the scheduled runs may run on different instances at the same time. Only a journal they share can
+# keep them from sorting the same money twice.
+if WEBHOOK_ENABLED and RUN_JOURNAL != "firestore":
+    raise ValueError(f"WEBHOOK_ENABLED needs RUN_JOURNAL=firestore, not {RUN_JOURNAL!r}")
+
+
+# Secrets and clients are created on first use and kept for warm invocations of the same instance.
+_secrets = {}
+_clients = {}
+_lock = threading.Lock()
+
+
+@metrics.timed("secrets")
+def get_secrets():
+    with _lock:
+        if not _secrets:
+            metrics.count("secrets.fetched", 2)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                api_key = executor.submit(get_secret_value, "bunq_api_key", PROJECT_ID)
+                firestore_config = executor.submit(get_secret_value, "firebase_service_account", PROJECT_ID)
+                _secrets["bunq_api_key"] = api_key.result()
+                _secrets["firebase_service_account"] = json.loads(firestore_config.result())
+        return _secrets
+
+
+@metrics.timed("firestore.connect")
+def get_store():
+    secrets = get_secrets()
+    with _lock:
+        if "store" not in _clients:
+            _clients["store"] = FireStore(config=secrets["firebase_service_account"], listen=FIRESTORE_LISTEN)
+        return _clients["store"]
+
+
+def make_bunq(api_key: str, api_context_file_path: str) -> BunqLib:
+    from money_flow.transport import PooledTransport
+
+    return BunqLib(
+        api_key=api_key,
+        environment_type=ENVIRONMENT,
+        device_description=DEVICE_DESCRIPTION,
+        api_context_file_path=api_context_file_path,
+        max_concurrent_requests=MAX_CONCURRENT_REQUESTS,
+        fast_account_listing=FAST_ACCOUNT_LISTING,
+        transport=PooledTransport(
+            pool_size=HTTP_POOL_SIZE,
+            connect_timeout=HTTP_CONNECT_TIMEOUT,
+            read_timeout=HTTP_READ_TIMEOUT,
+            base_url=BUNQ_API_BASE_URL,
+        ),
+        snapshot_cache=(
+            AccountSnapshotCache(ttl=ACCOUNT_CACHE_TTL, directory=ACCOUNT_CACHE_DIR) if ACCOUNT_CACHE_TTL > 0 else None
+        ),
+    )
+
+
+@metrics.timed("bunq.client")
+def get_bunq():
+    secrets = get_secrets()
+    with _lock:
+        bunq_ = _clients.get("bunq")
+        if bunq_ is None:
+            bunq_ = make_bunq(secrets["bunq_api_key"], API_CONTEXT_FILE_PATH)
+            _clients["bunq"] = bunq_
+        if not bunq_.is_healthy():
+            bunq_.connect()
+        return bunq_
+
+
+def get_main_account_id(store_: FireStore):
+    # Every notification needs it, and it rarely changes. Changing it takes effect once the clients are reset; until
+    # then, notifications for the new main account are ignored and left to the scheduled runs.
+    with _lock:
+        if "main_account_id" not in _clients:
+            _clients["main_account_id"] = store_.get_main_account_settings().id
+        return _clients["main_account_id"]
+
+
+def make_journal(store_: FireStore):
+    from money_flow.journal import FirestoreJournalStore, LocalJournalStore, RunJournal
+
+    if RUN_JOURNAL == "firestore":
+        return RunJournal(FirestoreJournalStore(store_.db), ttl=RUN_JOURNAL_TTL)
+    if RUN_JOURNAL == "local":
+        return RunJournal(LocalJournalStore(RUN_JOURNAL_DIR), ttl=RUN_JOURNAL_TTL)
+    if RUN_JOURNAL != "off":
+        raise ValueError(f"Unknown RUN_JOURNAL {RUN_JOURNAL!r}, expected firestore, local or off")
+    return None
+
 
+def reset_clients():
+    with _lock:
+        if "store" in _clients:
+            _clients["store"].close()
+        _clients.clear()
 
-@functions_framework.http
-def main():
+
+def http(function):
+    # Registering the function only matters when the functions framework serves it, and then the framework has
+    # already been imported. Other entry points do not need to pay for importing it.
+    functions_framework = sys.modules.get("functions_framework")
+    return functions_framework.http(function) if functions_framework is not None else function
+
+
+def _wants_metrics(request) -> bool:
+    if METRICS_IN_RESPONSE:
+        return True
+    args = getattr(request, "args", None)
+    return args is not None and args.get("metrics", "").lower() in ("true", "1", "t")
+
+
+@http
+def main(request=None):
+    with metrics.run("money-flow") as run:
+        _run()
+    if _wants_metrics(request):
+        return dict(result="Success", metrics=run.record())
+    return "Success"
+
+
+@http
+def batch(request=None):
+    from money_flow.batch import load_tenants, run_batch
+
+    return run_batch(load_tenants(TENANTS_FILE), workers=BATCH_WORKERS)
+
+
+@http
+def webhook(request):
+    if not WEBHOOK_ENABLED:
+        return "Webhook is disabled", 404
+    with metrics.run("money-flow-webhook"):
+        return _handle_notification(request.get_data(), request.headers)
+
+
+def _handle_notification(body: bytes, headers):
+    from money_flow.notifications import parse_payment_notification
+
+    try:
+        store_ = get_store()
+        bunq_ = get_bunq()
+        if WEBHOOK_VERIFY_SIGNATURE and not bunq_.is_signed_by_bunq(body, headers):
+            print("Rejected a notification that is not signed by bunq")
+            return "Invalid signature", 401
+        payment = parse_payment_notification(body)
+        if payment is None or payment.monetary_account_id != get_main_account_id(store_):
+            return "Ignored"
+        if payment.amount < WEBHOOK_MIN_AMOUNT:
+            print(f"Leaving {payment.amount:.2f} EUR from payment {payment.id} for the next run")
+            return "Ignored"
+        journal = make_journal(store_)
+        with journal.lock(payment.monetary_account_id):
+            # bunq retries a notification until it gets an answer in time, so the same payment can come in more than
+            # once. A scheduled run claims the payments whose money it sorted as well. A payment whose sorting fails
+            # after its claim is left to the next scheduled run.
+            if not journal.claim(f"payment-{payment.id}"):
+                metrics.count("webhook.duplicates")
+                print(f"Payment {payment.id} was already sorted")
+                return "Duplicate"
+            print(f"Sorting {payment.amount:.2f} EUR from payment {payment.id} ({payment.description})")
+            automate = AutomateAllocations(
+                bunq=bunq_,
+                store=store_,
+                simulate=SIMULATE,
+                payment_mode=PAYMENT_MODE,
+                payment_workers=PAYMENT_WORKERS,
+                journal=journal,
+            )
+            automate.resume()
+            return automate.allocate_incoming(payment.amount)
+    except AccountLocked as error:
+        # bunq delivers the notification again later, by when the other run is done.
+        print(error)
+        return "Busy", 503
+    except Exception:
+        reset_clients()
+        raise
+
+
+def _run():
     try:
-        store_ = FireStore(config=GOOGLE_FIRESTORE_CONFIG)
+        store_ = get_store()
     except Exception as error:
         print("An error occurred:", type(error).__name__, "–", error)
         print("Are you on VPN maybe?")
         exit(1)
-    bunq_ = BunqLib(
-        api_key=API_KEY,
-        environment_type=ENVIRONMENT,
-        device_description=DEVICE_DESCRIPTION,
-        api_context_file_path=API_CONTEXT_FILE_PATH,
-    )
-    bunq_.connect()
-    bunq_.get_accounts()
-    AutomateAllocations(bunq=bunq_, store=store_, simulate=SIMULATE).run()
-    return "Success"
+    try:
+        bunq_ = get_bunq()
+        # The transport is kept across warm invocations, so its totals are compared with those from before this run.
+        before = bunq_.connection_stats()
+        automate = AutomateAllocations(
+            bunq=bunq_,
+            store=store_,
+            simulate=SIMULATE,
+            payment_mode=PAYMENT_MODE,
+            payment_workers=PAYMENT_WORKERS,
+            journal=make_journal(store_),
+        )
+        try:
+            # A run that was interrupted is finished first, then whatever is on the main account is sorted as usual.
+            automate.sort_balance(fetch=ACCOUNT_FETCH, claim_incoming=WEBHOOK_ENABLED)
+        except AccountLocked as error:
+            print(f"{error}, leaving it to the next run")
+        stats = bunq_.connection_stats()
+        if stats:
+            requests = stats["requests"] - before.get("requests", 0)
+            connections = stats["connections"] - before.get("connections", 0)
+            print(f"{requests} bunq requests over {connections} new connections")
+            metrics.count("http.requests", requests)
+            metrics.count("http.new_connections", connections)
+    except Exception:
+        # Start from fresh clients on the next invocation rather than reusing possibly broken ones.
+        reset_clients()
+        raise
 
 
 if __name__ == "__main__":
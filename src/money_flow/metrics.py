@@ -0,0 +1,132 @@
+import functools
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from datetime import datetime, timezone
+
+_current_run = ContextVar("money_flow_run", default=None)
+_current_span = ContextVar("money_flow_span", default=None)
+_hooks = []
+
+
+class Span:
+    __slots__ = ("name", "attributes", "started", "duration", "children")
+
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.started = time.perf_counter()
+        self.duration = None
+        self.children = []
+
+    def record(self) -> dict:
+        record = dict(name=self.name, duration_ms=round((self.duration or 0) * 1000, 3))
+        if self.attributes:
+            record["attributes"] = self.attributes
+        if self.children:
+            record["children"] = [child.record() for child in self.children]
+        return record
+
+
+class Run:
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = datetime.now(timezone.utc)
+        self.root = Span(name, {})
+        self.counters = Counter()
+        self.sleeps = Counter()
+        self.lock = threading.Lock()
+
+    def record(self) -> dict:
+        with self.lock:
+            return dict(
+                run=self.name,
+                started_at=self.started_at.isoformat(),
+                duration_ms=round((self.root.duration or time.perf_counter() - self.root.started) * 1000, 3),
+                spans=[child.record() for child in self.root.children],
+                counters=dict(self.counters),
+                sleep_ms={name: round(seconds * 1000, 3) for name, seconds in self.sleeps.items()},
+            )
+
+
+def add_hook(hook):
+    """Call ``hook`` with the record of every finished run."""
+    _hooks.append(hook)
+
+
+def remove_hook(hook):
+    _hooks.remove(hook)
+
+
+def log_json(record: dict):
+    # One line of JSON per run, which Cloud Logging picks up as a structured entry.
+    print(json.dumps(dict(message=f"{record['run']} finished in {record['duration_ms']:.0f} ms", metrics=record)))
+
+
+@contextmanager
+def run(name: str):
+    current = Run(name)
+    run_token = _current_run.set(current)
+    span_token = _current_span.set(current.root)
+    try:
+        yield current
+    finally:
+        current.root.duration = time.perf_counter() - current.root.started
+        _current_span.reset(span_token)
+        _current_run.reset(run_token)
+        record = current.record()
+        for hook in list(_hooks):
+            hook(record)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    current = _current_run.get()
+    if current is None:
+        yield None
+        return
+    parent = _current_span.get() or current.root
+    child = Span(name, attributes)
+    with current.lock:
+        parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    finally:
+        child.duration = time.perf_counter() - child.started
+        _current_span.reset(token)
+
+
+def timed(name: str):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, n: int = 1):
+    current = _current_run.get()
+    if current is not None:
+        with current.lock:
+            current.counters[name] += n
+
+
+def add_sleep(name: str, seconds: float):
+    current = _current_run.get()
+    if current is not None and seconds:
+        with current.lock:
+            current.sleeps[name] += seconds
+
+
+def propagate(function):
+    """Wrap ``function`` so that it reports to the current run and span from any thread it is called in."""
+    context = copy_context()
+    return lambda *args, **kwargs: context.copy().run(function, *args, **kwargs)
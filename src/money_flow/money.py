@@ -0,0 +1,110 @@
+from decimal import ROUND_HALF_EVEN, Decimal
+
+
+def to_cents(value) -> int:
+    if isinstance(value, Money):
+        return value.cents
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, float):
+        value = repr(value)
+    return int(Decimal(value).scaleb(2).to_integral_value(rounding=ROUND_HALF_EVEN))
+
+
+def from_cents(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+def divide_half_even(numerator: int, denominator: int) -> int:
+    quotient, rest = divmod(numerator, denominator)
+    if 2 * rest > denominator or (2 * rest == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+
+def basis_points(percentage) -> int:
+    # Percentages are applied with a precision of 0.01%.
+    return to_cents(percentage)
+
+
+class Money:
+    """An exact amount of euros, stored as a whole number of cents.
+
+    Comparisons and arithmetic also accept plain numbers, which are read as euros.
+    """
+
+    __slots__ = ("cents",)
+
+    def __init__(self, cents: int = 0):
+        self.cents = cents
+
+    @classmethod
+    def of(cls, value) -> "Money":
+        if isinstance(value, Money):
+            return value
+        return cls(to_cents(value))
+
+    def to_decimal(self) -> Decimal:
+        return from_cents(self.cents)
+
+    def percentage(self, percentage) -> "Money":
+        return Money(divide_half_even(self.cents * basis_points(percentage), 10000))
+
+    def __add__(self, other):
+        return Money(self.cents + to_cents(other))
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        return Money(self.cents - to_cents(other))
+
+    def __rsub__(self, other):
+        return Money(to_cents(other) - self.cents)
+
+    def __neg__(self):
+        return Money(-self.cents)
+
+    def __abs__(self):
+        return Money(abs(self.cents))
+
+    def __truediv__(self, other):
+        return Decimal(self.cents) / Decimal(to_cents(other))
+
+    def __rtruediv__(self, other):
+        return Decimal(to_cents(other)) / Decimal(self.cents)
+
+    def __eq__(self, other):
+        # Only compared with numbers that hash by their exact value, like the amount itself does. A float such as 0.1
+        # is not exactly 10 cents and does not hash like it, so it is never equal to an amount.
+        if isinstance(other, Money):
+            return self.cents == other.cents
+        if isinstance(other, (int, Decimal)):
+            return self.to_decimal() == other
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.to_decimal())
+
+    def __lt__(self, other):
+        return self.cents < to_cents(other)
+
+    def __le__(self, other):
+        return self.cents <= to_cents(other)
+
+    def __gt__(self, other):
+        return self.cents > to_cents(other)
+
+    def __ge__(self, other):
+        return self.cents >= to_cents(other)
+
+    def __bool__(self):
+        return self.cents != 0
+
+    def __format__(self, format_spec):
+        return format(self.to_decimal(), format_spec)
+
+    def __str__(self):
+        return str(self.to_decimal())
+
+    def __repr__(self):
+        return f"Money('{self.to_decimal()}')"
@@ -0,0 +1,63 @@
+"""Callbacks from bunq about payments on the main account.
+
+bunq posts a notification to the registered URL for every payment on an account that has a notification filter.
+Incoming ones are sorted right away, so a salary payment does not wait for the next scheduled run.
+
+    python -m money_flow.notifications https://example.com/webhook
+"""
+
+import argparse
+import json
+import sys
+from dataclasses import dataclass
+
+from money_flow.money import Money
+
+CATEGORIES = ("PAYMENT", "MUTATION")
+
+
+@dataclass(frozen=True)
+class IncomingPayment:
+    id: int
+    monetary_account_id: int
+    amount: Money
+    description: str
+
+
+def parse_payment_notification(body) -> IncomingPayment:
+    """Return the payment a notification is about, or None when it is not about money coming in."""
+    if isinstance(body, (bytes, str)):
+        body = json.loads(body or "{}")
+    notification = body.get("NotificationUrl") or {}
+    if notification.get("category") not in CATEGORIES:
+        return None
+    payment = (notification.get("object") or {}).get("Payment")
+    if not payment:
+        return None
+    amount = Money.of(payment["amount"]["value"])
+    # Outgoing payments, including the ones money-flow makes itself, have a negative amount.
+    if amount <= 0:
+        return None
+    return IncomingPayment(
+        id=payment["id"],
+        monetary_account_id=payment["monetary_account_id"],
+        amount=amount,
+        description=payment.get("description", ""),
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Have bunq call a URL for every payment on the main account.")
+    parser.add_argument("url", help="URL the webhook entry point is served at")
+    args = parser.parse_args(argv)
+
+    from money_flow.main import get_bunq, get_store
+
+    account_id = get_store().get_main_account_settings().id
+    get_bunq().register_payment_callback(account_id, args.url)
+    print(f"bunq now calls {args.url} for payments on account {account_id}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
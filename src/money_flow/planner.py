@@ -0,0 +1,78 @@
+from dataclasses import dataclass
+from itertools import groupby
+
+from money_flow.allocation import Allocation, Settings
+from money_flow.money import Money
+from money_flow.program import compile_allocations
+
+
+@dataclass(frozen=True)
+class Transfer:
+    priority: int
+    to_account_alias: str
+    to_account_type: str
+    to_iban: str
+    amount: Money
+    description: str
+    remainder: Money
+
+
+@dataclass(frozen=True)
+class Plan:
+    main_account_id: int
+    amount_to_sort: Money
+    transfers: tuple
+    remainder: Money
+
+    def groups(self):
+        for priority, transfers in groupby(self.transfers, key=lambda t: t.priority):
+            yield priority, tuple(transfers)
+
+
+class _BalanceBook:
+    # Stands in for BunqLib in the strategies, so that top-ups see the transfers planned before them.
+    def __init__(self, balances):
+        self.balances = balances
+        self.credits = {}
+
+    def get_balance_by_iban(self, *, iban: str):
+        balance = self.balances.get(iban)
+        if balance is None:
+            return None
+        return balance + self.credits.get(iban, Money(0))
+
+    def credit(self, iban: str, amount: Money):
+        self.credits[iban] = self.credits.get(iban, Money(0)) + amount
+
+
+def plan_allocations(main_account_balance: Money, settings: Settings, allocations: list[Allocation], balances) -> Plan:
+    program = compile_allocations(allocations)
+    book = _BalanceBook(balances)
+    main_account_balance = Money.of(main_account_balance)
+    remainder = main_account_balance
+    transfers = []
+    for priority, steps in program.groups:
+        # Every allocation in a priority group is computed from what was left before the group started.
+        original_remainder = remainder
+        for step in steps:
+            amount = step.strategy(original_remainder if original_remainder else remainder, book)
+            if amount > 0:
+                remainder -= amount
+                book.credit(step.to_iban, amount)
+                transfers.append(
+                    Transfer(
+                        priority=priority,
+                        to_account_alias=step.to_account_alias,
+                        to_account_type=step.to_account_type,
+                        to_iban=step.to_iban,
+                        amount=amount,
+                        description=step.description,
+                        remainder=remainder,
+                    )
+                )
+    return Plan(
+        main_account_id=settings.id,
+        amount_to_sort=main_account_balance,
+        transfers=tuple(transfers),
+        remainder=remainder,
+    )
@@ -0,0 +1,86 @@
+import threading
+from itertools import groupby
+
+from money_flow.allocation import Allocation, InvalidAllocationError, parse_document
+from money_flow.strategies import Strategy, compile_strategy
+
+# Everything that determines a program; current_balance changes every run and is not used by the strategies.
+CONFIG_FIELDS = (
+    "description",
+    "strategy",
+    "iban",
+    "account_type",
+    "percentage",
+    "target_balance",
+    "fixed_amount",
+    "max_amount",
+    "min_amount",
+    "priority",
+)
+PROGRAM_CACHE_SIZE = 32
+
+
+class Step:
+    __slots__ = ("strategy", "to_account_alias", "to_account_type", "to_iban", "description")
+
+    def __init__(self, allocation: Allocation, strategy: Strategy):
+        self.strategy = strategy
+        self.to_account_alias = allocation.description
+        self.to_account_type = allocation.account_type
+        self.to_iban = allocation.iban
+        self.description = f"Deel salaris voor {allocation.description}"
+
+
+class Program:
+    __slots__ = ("groups",)
+
+    def __init__(self, groups: tuple):
+        # (priority, steps) pairs in the order they run.
+        self.groups = groups
+
+    def __len__(self):
+        return sum(len(steps) for _, steps in self.groups)
+
+
+_programs = {}
+_programs_lock = threading.Lock()
+
+
+def config_key(allocations: list[Allocation]) -> tuple:
+    return tuple(tuple(getattr(allocation, field) for field in CONFIG_FIELDS) for allocation in allocations)
+
+
+def validate_allocation(allocation: Allocation, resolved: bool = True) -> Strategy:
+    # Allocations that name a bunq account only get their description and IBAN once accounts are loaded.
+    if resolved and not allocation.iban:
+        raise InvalidAllocationError(f"Allocation {allocation.description!r} has no iban")
+    if not isinstance(allocation.priority, int):
+        raise InvalidAllocationError(f"Allocation {allocation.description!r} has no integer priority")
+    return compile_strategy(allocation)
+
+
+def validate_documents(documents: list[dict]):
+    for doc in documents:
+        allocation, bunq_id = parse_document(doc)
+        validate_allocation(allocation, resolved=not bunq_id)
+
+
+def compile_allocations(allocations: list[Allocation]) -> Program:
+    key = config_key(allocations)
+    with _programs_lock:
+        program = _programs.get(key)
+    if program is not None:
+        return program
+
+    steps = sorted(
+        ((allocation.priority, Step(allocation, validate_allocation(allocation))) for allocation in allocations),
+        key=lambda x: x[0],
+    )
+    program = Program(
+        tuple((priority, tuple(step for _, step in group)) for priority, group in groupby(steps, key=lambda x: x[0]))
+    )
+    with _programs_lock:
+        if len(_programs) >= PROGRAM_CACHE_SIZE:
+            _programs.pop(next(iter(_programs)))
+        _programs[key] = program
+    return program
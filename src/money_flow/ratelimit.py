@@ -0,0 +1,78 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from money_flow import metrics
+
+# bunq's published limits: per endpoint, at most N requests of a method within any W consecutive seconds.
+BUNQ_RATE_LIMITS = {
+    "GET": (3, 3.0),
+    "POST": (5, 3.0),
+    "PUT": (2, 3.0),
+}
+BUNQ_ENDPOINT_RATE_LIMITS = {
+    ("POST", "session-server"): (1, 30.0),
+}
+
+
+class TokenBucket:
+    def __init__(self, requests: int, per_seconds: float, burst: int = 1, clock=time.monotonic, sleep=time.sleep):
+        # Starting from a full bucket, a half-open window W admits burst + ceil(rate * W) - 1 requests,
+        # so the refill rate is chosen to keep that at exactly the published limit.
+        self.capacity = max(1, min(burst, requests))
+        self.rate = (requests - self.capacity + 1) / per_seconds
+        self.tokens = float(self.capacity)
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+            waited += wait
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        max_concurrent_requests: int = 3,
+        limits=None,
+        endpoint_limits=None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.limits = BUNQ_RATE_LIMITS if limits is None else limits
+        self.endpoint_limits = BUNQ_ENDPOINT_RATE_LIMITS if endpoint_limits is None else endpoint_limits
+        self.semaphore = threading.BoundedSemaphore(max_concurrent_requests)
+        self.buckets = {}
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+
+    def _bucket(self, method: str, endpoint: str) -> TokenBucket:
+        key = (method, endpoint)
+        with self.lock:
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                requests, per_seconds = self.endpoint_limits.get(key, self.limits[method])
+                bucket = TokenBucket(requests, per_seconds, clock=self.clock, sleep=self.sleep)
+                self.buckets[key] = bucket
+            return bucket
+
+    @contextmanager
+    def request(self, method: str, endpoint: str):
+        # Waiting for a token happens before taking a slot, so a throttled endpoint does not hold up the others.
+        metrics.add_sleep("rate_limit", self._bucket(method, endpoint).acquire())
+        with self.semaphore:
+            metrics.count(f"api.{method} {endpoint}")
+            yield
@@ -0,0 +1,99 @@
+import random
+import time
+
+from money_flow import metrics
+
+RETRYABLE_RESPONSE_CODES = {429, 500, 502, 503, 504}
+# bunq counts requests per 3 second window, so waiting less than that after a 429 is pointless.
+RATE_LIMIT_WINDOW = 3.0
+
+
+class RetriesExhausted(Exception):
+    pass
+
+
+def _retry_after(headers) -> float:
+    value = (headers or {}).get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _never_sent(error: Exception) -> bool:
+    from requests.exceptions import ConnectionError, ConnectTimeout
+    from urllib3.exceptions import NewConnectionError
+
+    if isinstance(error, ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if isinstance(error, ConnectionError) and error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class RetryPolicy:
+    """Tries a request again after errors that are worth another attempt, with jittered exponential backoff.
+
+    The SDK's exceptions do not carry the response headers, so ``response_headers`` is a callable that returns those
+    of the last response on the current thread, such as ``PooledTransport.last_response_headers``.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 30.0,
+        sleep=time.sleep,
+        response_headers=None,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self.response_headers = response_headers
+
+    @staticmethod
+    def is_retryable(error: Exception, idempotent: bool = True) -> bool:
+        from bunq.sdk.exception.api_exception import ApiException
+        from requests.exceptions import ConnectionError, Timeout
+
+        if isinstance(error, ApiException):
+            # bunq turns away rate limited requests before handling them; anything else may have had an effect.
+            return error.response_code in RETRYABLE_RESPONSE_CODES if idempotent else error.response_code == 429
+        if idempotent:
+            return isinstance(error, (ConnectionError, Timeout))
+        return _never_sent(error)
+
+    def delay(self, attempt: int, error: Exception) -> float:
+        # Full jitter: spread retries uniformly over the exponential backoff window.
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+        # Only an error that came with a response has headers to go by.
+        answered = getattr(error, "response_code", None) is not None
+        retry_after = _retry_after(self.response_headers()) if answered and self.response_headers is not None else None
+        if retry_after is not None:
+            return max(delay, retry_after)
+        if getattr(error, "response_code", None) == 429:
+            return max(delay, RATE_LIMIT_WINDOW)
+        return delay
+
+    def call(self, func, *args, **kwargs):
+        return self._call(func, args, kwargs, idempotent=True)
+
+    def submit(self, func, *args, **kwargs):
+        """Like ``call``, for requests such as payments that must not be repeated once bunq may have seen them."""
+        return self._call(func, args, kwargs, idempotent=False)
+
+    def _call(self, func, args, kwargs, idempotent: bool):
+        for attempt in range(self.max_attempts):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                print(f"Exception occurred: {e}")
+                if not self.is_retryable(e, idempotent):
+                    raise
+                if attempt + 1 == self.max_attempts:
+                    raise RetriesExhausted(f"Gave up after {self.max_attempts} attempts") from e
+                delay = self.delay(attempt, e)
+                print(f"Retrying in {delay:.1f}s... ({attempt + 1}/{self.max_attempts - 1})")
+                metrics.count("api.retries")
+                metrics.add_sleep("retry", delay)
+                self.sleep(delay)
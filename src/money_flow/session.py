@@ -0,0 +1,90 @@
+import threading
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from os.path import isfile
+
+
+class SessionManager:
+    def __init__(
+        self,
+        api_key,
+        environment_type,
+        device_description,
+        api_context_file_path,
+        refresh_margin: timedelta = timedelta(minutes=5),
+    ):
+        self.api_key = api_key
+        self.environment_type = environment_type
+        self.device_description = device_description
+        self.api_context_file_path = api_context_file_path
+        self.refresh_margin = refresh_margin
+        self.api_context = None
+        self.saved_token = None
+        self.lock = threading.Lock()
+
+    @property
+    def refresh_at(self):
+        if self.api_context is None or self.api_context.session_context is None:
+            return None
+        return self.api_context.session_context.expiry_time - self.refresh_margin
+
+    def is_fresh(self) -> bool:
+        refresh_at = self.refresh_at
+        return refresh_at is not None and datetime.now() < refresh_at
+
+    def get_api_context(self, rate_limiter=None):
+        """The API context, with a session that is not about to expire.
+
+        Creating a session goes through ``rate_limiter``, when given, since bunq allows only a few per half minute.
+        """
+        from bunq.sdk.context.bunq_context import BunqContext
+
+        with self.lock:
+            if self.api_context is None:
+                self._load(rate_limiter)
+            elif not self.is_fresh():
+                with _session_request(rate_limiter):
+                    self.api_context.reset_session()
+                BunqContext.update_api_context(self.api_context)
+            self._save_if_rotated()
+            return self.api_context
+
+    def _load(self, rate_limiter=None):
+        from bunq.sdk.context.api_context import ApiContext
+        from bunq.sdk.context.bunq_context import BunqContext
+
+        if not isfile(self.api_context_file_path):
+            with _session_request(rate_limiter):
+                api_context = ApiContext.create(self.environment_type, self.api_key, self.device_description)
+            api_context.save(self.api_context_file_path)
+        api_context = ApiContext.restore(self.api_context_file_path)
+        self.saved_token = api_context.token
+        self.api_context = api_context
+        if not self.is_fresh():
+            with _session_request(rate_limiter):
+                api_context.reset_session()
+        BunqContext.load_api_context(api_context)
+
+    def _save_if_rotated(self):
+        # The SDK may also rotate the session by itself in the middle of a request, which is picked up here as well.
+        if self.api_context.token != self.saved_token:
+            self.api_context.save(self.api_context_file_path)
+            self.saved_token = self.api_context.token
+
+
+def _session_request(rate_limiter):
+    return rate_limiter.request("POST", "session-server") if rate_limiter is not None else nullcontext()
+
+
+_session_managers = {}
+_session_managers_lock = threading.Lock()
+
+
+def get_session_manager(api_key, environment_type, device_description, api_context_file_path) -> SessionManager:
+    key = (api_key, environment_type, api_context_file_path)
+    with _session_managers_lock:
+        if key not in _session_managers:
+            _session_managers[key] = SessionManager(
+                api_key, environment_type, device_description, api_context_file_path
+            )
+        return _session_managers[key]
@@ -1,39 +1,95 @@
-from decimal import Decimal
-
-from money_flow.allocation import Allocation
+from money_flow.allocation import Allocation, InvalidAllocationError
 from money_flow.bunq import BunqLib
+from money_flow.money import Money, basis_points, divide_half_even
+
+
+class Strategy:
+    __slots__ = ("iban", "min_amount")
+    required = ()
+
+    def __init__(self, allocation: Allocation):
+        for field in self.required:
+            if getattr(allocation, field) is None:
+                raise InvalidAllocationError(
+                    f"Allocation {allocation.description!r} with strategy {allocation.strategy!r} has no {field}"
+                )
+        self.iban = allocation.iban
+        self.min_amount = Money.of(allocation.min_amount) if allocation.min_amount else Money(0)
+
+    def _check_minimum_amount(self, amount: Money) -> Money:
+        return amount if amount > self.min_amount else Money(0)
+
+
+class TopUpStrategy(Strategy):
+    __slots__ = ("target_balance", "max_amount")
+    required = ("target_balance",)
+
+    def __init__(self, allocation: Allocation):
+        super().__init__(allocation)
+        self.target_balance = Money.of(allocation.target_balance)
+        self.max_amount = Money.of(allocation.max_amount) if allocation.max_amount else None
+
+    def __call__(self, remainder: Money, bunq) -> Money:
+        amount = min(self.target_balance - bunq.get_balance_by_iban(iban=self.iban), remainder)
+        if self.max_amount:
+            amount = min(amount, self.max_amount)
+        return self._check_minimum_amount(amount)
 
 
-def _check_minimum_amount(amount: Decimal, *, minimum_amount: Decimal) -> Decimal:
-    if amount > (minimum_amount if minimum_amount else 0):
-        return amount
-    else:
-        return Decimal(0)
+class FixedStrategy(Strategy):
+    __slots__ = ("fixed_amount",)
+    required = ("fixed_amount",)
 
+    def __init__(self, allocation: Allocation):
+        super().__init__(allocation)
+        self.fixed_amount = Money.of(allocation.fixed_amount)
+
+    def __call__(self, remainder: Money, bunq=None) -> Money:
+        return self._check_minimum_amount(min(self.fixed_amount, remainder))
+
+
+class PercentageStrategy(Strategy):
+    __slots__ = ("basis_points",)
+    required = ("percentage",)
+
+    def __init__(self, allocation: Allocation):
+        super().__init__(allocation)
+        if not 0 <= allocation.percentage <= 100:
+            raise InvalidAllocationError(
+                f"Allocation {allocation.description!r} has a percentage outside 0-100: {allocation.percentage}"
+            )
+        self.basis_points = basis_points(allocation.percentage)
+
+    def __call__(self, remainder: Money, bunq=None) -> Money:
+        return self._check_minimum_amount(Money(divide_half_even(remainder.cents * self.basis_points, 10000)))
+
+
+strategy_types = dict(
+    top_up=TopUpStrategy,
+    fixed=FixedStrategy,
+    percentage=PercentageStrategy,
+)
 
-def _check_remainder(amount: Decimal, *, remainder: Decimal) -> Decimal:
-    return min(amount, remainder)
 
+def compile_strategy(allocation: Allocation) -> Strategy:
+    strategy_type = strategy_types.get(allocation.strategy)
+    if strategy_type is None:
+        raise InvalidAllocationError(
+            f"Allocation {allocation.description!r} has an unknown strategy {allocation.strategy!r}"
+        )
+    return strategy_type(allocation)
 
-def top_up_strategy(allocation: Allocation, remainder: Decimal, *, bunq: BunqLib) -> Decimal:
-    balance = bunq.get_balance_by_iban(iban=allocation.iban)
-    amount = allocation.target_balance - balance
-    amount = _check_remainder(amount, remainder=remainder)
-    if allocation.max_amount:
-        amount = min(amount, allocation.max_amount)
 
-    return _check_minimum_amount(amount, minimum_amount=allocation.min_amount)
+def top_up_strategy(allocation: Allocation, remainder: Money, *, bunq: BunqLib) -> Money:
+    return TopUpStrategy(allocation)(remainder, bunq)
 
 
-def fixed_strategy(allocation: Allocation, remainder: Decimal, *_, **__) -> Decimal:
-    amount = allocation.fixed_amount
-    amount = _check_remainder(amount, remainder=remainder)
-    return _check_minimum_amount(amount, minimum_amount=allocation.min_amount)
+def fixed_strategy(allocation: Allocation, remainder: Money, *_, **__) -> Money:
+    return FixedStrategy(allocation)(remainder)
 
 
-def percentage_strategy(allocation: Allocation, remainder: Decimal, *_, **__) -> Decimal:
-    amount = Decimal(round(float(remainder) * (allocation.percentage / 100.0), 2))
-    return _check_minimum_amount(amount, minimum_amount=allocation.min_amount)
+def percentage_strategy(allocation: Allocation, remainder: Money, *_, **__) -> Money:
+    return PercentageStrategy(allocation)(Money.of(remainder))
 
 
 all_strategies = dict(
@@ -0,0 +1,163 @@
+import argparse
+import bisect
+import itertools
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from money_flow.allocation import InvalidAllocationError, allocation_from_document
+from money_flow.money import to_cents
+
+# NumPy comes with the optional backtest extra, while the sweep script is always installed.
+MISSING_NUMPY = "money-flow-sweep needs NumPy, install it with: pip install 'money-flow[backtest]'"
+
+
+def resolve_accounts(documents: list[dict], accounts: list[dict] = None) -> list[dict]:
+    """Replace the bunq account ``id`` of allocation documents by the description and IBAN of that account.
+
+    A sweep runs without bunq, so the accounts come from the ``accounts`` of the history file, each with an ``id``,
+    ``description`` and ``iban``.
+    """
+    by_id = {account["id"]: account for account in accounts or ()}
+    resolved = []
+    for document in documents:
+        document = dict(document)
+        bunq_id = document.pop("id", None)
+        if bunq_id is not None:
+            account = by_id.get(bunq_id)
+            if account is None:
+                raise InvalidAllocationError(
+                    f"Allocation {document.get('description', bunq_id)!r} refers to bunq account {bunq_id}, "
+                    "which is not in the accounts of the history file"
+                )
+            document.update(description=account["description"], iban=account["iban"])
+        resolved.append(document)
+    return resolved
+
+
+def expand_grid(documents: list[dict], grid: dict):
+    """Yield (parameters, documents) for every combination in ``grid``.
+
+    Grid keys have the form ``"<description>.<field>"`` and address the allocation document with that description.
+    """
+    keys = list(grid)
+    for values in itertools.product(*(grid[key] for key in keys)):
+        parameters = dict(zip(keys, values))
+        config = [dict(doc) for doc in documents]
+        for key, value in parameters.items():
+            description, field = key.rsplit(".", 1)
+            matches = [doc for doc in config if doc.get("description") == description]
+            if not matches:
+                raise ValueError(f"No allocation with description {description!r} for grid key {key!r}")
+            for doc in matches:
+                doc[field] = value
+        yield parameters, config
+
+
+def score(result) -> dict:
+    import numpy as np
+
+    months = result.balances.shape[0]
+    months_to_target = {}
+    for allocation in result.allocations:
+        if allocation.strategy != "top_up" or not allocation.target_balance:
+            continue
+        column = result.ibans.index(allocation.iban)
+        reached = result.balances[:, column, :] >= to_cents(allocation.target_balance)
+        first_month = np.where(reached.any(axis=0), reached.argmax(axis=0) + 1, months + 1)
+        # The worst scenario decides: a target only counts as reached when it is reached everywhere.
+        months_to_target[allocation.description] = int(first_month.max())
+    return dict(
+        months_to_target=months_to_target,
+        unreached_targets=sum(value > months for value in months_to_target.values()),
+        total_months_to_target=sum(months_to_target.values()),
+        min_main_buffer=int(result.main_balances.min()),
+    )
+
+
+def rank_key(scores: dict):
+    return scores["unreached_targets"], scores["total_months_to_target"], -scores["min_main_buffer"]
+
+
+def evaluate(parameters: dict, documents: list[dict], history: dict) -> tuple[dict, dict]:
+    from money_flow.backtest import backtest
+
+    allocations = [allocation_from_document(doc) for doc in documents]
+    result = backtest(
+        allocations,
+        history["salaries"],
+        spending=history.get("spending"),
+        initial_balances=history.get("initial_balances"),
+        main_balance=history.get("main_balance", 0),
+    )
+    return parameters, score(result)
+
+
+def _evaluate_chunk(chunk, history):
+    return [evaluate(parameters, documents, history) for parameters, documents in chunk]
+
+
+def sweep(documents: list[dict], grid: dict, history: dict, workers: int = None, chunk_size: int = 16):
+    """Evaluate every grid combination in a process pool and yield ``(rank, total, parameters, scores)``.
+
+    Results are yielded as soon as they are scored; ``rank`` is the position among the results seen so far.
+    """
+    configs = expand_grid(documents, grid)
+    ranked_keys = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = []
+        while chunk := list(itertools.islice(configs, chunk_size)):
+            futures.append(executor.submit(_evaluate_chunk, chunk, history))
+        for future in as_completed(futures):
+            for parameters, scores in future.result():
+                key = rank_key(scores)
+                rank = bisect.bisect_right(ranked_keys, key)
+                ranked_keys.insert(rank, key)
+                yield rank + 1, len(ranked_keys), parameters, scores
+
+
+def _format_money(cents: int) -> str:
+    return f"{cents / 100:,.2f} EUR"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score a grid of allocation configs against a salary history.")
+    parser.add_argument("config", help="JSON file with 'allocations' (allocation documents) and 'grid'")
+    parser.add_argument(
+        "history",
+        help="JSON file with 'salaries', 'spending' and 'initial_balances' in cents, and the 'accounts' that "
+        "allocations refer to by id",
+    )
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--top", type=int, default=10, help="number of configs in the final ranking")
+    args = parser.parse_args(argv)
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        parser.exit(1, f"{MISSING_NUMPY}\n")
+
+    with open(args.config) as f:
+        config = json.load(f)
+    with open(args.history) as f:
+        history = json.load(f)
+    documents = resolve_accounts(config["allocations"], history.get("accounts"))
+
+    total = math.prod(len(values) for values in config["grid"].values())
+    print(f"Scoring {total} configs...")
+    results = []
+    for rank, seen, parameters, scores in sweep(documents, config["grid"], history, workers=args.workers):
+        results.append((parameters, scores))
+        print(
+            f"[{seen}/{total}] rank {rank}: {parameters} -> "
+            f"{scores['unreached_targets']} unreached, {scores['total_months_to_target']} months to targets, "
+            f"min buffer {_format_money(scores['min_main_buffer'])}"
+        )
+
+    print(f"Top {args.top} configs:")
+    for position, (parameters, scores) in enumerate(sorted(results, key=lambda r: rank_key(r[1]))[: args.top], 1):
+        print(f"{position:>3}. {json.dumps(parameters)} {json.dumps(scores)}")
+
+
+if __name__ == "__main__":
+    main()
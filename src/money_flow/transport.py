@@ -0,0 +1,99 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# The SDK builds every URL from the base of the environment it was set up for.
+BUNQ_BASE_URLS = ("https://api.bunq.com/v1/", "https://public-api.sandbox.bunq.com/v1/")
+
+_current_transport = ContextVar("money_flow_transport", default=None)
+
+
+class PooledTransport:
+    """Sends the bunq SDK's HTTP requests through one keep-alive session with a bounded connection pool.
+
+    The SDK calls ``requests.request`` for every API call, which opens a new connection each time. Calls made inside
+    ``use(transport)`` go through this instead and reuse connections; everything else is looked up on ``requests``
+    itself. With ``base_url`` set, calls to the bunq API are sent there instead, for instance to a ``FakeBunqServer``.
+    """
+
+    def __init__(
+        self, pool_size: int = 10, connect_timeout: float = 5.0, read_timeout: float = 30.0, base_url: str = None
+    ):
+        self.pool_size = pool_size
+        self.base_url = base_url.rstrip("/") + "/" if base_url else None
+        self.timeout = (connect_timeout, read_timeout)
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.session.mount("http://", self.adapter)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        with self._lock:
+            self.requests += 1
+        if self.base_url is not None:
+            url = _rebase(url, self.base_url)
+        # Cleared first, so that a request that gets no response does not leave an older response's headers behind.
+        self._local.headers = None
+        response = self.session.request(method, url, **kwargs)
+        self._local.headers = response.headers
+        return response
+
+    def last_response_headers(self):
+        """Headers of the last response received on this thread, which the SDK's exceptions leave out."""
+        return getattr(self._local, "headers", None)
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+    def stats(self) -> dict:
+        pools = self.adapter.poolmanager.pools
+        connections = sum(pools[key].num_connections for key in pools.keys())
+        return dict(requests=self.requests, connections=connections, reused=max(self.requests - connections, 0))
+
+    def close(self):
+        self.session.close()
+
+
+def _rebase(url: str, base_url: str) -> str:
+    for prefix in BUNQ_BASE_URLS:
+        if url.startswith(prefix):
+            return base_url + url[len(prefix) :]
+    return url
+
+
+class _Dispatcher:
+    # Stands in for ``requests`` in the SDK, which is shared by the whole process, and hands every call to the
+    # transport of the client that makes it. Calls outside ``use`` go to ``requests`` as before.
+    def request(self, method, url, **kwargs):
+        return (_current_transport.get() or requests).request(method, url, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(requests, name)
+
+
+_dispatcher = _Dispatcher()
+
+
+def install():
+    from bunq.sdk.http import api_client
+
+    api_client.requests = _dispatcher
+
+
+@contextmanager
+def use(transport: PooledTransport):
+    """Send the SDK calls made in this block, and in threads started from it through ``metrics.propagate``, over
+    ``transport``."""
+    install()
+    token = _current_transport.set(transport)
+    try:
+        yield transport
+    finally:
+        _current_transport.reset(token)
@@ -0,0 +1,99 @@
+import pytest
+
+from money_flow.allocation import InvalidAllocationError
+
+pytest.importorskip("numpy")
+from money_flow.sweep import evaluate, expand_grid, rank_key, resolve_accounts, sweep  # noqa: E402
+
+
+def top_up(description, iban, target_balance, max_amount):
+    return dict(
+        description=description,
+        strategy="top_up",
+        iban=iban,
+        account_type="savings",
+        target_balance=target_balance,
+        max_amount=max_amount,
+        priority=1,
+    )
+
+
+class TestExpandGrid:
+    def setup_method(self):
+        self.documents = [top_up("safety net", "NL01", "3000.00", "500.00"), top_up("holiday", "NL02", "900.00", None)]
+
+    def test_when_expanding_expect_every_combination_without_touching_the_input(self):
+        grid = {
+            "safety net.max_amount": ["250.00", "500.00"],
+            "holiday.target_balance": ["600.00", "900.00", "1200.00"],
+        }
+
+        configs = list(expand_grid(self.documents, grid))
+
+        assert len(configs) == 6
+        parameters, documents = configs[-1]
+        assert parameters == {"safety net.max_amount": "500.00", "holiday.target_balance": "1200.00"}
+        assert (documents[0]["max_amount"], documents[1]["target_balance"]) == ("500.00", "1200.00")
+        assert self.documents[1]["target_balance"] == "900.00"
+
+    def test_when_grid_names_unknown_allocation_expect_error(self):
+        with pytest.raises(ValueError, match="rent"):
+            list(expand_grid(self.documents, {"rent.fixed_amount": ["100.00"]}))
+
+
+class TestResolveAccounts:
+    def test_when_document_refers_to_account_expect_description_and_iban_from_history(self):
+        documents = [dict(id=7, strategy="fixed", account_type="bank", fixed_amount="50.00", priority=1)]
+
+        [document] = resolve_accounts(documents, [dict(id=7, description="stocks", iban="NL07")])
+
+        assert (document["description"], document["iban"]) == ("stocks", "NL07")
+        assert "id" not in document
+
+    def test_when_account_is_missing_expect_clear_error(self):
+        with pytest.raises(InvalidAllocationError, match="bunq account 7"):
+            resolve_accounts([dict(id=7, strategy="fixed", account_type="bank", fixed_amount="50.00")], [])
+
+    def test_when_evaluating_unresolved_document_expect_clear_error(self):
+        document = dict(id=7, strategy="fixed", account_type="bank", fixed_amount="50.00", priority=1)
+
+        with pytest.raises(InvalidAllocationError, match="no accounts"):
+            evaluate({}, [document], dict(salaries=[100000]))
+
+
+class TestScoring:
+    def setup_method(self):
+        self.history = dict(salaries=[100_000] * 12)
+
+    def test_when_target_is_reached_expect_month_it_is_reached_everywhere(self):
+        _, scores = evaluate({}, [top_up("safety net", "NL01", "3000.00", "500.00")], self.history)
+
+        assert scores["months_to_target"] == {"safety net": 6}
+        assert scores["unreached_targets"] == 0
+        assert scores["min_main_buffer"] == 50_000
+
+    def test_when_target_is_out_of_reach_expect_it_counted_as_unreached(self):
+        _, scores = evaluate({}, [top_up("safety net", "NL01", "30000.00", "500.00")], self.history)
+
+        assert scores["months_to_target"] == {"safety net": 13}
+        assert scores["unreached_targets"] == 1
+
+    def test_when_ranking_expect_reached_targets_then_speed_then_buffer(self):
+        reached_slowly = dict(unreached_targets=0, total_months_to_target=9, min_main_buffer=0)
+        reached_fast = dict(unreached_targets=0, total_months_to_target=3, min_main_buffer=0)
+        reached_fast_with_buffer = dict(unreached_targets=0, total_months_to_target=3, min_main_buffer=100)
+        unreached = dict(unreached_targets=1, total_months_to_target=1, min_main_buffer=10**6)
+
+        ranked = sorted([unreached, reached_slowly, reached_fast, reached_fast_with_buffer], key=rank_key)
+
+        assert ranked == [reached_fast_with_buffer, reached_fast, reached_slowly, unreached]
+
+    def test_when_sweeping_expect_every_config_scored_and_best_max_amount_first(self):
+        documents = [top_up("safety net", "NL01", "3000.00", "500.00")]
+        grid = {"safety net.max_amount": ["250.00", "500.00", "1000.00"]}
+
+        results = list(sweep(documents, grid, self.history, workers=2, chunk_size=1))
+
+        assert sorted(seen for _, seen, _, _ in results) == [1, 2, 3]
+        best = min(results, key=lambda result: rank_key(result[3]))
+        assert best[2] == {"safety net.max_amount": "1000.00"}
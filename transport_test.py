@@ -0,0 +1,88 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from money_flow import metrics
+from money_flow.transport import PooledTransport, use
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b'{"Response": []}'
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPooledTransport:
+    def setup_method(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1/user/1/monetary-account-bank"
+
+    def teardown_method(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_when_requesting_back_to_back_expect_connection_reused(self):
+        transport = PooledTransport(pool_size=2)
+
+        for _ in range(5):
+            assert transport.request("GET", self.url, headers={}).status_code == 200
+
+        assert transport.stats() == dict(requests=5, connections=1, reused=4)
+        transport.close()
+
+    def test_when_looking_up_other_attributes_expect_requests_module(self):
+        import requests
+
+        assert PooledTransport().exceptions is requests.exceptions
+
+    def test_when_response_received_expect_its_headers_kept_for_this_thread(self):
+        transport = PooledTransport(pool_size=2)
+
+        transport.request("GET", self.url, headers={})
+
+        assert transport.last_response_headers()["Content-Length"] == "16"
+        other_thread = []
+        thread = threading.Thread(target=lambda: other_thread.append(transport.last_response_headers()))
+        thread.start()
+        thread.join()
+        assert other_thread == [None]
+        transport.close()
+
+    def test_when_request_gets_no_response_expect_earlier_headers_cleared(self):
+        transport = PooledTransport(pool_size=2)
+        transport.request("GET", self.url, headers={})
+
+        with pytest.raises(requests.exceptions.ConnectionError):
+            # Nothing listens on port 1.
+            transport.request("GET", "http://127.0.0.1:1/v1/user/1/monetary-account-bank", headers={})
+
+        assert transport.last_response_headers() is None
+        transport.close()
+
+    def test_when_clients_use_their_own_transport_expect_sdk_calls_counted_per_client(self):
+        from bunq.sdk.http import api_client
+
+        first, second = PooledTransport(), PooledTransport()
+
+        with use(first):
+            api_client.requests.request("GET", self.url, headers={})
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(metrics.propagate(api_client.requests.request), "GET", self.url, headers={}).result()
+        with use(second):
+            api_client.requests.request("GET", self.url, headers={})
+
+        assert (first.requests, second.requests) == (2, 1)
+        first.close()
+        second.close()